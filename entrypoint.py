@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import re
 from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from contextlib import contextmanager
 from dataclasses import dataclass
+from fcntl import LOCK_EX, LOCK_NB, LOCK_SH, flock
+from hashlib import sha256
+from json import loads
 from logging import basicConfig, getLogger
-from os import getuid
+from os import W_OK, access, environ, getuid
 from pathlib import Path
-from shutil import which
+from shlex import join
+from shutil import copyfileobj, rmtree, which
 from socket import gethostname
 from subprocess import PIPE, CalledProcessError, check_call, check_output
-from typing import Any, Literal, NoReturn, Self, assert_never, overload
+from sys import executable, version_info
+from time import time
+from typing import TYPE_CHECKING, Any, Literal, NoReturn, Self, assert_never, overload
+from urllib.request import urlopen
+from zipfile import BadZipFile, ZipFile
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
 
 # THIS MODULE CANNOT CONTAIN ANY THIRD PARTY IMPORTS
 
@@ -23,18 +36,50 @@ _IS_ROOT = getuid() == 0
 _SUDO = "" if _IS_ROOT else "sudo "
 _REPO_URL = "https://github.com/queensberry-research/installer.git"
 _REPO_PATH = Path("/tmp/installer")  # noqa: S108
+_MIRROR = Path("/var/cache/installer/installer.git")
+_COMMIT = re.compile(r"[0-9a-f]{40}")
+_PYZ = Path("/var/cache/installer/installer.pyz")
+_PYZ_METADATA = "installer-pyz.json"
+_VENVS = Path("/var/cache/installer/venvs")
+_VENVS_KEEP = 3
+_VENV_COMPLETE = ".installer-complete"
+_APT_LISTS = Path("/var/lib/apt/lists")
+_APT_TTL = 3600
 __version__ = "0.1.17"
 
 
 def _main() -> None:
     _LOGGER.info("Running entrypoint %s...", __version__)
     settings, args = _Settings.parse()
-    _ensure_repo_cloned(settings.url, settings.path)
-    _ensure_repo_version(settings.path, version=settings.version)
-    _install_uv()
-    cmd = " ".join(["uv run python3 -m installer.main", *args])
-    _LOGGER.info("Running: %r", cmd)
-    _ = check_call(cmd, shell=True, cwd=settings.path)
+    pyz = _ensure_pyz(
+        settings.pyz,
+        url=settings.pyz_url,
+        sha256=settings.pyz_sha256,
+        version=settings.version,
+    )
+    if pyz is not None:
+        cmd = [executable, str(pyz), *args]
+        _LOGGER.info("Running: %r", join(cmd))
+        _ = check_call(cmd)
+        return
+    _ensure_apt_installed(
+        *([] if settings.path.is_dir() else ["git"]),
+        *([] if which("uv") is not None else ["curl"]),
+        ttl=settings.apt_ttl,
+        plan=settings.plan,
+    )
+    _ensure_repo(
+        settings.url,
+        settings.path,
+        version=settings.version,
+        mirror=settings.mirror,
+        plan=settings.plan,
+    )
+    with _yield_venv(settings.path, venvs=settings.venvs, plan=settings.plan) as venv:
+        cmd = [str(venv / "bin/python3"), "-m", "installer.main", *args]
+        _LOGGER.info("Running: %r", join(cmd))
+        env = {**environ, "PYTHONPATH": str(settings.path / "src")}
+        _ = check_call(cmd, cwd=settings.path, env=env)
 
 
 @dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
@@ -42,6 +87,13 @@ class _Settings:
     url: str = _REPO_URL
     path: Path = _REPO_PATH
     version: str | None = None
+    mirror: Path = _MIRROR
+    pyz: Path = _PYZ
+    pyz_url: str | None = None
+    pyz_sha256: str | None = None
+    venvs: Path = _VENVS
+    apt_ttl: int = _APT_TTL
+    plan: bool = False
 
     @classmethod
     def parse(cls) -> tuple[Self, Any]:
@@ -49,7 +101,11 @@ class _Settings:
             formatter_class=ArgumentDefaultsHelpFormatter, add_help=False
         )
         _ = parser.add_argument(
-            "--repo-url", type=str, default=_REPO_URL, help="Repo URL", dest="url"
+            "--repo-url",
+            type=str,
+            default=_REPO_URL,
+            help="Repo URL; may be a path or LAN mirror",
+            dest="url",
         )
         _ = parser.add_argument(
             "--repo-path", type=Path, default=_REPO_PATH, help="Repo path", dest="path"
@@ -61,56 +117,290 @@ class _Settings:
             help="Repo version",
             dest="version",
         )
+        _ = parser.add_argument(
+            "--repo-mirror",
+            type=Path,
+            default=_MIRROR,
+            help="Local bare mirror to fetch from first, if it exists",
+            dest="mirror",
+        )
+        _ = parser.add_argument(
+            "--pyz",
+            type=Path,
+            default=_PYZ,
+            help="Zipapp to run instead of the repo, if it exists and matches '--repo-version' or '--pyz-sha256'",
+            dest="pyz",
+        )
+        _ = parser.add_argument(
+            "--pyz-url",
+            type=str,
+            default=None,
+            help="URL to download the zipapp from, if it is missing or stale",
+            dest="pyz_url",
+        )
+        _ = parser.add_argument(
+            "--pyz-sha256",
+            type=str,
+            default=None,
+            help="SHA-256 of the zipapp; required with '--pyz-url'",
+            dest="pyz_sha256",
+        )
+        _ = parser.add_argument(
+            "--venvs",
+            type=Path,
+            default=_VENVS,
+            help="Directory of environments, keyed on the lock file",
+            dest="venvs",
+        )
+        _ = parser.add_argument(
+            "--apt-ttl",
+            type=int,
+            default=_APT_TTL,
+            help="Maximum age of the 'apt' lists, in seconds",
+            dest="apt_ttl",
+        )
         namespace, args = parser.parse_known_args()
-        settings = cls(**vars(namespace))
+        # `--plan` is the installer's, but it also stops the bootstrap from
+        # installing system packages; the repo and environment are still cached
+        settings = cls(**vars(namespace), plan="--plan" in args)
         return settings, args
 
 
-def _ensure_apt_installed(cmd: str, /) -> None:
-    if which(cmd) is not None:
+def _ensure_apt_installed(*cmds: str, ttl: int = _APT_TTL, plan: bool = False) -> None:
+    missing = [c for c in cmds if which(c) is None]
+    if len(missing) == 0:
         return
-    _LOGGER.info("Updating 'apt'...")
-    _run(f"{_SUDO} apt update -y")
-    _LOGGER.info("Installing %r...", cmd)
-    _run(f"{_SUDO} apt install -y {cmd}")
+    if plan:
+        msg = f"Unable to plan without {', '.join(map(repr, missing))}; install them, or use '--pyz'"
+        raise RuntimeError(msg)
+    try:
+        is_stale = time() - _APT_LISTS.stat().st_mtime >= ttl
+    except FileNotFoundError:
+        is_stale = True
+    if is_stale:
+        _LOGGER.info("Updating 'apt'...")
+        _run(f"{_SUDO}apt-get update")
+        _run(f"{_SUDO}touch {_APT_LISTS}")
+    _LOGGER.info("Installing %s...", ", ".join(map(repr, missing)))
+    _run(f"{_SUDO}apt-get install -y {' '.join(missing)}")
 
 
-def _ensure_repo_cloned(url: str, path: Path, /) -> None:
-    if path.is_dir():
+def _ensure_repo(
+    url: str,
+    path: Path,
+    /,
+    *,
+    version: str | None = None,
+    mirror: Path = _MIRROR,
+    plan: bool = False,
+) -> None:
+    # fetch only the requested ref, preferring a local mirror, then check it out
+    if (version is None) and _is_checked_out(path):
         return
-    _ensure_apt_installed("git")
-    _LOGGER.info("Cloning %r to %r...", url, str(path))
-    _run(f"git clone {url} {path}")
+    _ensure_apt_installed("git", plan=plan)
+    ref = "HEAD" if version is None else version
+    if (path / ".git").is_dir() and not _is_checked_out(path):
+        # left behind by an earlier fetch which failed
+        rmtree(path / ".git")
+    created = not (path / ".git").is_dir()
+    if created:
+        _LOGGER.info("Initializing %r...", str(path))
+        _run(f"git init -q {path}")
+    sources = _get_repo_sources(url, ref, mirror=mirror)
+    for source in sources:
+        _LOGGER.info("Fetching %r from %r to %r...", ref, source, str(path))
+        if _run(
+            f"git fetch -q --depth=1 --no-tags {source} {ref}", failable=True, cwd=path
+        ):
+            break
+    else:
+        if created:
+            rmtree(path / ".git", ignore_errors=True)
+        msg = f"Unable to fetch {ref!r} from {', '.join(map(repr, sources))}"
+        raise RuntimeError(msg)
+    _run("git checkout -q --force --detach FETCH_HEAD", cwd=path)
 
 
-def _ensure_repo_version(path: Path, /, *, version: str | None = None) -> None:
-    if version is None:
-        return
-    tag = _run(
-        "git describe --tags --exact-match", output=True, failable=True, cwd=path
+def _get_repo_sources(url: str, ref: str, /, *, mirror: Path = _MIRROR) -> list[str]:
+    # a mirror may be stale, so it is only preferred for commit IDs, which cannot
+    # change, or if it agrees with `url` on what `ref` points to
+    if not (mirror / "HEAD").is_file():
+        return [url]
+    if _COMMIT.fullmatch(ref):
+        return [str(mirror), url]
+    if (
+        remote := _run(f"git ls-remote {url} {ref}", output=True, failable=True)
+    ) is None:
+        _LOGGER.warning("Unable to query %r; falling back to %r", url, str(mirror))
+        return [str(mirror), url]
+    local = _run(f"git ls-remote {mirror} {ref}", output=True, failable=True)
+    if (
+        (remote != "")
+        and (local is not None)
+        and (local.split()[:1] == remote.split()[:1])
+    ):
+        return [str(mirror), url]
+    _LOGGER.info("%r is stale for %r; fetching from %r", str(mirror), ref, url)
+    return [url]
+
+
+def _is_checked_out(path: Path, /) -> bool:
+    return (path / ".git").is_dir() and _run(
+        "git rev-parse -q --verify HEAD", failable=True, cwd=path
     )
-    if tag is None:
-        current = _run("git rev-parse --abbrev-ref HEAD", output=True, cwd=path)
-    else:
-        current = tag
-    if current == version:
-        _LOGGER.info("Pulling %r on %r...", str(path), current)
+
+
+def _ensure_pyz(
+    path: Path,
+    /,
+    *,
+    url: str | None = None,
+    sha256: str | None = None,
+    version: str | None = None,
+) -> Path | None:
+    # a downloaded archive is run as root, so it must match a pinned hash; that
+    # also refreshes a cached archive once the hash moves on
+    if (url is not None) and (sha256 is None):
+        msg = "'--pyz-url' requires '--pyz-sha256'"
+        raise RuntimeError(msg)
+    if (version is None) and (sha256 is None):
+        # the repo follows its HEAD, so an unpinned archive would soon be stale
+        _LOGGER.info(
+            "Skipping %r; it is only used with '--repo-version' or '--pyz-sha256'",
+            str(path),
+        )
+        return None
+    if _is_pyz_current(path, sha256=sha256, version=version):
+        return path
+    if (url is None) or (sha256 is None):
+        return None
+    _LOGGER.info("Downloading %r to %r...", url, str(path))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.part")
+    with urlopen(url, timeout=60) as resp, temp.open("wb") as fh:
+        copyfileobj(resp, fh)
+    if (actual := _get_sha256(temp)) != sha256.lower():
+        temp.unlink(missing_ok=True)
+        msg = f"{url!r} has SHA-256 {actual}, not {sha256}"
+        raise RuntimeError(msg)
+    _ = temp.replace(path)
+    return path if _is_pyz_current(path, version=version) else None
+
+
+def _get_sha256(path: Path, /) -> str:
+    hasher = sha256()
+    with path.open("rb") as fh:
+        while chunk := fh.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _is_pyz_current(
+    path: Path, /, *, sha256: str | None = None, version: str | None = None
+) -> bool:
+    try:
+        with ZipFile(path) as zf:
+            metadata = loads(zf.read(_PYZ_METADATA))
+    except (FileNotFoundError, BadZipFile, KeyError, ValueError):
+        return False
+    if (sha256 is not None) and (_get_sha256(path) != sha256.lower()):
+        _LOGGER.info("%r does not match SHA-256 %s", str(path), sha256)
+        return False
+    python = ".".join(map(str, version_info[:2]))
+    if metadata.get("python") != python:
+        _LOGGER.info(
+            "%r is built for Python %s, not %s",
+            str(path),
+            metadata.get("python"),
+            python,
+        )
+        return False
+    return (version is None) or (metadata.get("version") == version.removeprefix("v"))
+
+
+@contextmanager
+def _yield_venv(
+    path: Path, /, *, venvs: Path = _VENVS, plan: bool = False
+) -> Generator[Path]:
+    # the project itself is not installed; it is run from `src` via `PYTHONPATH`.
+    # `uv` picks the interpreter from `.python-version`, which may be a managed one
+    hasher = sha256()
+    for name in ["pyproject.toml", "uv.lock", ".python-version"]:
+        if (file := path / name).is_file():
+            hasher.update(file.read_bytes())
+    venvs = _get_venvs(venvs)
+    venv = venvs / hasher.hexdigest()[:16]
+    with (venvs / f"{venv.name}.lock").open("w") as fh:
+        flock(fh, LOCK_EX)
+        if _is_venv_complete(venv):
+            _LOGGER.info("Using environment %r", str(venv))
+            venv.touch()
+        else:
+            _install_uv(plan=plan)
+            _LOGGER.info("Syncing environment %r...", str(venv))
+            rmtree(venv, ignore_errors=True)
+            _run(
+                f"UV_PROJECT_ENVIRONMENT={venv} uv sync --frozen --no-dev --no-install-project",
+                cwd=path,
+            )
+            _ = (venv / _VENV_COMPLETE).write_text(_get_venv_python(venv) or "")
+        # held while the installer runs, so that it is not pruned
+        flock(fh, LOCK_SH)
+        _prune_venvs(venvs, keep=venv)
+        yield venv
+
+
+def _get_venvs(venvs: Path, /) -> Path:
+    # as with `extract_zipapp`, a non-root bootstrap falls back to its own cache
+    candidates = [venvs, Path.home() / ".cache/installer/venvs"]
+    for candidate in candidates:
         try:
-            _run("git pull", cwd=path)
-        except CalledProcessError:
-            _run("git checkout master", cwd=path)
-            _run("git pull", cwd=path)
-            _run(f"git branch -D {current}", cwd=path)
-            _run(f"git checkout {version}", cwd=path)
-        return
-    _LOGGER.info("We got curr = %r, ver = %r", current, version)
-    _LOGGER.info("Switching %r to %r...", str(path), version)
-    _run(f"git checkout {version}", cwd=path)
+            candidate.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            continue
+        if access(candidate, W_OK):
+            return candidate
+    msg = f"Unable to create environments in any of {list(map(str, candidates))}"
+    raise RuntimeError(msg)
+
+
+def _get_venv_python(venv: Path, /) -> str | None:
+    return _run(f"{venv}/bin/python3 --version", output=True, failable=True)
+
+
+def _is_venv_complete(venv: Path, /) -> bool:
+    # the interpreter it was synced with may since have been upgraded or removed
+    try:
+        version = (venv / _VENV_COMPLETE).read_text()
+    except FileNotFoundError:
+        return False
+    return (version != "") and (_get_venv_python(venv) == version)
+
+
+def _prune_venvs(venvs: Path, /, *, keep: Path, n: int = _VENVS_KEEP) -> None:
+    existing = sorted(
+        (p for p in venvs.iterdir() if (p / _VENV_COMPLETE).is_file() and (p != keep)),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for venv in existing[n - 1 :]:
+        # the lock files are kept, as another process may be waiting on one
+        with (venvs / f"{venv.name}.lock").open("w") as fh:
+            try:
+                flock(fh, LOCK_EX | LOCK_NB)
+            except BlockingIOError:
+                _LOGGER.info("Skipping environment %r; it is in use", str(venv))
+                continue
+            _LOGGER.info("Removing environment %r...", str(venv))
+            rmtree(venv, ignore_errors=True)
 
 
-def _install_uv() -> None:
+def _install_uv(*, plan: bool = False) -> None:
     if which("uv") is not None:
         return
+    if plan:
+        msg = "Unable to plan without 'uv'; install it, or use '--pyz'"
+        raise RuntimeError(msg)
     _ensure_apt_installed("curl")
     _LOGGER.info("Installing 'uv'...")
     url = "https://astral.sh/uv/install.sh"
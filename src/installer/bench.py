@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import JSONDecodeError, dumps, loads
+from logging import getLogger
+from os import environ, pathsep
+from pathlib import Path
+from runpy import run_module
+from subprocess import STDOUT
+from subprocess import run as subprocess_run
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import perf_counter, sleep
+from typing import TYPE_CHECKING, Any, override
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable, Mapping
+
+
+_LOGGER = getLogger(__name__)
+# seconds per invocation; the defaults are in line with a warm Debian host
+LATENCIES: dict[str, float] = {
+    "apt-get": 0.2,
+    "chpasswd": 0.02,
+    "chroot": 0.0,
+    "curl": 0.05,
+    "dpkg": 0.05,
+    "github": 0.02,
+    "mount": 0.0,
+    "ssh-keygen": 0.01,
+    "ssh-keyscan": 0.1,
+    "sshd": 0.01,
+    "systemctl": 0.05,
+    "umount": 0.0,
+    "useradd": 0.02,
+    "usermod": 0.02,
+}
+_ARGS = [
+    "--proxmox",
+    "--proxmox-pbs-password=bench",
+    "--create-non-root",
+    "--password=bench",
+    "--docker",
+]
+_ASSET = 4096 * b"\0"
+_DIRS = [
+    "etc/apt/keyrings",
+    "etc/apt/sources.list.d",
+    "etc/profile.d",
+    "etc/pve/priv/storage",
+    "etc/ssh/ssh_config.d",
+    "etc/ssh/sshd_config.d",
+    "usr/local/bin",
+    "var/lib/apt/lists",
+    "var/lib/dpkg",
+]
+_IMMUTABLE = ".bench-immutable"
+_SHIMS: dict[str, str] = {
+    "apt-get": """\
+if [ "$1" = install ]; then
+  for p in "$@"; do
+    case $p in
+      install | -*) ;;
+      *) printf 'Package: %s\\nStatus: install ok installed\\nVersion: 0\\n\\n' "$p" >>"$BENCH_ROOT/var/lib/dpkg/status" ;;
+    esac
+  done
+fi
+""",
+    "chroot": """\
+shift
+exec "$@"
+""",
+    "curl": """\
+cat <<'EOF'
+while [ $# -gt 0 ]; do [ "$1" = -b ] && dir=$2; shift; done
+mkdir -p "$dir" && printf '#!/bin/sh\\n' >"$dir/starship" && chmod +x "$dir/starship"
+EOF
+""",
+    "dpkg": """\
+for deb; do :; done
+name=$(basename "$deb")
+printf 'Package: %s\\nStatus: install ok installed\\nVersion: 0\\n\\n' "${name%%_*}" >>"$BENCH_ROOT/var/lib/dpkg/status"
+""",
+    "ssh-keyscan": """\
+for host; do :; done
+echo "$host ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIBENCHBENCHBENCHBENCHBENCHBENCHBENCHBENCH"
+""",
+}
+
+
+@dataclass(kw_only=True, slots=True)
+class BenchResult:
+    cold: float
+    converged: float
+    fleet: float
+    fleet_size: int
+    steps: dict[str, dict[str, float]] = field(default_factory=dict)
+
+
+def run_bench(
+    *, fleet_size: int = 8, latencies: Mapping[str, float] | None = None
+) -> BenchResult:
+    # runs the installer against fake roots, with the system simulated by shims
+    latencies_use = {**LATENCIES, **({} if latencies is None else latencies)}
+    with (
+        TemporaryDirectory(prefix="installer-bench-") as temp_dir,
+        _yield_github(latency=latencies_use["github"]) as github,
+    ):
+        temp = Path(temp_dir)
+        bin_ = _write_shims(temp / "bin", latencies=latencies_use)
+        root = _make_root(temp / "roots/0")
+        cold, cold_steps = _run_worker(root, bin_=bin_, github=github, name="cold")
+        converged, converged_steps = _run_worker(
+            root, bin_=bin_, github=github, name="converged"
+        )
+        roots = [_make_root(temp / f"roots/{i}") for i in range(1, fleet_size + 1)]
+        start = perf_counter()
+        with ThreadPoolExecutor(
+            max_workers=fleet_size, thread_name_prefix="bench"
+        ) as pool:
+            futures = [
+                pool.submit(_run_worker, r, bin_=bin_, github=github, name="fleet")
+                for r in roots
+            ]
+            _ = [f.result() for f in futures]
+        fleet = perf_counter() - start
+    return BenchResult(
+        cold=cold,
+        converged=converged,
+        fleet=fleet,
+        fleet_size=fleet_size,
+        steps={"cold": cold_steps, "converged": converged_steps},
+    )
+
+
+def compare_bench(
+    result: BenchResult, baseline: Path, /, *, tolerance: float = 0.5
+) -> list[str]:
+    # returns the timings which are slower than the baseline, beyond `tolerance`
+    try:
+        data = loads(baseline.read_text())
+    except (FileNotFoundError, JSONDecodeError):
+        msg = f"Invalid baseline {str(baseline)!r}"
+        raise ValueError(msg) from None
+    if data.get("fleet_size") != result.fleet_size:
+        msg = (
+            f"Baseline fleet size is {data.get('fleet_size')}; got {result.fleet_size}"
+        )
+        raise ValueError(msg)
+    regressions: list[str] = []
+    for name in ["cold", "converged", "fleet"]:
+        value, limit = getattr(result, name), (1 + tolerance) * data[name]
+        if value > limit:
+            regressions.append(f"{name} took {value:.2f}s; limit {limit:.2f}s")
+    return regressions
+
+
+def format_bench(result: BenchResult, /) -> str:
+    rows = [("RUN", "DURATION")]
+    rows.extend([
+        ("cold", f"{result.cold:.2f}s"),
+        ("converged", f"{result.converged:.2f}s"),
+        (f"fleet of {result.fleet_size}", f"{result.fleet:.2f}s"),
+    ])
+    width = max(len(r[0]) for r in rows)
+    return "\n".join(f"{r[0].ljust(width)}  {r[1]}" for r in rows)
+
+
+def write_bench(result: BenchResult, path: Path, /) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _ = path.write_text(
+        dumps(
+            {
+                "cold": result.cold,
+                "converged": result.converged,
+                "fleet": result.fleet,
+                "fleet_size": result.fleet_size,
+                "steps": result.steps,
+            },
+            indent=2,
+        )
+    )
+
+
+def _make_root(root: Path, /) -> Path:
+    for dir_ in _DIRS:
+        (root / dir_).mkdir(parents=True, exist_ok=True)
+    (root / "var/lib/dpkg/status").touch()
+    # the Docker key is fetched from outside GitHub, so it is seeded
+    _ = (root / "etc/apt/keyrings/docker.asc").write_text("bench\n")
+    for name in ["ceph", "pve-enterprise"]:
+        (root / f"etc/apt/sources.list.d/{name}.sources").touch()
+    return root
+
+
+def _run_worker(
+    root: Path, /, *, bin_: Path, github: str, name: str
+) -> tuple[float, dict[str, float]]:
+    trace = root.parent / f"{root.name}-{name}.json"
+    log = trace.with_suffix(".log")
+    env = {k: v for k, v in environ.items() if k != "PYTEST_VERSION"}
+    env.update({
+        "BENCH_ROOT": str(root),
+        "DOWNLOADS__CACHE": str(root / "var/cache/installer/downloads"),
+        "DOWNLOADS__GITHUB_API_URL": github,
+        "DOWNLOADS__GITHUB_URL": github,
+        "PATH": f"{bin_}{pathsep}{environ.get('PATH', '')}",
+        "SUBNET": "main",
+    })
+    cmd = [
+        sys.executable,
+        "-m",
+        "installer.bench",
+        str(root),
+        f"--root={root}",
+        *_ARGS,
+        f"--trace-file={trace}",
+    ]
+    start = perf_counter()
+    with log.open("wb") as fh:
+        result = subprocess_run(cmd, stdout=fh, stderr=STDOUT, env=env, check=False)
+    duration = perf_counter() - start
+    if result.returncode != 0:
+        msg = f"Benchmark {name!r} failed with exit code {result.returncode}:\n{log.read_text()}"
+        raise RuntimeError(msg)
+    spans = map(loads, trace.with_suffix(".summary.jsonl").read_text().splitlines())
+    steps = {s["name"]: s["duration"] for s in spans if s["category"] == "step"}
+    _LOGGER.info("Benchmark %r took %.2fs", name, duration)
+    return duration, steps
+
+
+def _write_shims(path: Path, /, *, latencies: Mapping[str, float]) -> Path:
+    path.mkdir(parents=True, exist_ok=True)
+    for name, latency in latencies.items():
+        if name == "github":
+            continue
+        shim = path / name
+        _ = shim.write_text(f"#!/bin/sh\nsleep {latency}\n{_SHIMS.get(name, '')}")
+        shim.chmod(0o755)
+    return path
+
+
+@contextmanager
+def _yield_github(*, latency: float) -> Generator[str]:
+    # a stand-in for the GitHub API and release downloads
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            self._respond(body=True)
+
+        def do_HEAD(self) -> None:
+            self._respond(body=False)
+
+        @override
+        def log_message(self, format: str, *args: Any) -> None:
+            _ = (format, args)
+
+        def _respond(self, *, body: bool) -> None:
+            sleep(latency)
+            if self.path.endswith("/releases/latest"):
+                content = dumps({"tag_name": "v1.0.0", "assets": []}).encode()
+            elif "/releases/download/" in self.path:
+                content = _ASSET
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            if body:
+                _ = self.wfile.write(content)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _simulate_immutable(root: Path, /) -> None:
+    # setting the immutable flag needs `CAP_LINUX_IMMUTABLE`, so it is recorded
+    # in a file in the fake root instead
+    import installer.setups
+    import installer.utilities
+
+    path = root / _IMMUTABLE
+    try:
+        flags = set(path.read_text().splitlines())
+    except FileNotFoundError:
+        flags = set[str]()
+
+    def is_immutable(p: Path, /) -> bool:
+        return str(p) in flags
+
+    def set_immutable(p: Path, /) -> None:
+        flags.add(str(p))
+        _ = path.write_text("".join(f"{f}\n" for f in sorted(flags)))
+
+    def clear_immutable(p: Path, /) -> None:
+        flags.discard(str(p))
+        _ = path.write_text("".join(f"{f}\n" for f in sorted(flags)))
+
+    installer.setups.is_immutable = is_immutable
+    installer.setups.set_immutable = set_immutable
+    installer.utilities.clear_immutable = clear_immutable
+    installer.utilities.is_immutable = is_immutable
+
+
+def _main(argv: Iterable[str], /) -> None:
+    # rooted from the start, as the worker is not under `pytest` and anything
+    # resolved before `--root` is parsed, e.g. the settings snapshots, would
+    # otherwise land on this host
+    from installer.rootfs import yield_root
+
+    root, *args = argv
+    _simulate_immutable(Path(root))
+    sys.argv = ["installer", *args]
+    with yield_root(Path(root)):
+        _ = run_module("installer.main", run_name="__main__", alter_sys=True)
+
+
+__all__ = [
+    "LATENCIES",
+    "BenchResult",
+    "compare_bench",
+    "format_bench",
+    "run_bench",
+    "write_bench",
+]
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
@@ -12,6 +12,9 @@ CONFIGS_SSH = CONFIGS / "ssh"
 CONFIGS_SSH_AUTHORIZED_KEYS = CONFIGS_SSH / "authorized_keys"
 
 
+ENTRYPOINT_URL = "https://raw.githubusercontent.com/queensberry-research/installer/refs/heads/master/entrypoint.py"
+
+
 ROOT = "root"
 NONROOT = "nonroot"
 HOME_ROOT = Path("/root")
@@ -25,6 +28,7 @@ __all__ = [
     "CONFIGS_PROXMOX_STORAGE_CFG",
     "CONFIGS_SSH",
     "CONFIGS_SSH_AUTHORIZED_KEYS",
+    "ENTRYPOINT_URL",
     "HOME_NONROOT",
     "HOME_ROOT",
     "NONROOT",
@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+from logging import getLogger
+from os import O_RDWR, close, fsync, pread, pwrite
+from os import open as os_open
+from queue import Full, Queue
+from stat import S_IXUSR
+from threading import Event, Lock
+from time import time
+from typing import TYPE_CHECKING, Any
+
+from requests import RequestException, Response, get, head
+from utilities.atomicwrites import writer
+
+from installer.settings import get_settings
+from installer.utilities import add_mode, substitute
+
+if TYPE_CHECKING:
+    from _hashlib import HASH
+    from collections.abc import Generator
+    from pathlib import Path
+
+
+_LOGGER = getLogger(__name__)
+_LOCK = Lock()
+# chunks per part buffered ahead of the hasher
+_QUEUE_SIZE = 16
+_QUEUE_TIMEOUT = 0.1
+
+
+def get_github_release(
+    owner: str,
+    repo: str,
+    /,
+    *,
+    api_url: str | None = None,
+    cache: Path | None = None,
+    ttl: int | None = None,
+) -> dict[str, Any]:
+    cache_use = get_settings().downloads.cache if cache is None else cache
+    ttl_use = get_settings().downloads.ttl if ttl is None else ttl
+    path = cache_use / owner / repo / "latest.json"
+    try:
+        cached = loads(path.read_text())
+    except (FileNotFoundError, JSONDecodeError):
+        cached = None
+    if (cached is not None) and (time() - cached["fetched"] < ttl_use):
+        _LOGGER.info("Using cached release for %s/%s", owner, repo)
+        return cached["release"]
+    headers: dict[str, str] = {"Accept": "application/vnd.github+json"}
+    if (cached is not None) and (cached.get("etag") is not None):
+        headers["If-None-Match"] = cached["etag"]
+    api_url_use = (
+        get_settings().downloads.github_api_url if api_url is None else api_url
+    )
+    url = f"{api_url_use}/repos/{owner}/{repo}/releases/latest"
+    try:
+        resp = get(url, headers=headers, timeout=get_settings().downloads.timeout)
+        resp.raise_for_status()
+    except RequestException:
+        if cached is None:
+            raise
+        _LOGGER.warning("Unable to revalidate %s/%s; using cached release", owner, repo)
+        return cached["release"]
+    if resp.status_code == 304 and (cached is not None):
+        _LOGGER.info("Cached release for %s/%s is still current", owner, repo)
+        release = cached["release"]
+        etag = cached.get("etag")
+    else:
+        release = resp.json()
+        etag = resp.headers.get("ETag")
+    _write_text(path, dumps({"etag": etag, "fetched": time(), "release": release}))
+    return release
+
+
+def get_github_asset(
+    owner: str,
+    repo: str,
+    filename: str,
+    /,
+    *,
+    api_url: str | None = None,
+    url: str | None = None,
+    cache: Path | None = None,
+    ttl: int | None = None,
+) -> Path:
+    cache_use = get_settings().downloads.cache if cache is None else cache
+    release = get_github_release(owner, repo, api_url=api_url, cache=cache_use, ttl=ttl)
+    tag = release["tag_name"]
+    filename_use = substitute(filename, tag=tag, tag_without=tag.lstrip("v"))
+    digest = _get_published_digest(release, filename_use)
+    path = cache_use / owner / repo / tag / filename_use
+    sidecar = path.with_name(f"{path.name}.sha256")
+    with _LOCK:
+        if path.is_file() and sidecar.is_file():
+            expected = sidecar.read_text().strip()
+            if (_hash_file(path) == expected) and (digest in {None, expected}):
+                _LOGGER.info("Using cached %r", str(path))
+                return path
+            _LOGGER.warning("Cached %r is corrupt; downloading again", str(path))
+        url_use = get_settings().downloads.github_url if url is None else url
+        asset_url = f"{url_use}/{owner}/{repo}/releases/download/{tag}/{filename_use}"
+        hexdigest = download(asset_url, path, digest=digest)
+        _write_text(sidecar, hexdigest)
+        add_mode(path, S_IXUSR)
+        return path
+
+
+def download(
+    url: str,
+    path: Path,
+    /,
+    *,
+    digest: str | None = None,
+    chunk_size: int | None = None,
+    parallelism: int | None = None,
+    part_size: int | None = None,
+) -> str:
+    chunk_size_use = (
+        get_settings().downloads.chunk_size if chunk_size is None else chunk_size
+    )
+    parallelism_use = (
+        get_settings().downloads.parallelism if parallelism is None else parallelism
+    )
+    part_size_use = (
+        get_settings().downloads.part_size if part_size is None else part_size
+    )
+    _LOGGER.info("Downloading %r...", url)
+    resp = _head(url)
+    size = int(resp.headers.get("Content-Length", 0))
+    if (resp.headers.get("Accept-Ranges") != "bytes") or (size <= part_size_use):
+        hexdigest = _download_stream(url, path, chunk_size=chunk_size_use)
+    else:
+        hexdigest = _download_ranges(
+            resp.url,
+            path,
+            size=size,
+            etag=resp.headers.get("ETag"),
+            chunk_size=chunk_size_use,
+            parallelism=parallelism_use,
+            part_size=part_size_use,
+        )
+    if (digest is not None) and (hexdigest != digest):
+        path.unlink(missing_ok=True)
+        msg = f"{url!r} has SHA-256 {hexdigest}; expected {digest}"
+        raise ValueError(msg)
+    return hexdigest
+
+
+@contextmanager
+def yield_github_download(
+    owner: str,
+    repo: str,
+    filename: str,
+    /,
+    *,
+    api_url: str | None = None,
+    url: str | None = None,
+    cache: Path | None = None,
+) -> Generator[Path]:
+    yield get_github_asset(owner, repo, filename, api_url=api_url, url=url, cache=cache)
+
+
+def _download_ranges(
+    url: str,
+    path: Path,
+    /,
+    *,
+    size: int,
+    etag: str | None,
+    chunk_size: int,
+    parallelism: int,
+    part_size: int,
+) -> str:
+    # parts are written in parallel, and their chunks hashed in order as they
+    # arrive, as SHA-256 cannot combine digests of parts; the queues are bounded,
+    # so a worker ahead of the hasher waits rather than buffering its part. Only
+    # parts done by an earlier, interrupted, download are read back
+    part = path.with_name(f"{path.name}.part")
+    state = path.with_name(f"{path.name}.part.json")
+    key = {"url": url.split("?", maxsplit=1)[0], "size": size, "etag": etag}
+    try:
+        data = loads(state.read_text())
+    except (FileNotFoundError, JSONDecodeError):
+        data = None
+    if (data is not None) and (data.get("key") == key) and part.is_file():
+        done = set(data["done"])
+        _LOGGER.info("Resuming %r with %d part(s) done", str(path), len(done))
+    else:
+        done = set[int]()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with part.open("wb") as fh:
+            _ = fh.truncate(size)
+    ranges = [(s, min(s + part_size, size) - 1) for s in range(0, size, part_size)]
+    queues = {
+        i: Queue[bytes | Exception | None](maxsize=_QUEUE_SIZE)
+        for i in range(len(ranges))
+    }
+    stop = Event()
+    lock = Lock()
+    fd = os_open(part, O_RDWR)
+
+    def fetch(i: int, /) -> None:
+        try:
+            _fetch_range(
+                url, fd, ranges[i], queue=queues[i], stop=stop, chunk_size=chunk_size
+            )
+            with lock:
+                done.add(i)
+                _write_text(state, dumps({"key": key, "done": sorted(done)}))
+        except Exception as error:  # noqa: BLE001
+            _ = _put(queues[i], error, stop=stop)
+        else:
+            _ = _put(queues[i], None, stop=stop)
+
+    hasher = sha256()
+    try:
+        with ThreadPoolExecutor(
+            max_workers=parallelism, thread_name_prefix="download"
+        ) as pool:
+            pending = [i for i in range(len(ranges)) if i not in done]
+            for i in pending:
+                _ = pool.submit(fetch, i)
+            try:
+                for i, (start, end) in enumerate(ranges):
+                    if i not in pending:
+                        _hash_range(hasher, fd, start, end - start + 1, chunk_size)
+                        continue
+                    while (item := queues[i].get()) is not None:
+                        if isinstance(item, Exception):
+                            raise item
+                        hasher.update(item)
+            finally:
+                stop.set()
+        fsync(fd)
+    finally:
+        close(fd)
+    _ = part.replace(path)
+    state.unlink(missing_ok=True)
+    return hasher.hexdigest()
+
+
+def _download_stream(url: str, path: Path, /, *, chunk_size: int) -> str:
+    hasher = sha256()
+    with (
+        get(url, timeout=get_settings().downloads.timeout, stream=True) as resp,
+        writer(path, overwrite=True) as temp,
+    ):
+        resp.raise_for_status()
+        with temp.open("wb") as fh:
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    hasher.update(chunk)
+                    _ = fh.write(chunk)
+    return hasher.hexdigest()
+
+
+def _fetch_range(
+    url: str,
+    fd: int,
+    range_: tuple[int, int],
+    /,
+    *,
+    queue: Queue[bytes | Exception | None],
+    stop: Event,
+    chunk_size: int,
+) -> None:
+    start, end = range_
+    with get(
+        url,
+        headers={"Range": f"bytes={start}-{end}"},
+        timeout=get_settings().downloads.timeout,
+        stream=True,
+    ) as resp:
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            msg = f"{url!r} ignored the range request"
+            raise ValueError(msg)
+        offset = start
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            if stop.is_set():
+                msg = f"Download of {url!r} was cancelled"
+                raise RuntimeError(msg)
+            if chunk:
+                _ = pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                if not _put(queue, chunk, stop=stop):
+                    msg = f"Download of {url!r} was cancelled"
+                    raise RuntimeError(msg)
+
+
+def _get_published_digest(release: dict[str, Any], filename: str, /) -> str | None:
+    for asset in release.get("assets", []):
+        if (asset.get("name") == filename) and isinstance(
+            digest := asset.get("digest"), str
+        ):
+            algorithm, _, value = digest.partition(":")
+            return value if algorithm == "sha256" else None
+    return None
+
+
+def _hash_file(path: Path, /) -> str:
+    hasher = sha256()
+    with path.open("rb") as fh:
+        while chunk := fh.read(get_settings().downloads.chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _hash_range(
+    hasher: HASH, fd: int, offset: int, length: int, chunk_size: int, /
+) -> None:
+    end = offset + length
+    while offset < end:
+        if len(chunk := pread(fd, min(chunk_size, end - offset), offset)) == 0:
+            msg = f"Unexpected end of file at offset {offset}"
+            raise EOFError(msg)
+        hasher.update(chunk)
+        offset += len(chunk)
+
+
+def _head(url: str, /) -> Response:
+    resp = head(url, allow_redirects=True, timeout=get_settings().downloads.timeout)
+    resp.raise_for_status()
+    return resp
+
+
+def _put(
+    queue: Queue[bytes | Exception | None],
+    item: bytes | Exception | None,
+    /,
+    *,
+    stop: Event,
+) -> bool:
+    # a worker waits for the hasher, unless it has stopped
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=_QUEUE_TIMEOUT)
+        except Full:
+            continue
+        return True
+    return False
+
+
+def _write_text(path: Path, text: str, /) -> None:
+    with writer(path, overwrite=True) as temp:
+        _ = temp.write_text(text)
+
+
+__all__ = [
+    "download",
+    "get_github_asset",
+    "get_github_release",
+    "yield_github_download",
+]
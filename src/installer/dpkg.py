@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+from installer.rootfs import rooted
+
+DPKG_STATUS = Path("/var/lib/dpkg/status")
+_LOCK = Lock()
+_CACHE: dict[Path, tuple[int, _Index]] = {}
+_FIELDS = {"Package", "Status", "Version", "Architecture"}
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class DpkgPackage:
+    name: str
+    status: str
+    version: str | None = None
+    architecture: str | None = None
+
+    @property
+    def installed(self) -> bool:
+        return self.status.rsplit(" ", maxsplit=1)[-1] == "installed"
+
+
+@dataclass(kw_only=True, slots=True)
+class _Index:
+    by_name: dict[str, DpkgPackage]
+    by_arch: dict[tuple[str, str | None], DpkgPackage]
+
+
+def get_dpkg_status(*, path: Path | None = None) -> dict[str, DpkgPackage]:
+    return _get_index(path=path).by_name
+
+
+def get_installed_versions(
+    *pkgs: str, path: Path | None = None
+) -> dict[str, str | None]:
+    index = _get_index(path=path)
+    versions: dict[str, str | None] = {}
+    for pkg in pkgs:
+        name, _, arch = pkg.partition(":")
+        if arch == "":
+            package = index.by_name.get(name)
+        else:
+            # `Architecture: all` packages satisfy any architecture
+            package = index.by_arch.get((name, arch), index.by_arch.get((name, "all")))
+        versions[pkg] = (
+            package.version if (package is not None) and package.installed else None
+        )
+    return versions
+
+
+def is_installed(pkg: str, /, *, path: Path | None = None) -> bool:
+    return get_installed_versions(pkg, path=path)[pkg] is not None
+
+
+def _get_index(*, path: Path | None = None) -> _Index:
+    path = rooted(DPKG_STATUS) if path is None else path
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return _Index(by_name={}, by_arch={})
+    with _LOCK:
+        try:
+            cached_mtime, index = _CACHE[path]
+        except KeyError:
+            pass
+        else:
+            if cached_mtime == mtime:
+                return index
+        index = _parse_dpkg_status(path.read_text(errors="replace"))
+        _CACHE[path] = (mtime, index)
+        return index
+
+
+def _parse_dpkg_status(text: str, /) -> _Index:
+    packages: dict[str, DpkgPackage] = {}
+    by_arch: dict[tuple[str, str | None], DpkgPackage] = {}
+    for stanza in text.split("\n\n"):
+        fields: dict[str, str] = {}
+        for line in stanza.splitlines():
+            if line.startswith((" ", "\t")):
+                continue
+            key, _, value = line.partition(":")
+            if key in _FIELDS:
+                fields[key] = value.strip()
+        try:
+            name, status = fields["Package"], fields["Status"]
+        except KeyError:
+            continue
+        package = DpkgPackage(
+            name=name,
+            status=status,
+            version=fields.get("Version"),
+            architecture=fields.get("Architecture"),
+        )
+        by_arch[name, package.architecture] = package
+        # multi-arch packages appear once per architecture; prefer installed ones
+        if (name not in packages) or (
+            package.installed and not packages[name].installed
+        ):
+            packages[name] = package
+    return _Index(by_name=packages, by_arch=by_arch)
+
+
+__all__ = [
+    "DPKG_STATUS",
+    "DpkgPackage",
+    "get_dpkg_status",
+    "get_installed_versions",
+    "is_installed",
+]
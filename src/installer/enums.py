@@ -3,7 +3,13 @@ from __future__ import annotations
 from enum import StrEnum, unique
 from typing import assert_never
 
-from installer.settings import SETTINGS
+from installer.settings import get_settings
+
+
+@unique
+class GuestKind(StrEnum):
+    lxc = "lxc"
+    qemu = "qemu"
 
 
 @unique
@@ -16,13 +22,13 @@ class Subnet(StrEnum):
     def n(self) -> int:
         match self:
             case Subnet.qrt:
-                return SETTINGS.subnets.qrt
+                return get_settings().subnets.qrt
             case Subnet.main:
-                return SETTINGS.subnets.main
+                return get_settings().subnets.main
             case Subnet.test:
-                return SETTINGS.subnets.test
+                return get_settings().subnets.test
             case never:
                 assert_never(never)
 
 
-__all__ = ["Subnet"]
+__all__ = ["GuestKind", "Subnet"]
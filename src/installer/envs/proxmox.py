@@ -1,14 +1,37 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field, replace
 from logging import getLogger
-from pathlib import Path
+from os import O_CREAT, O_TRUNC, O_WRONLY, close, write
+from os import open as os_open
+from typing import TYPE_CHECKING
+
+from utilities.os import is_pytest
 
 from installer.constants import CONFIGS_PROXMOX, CONFIGS_PROXMOX_STORAGE_CFG
-from installer.utilities import copy, dpkg_install, is_copied, yield_github_download
+from installer.downloads import yield_github_download
+from installer.managed import PROXMOX_STORAGE_CFG
+from installer.plan import ChangeKind, get_file_diff, is_planning, record_change
+from installer.rootfs import rooted
+from installer.utilities import dpkg_install, substitute
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
 
 _LOGGER = getLogger(__name__)
 
 
+@dataclass(kw_only=True, slots=True)
+class _Stanza:
+    type_: str
+    options: dict[str, str] = field(default_factory=dict)
+    # comment lines above the header, and for the last stanza, below it; these
+    # are carried through a merge, but never trigger one
+    comments: list[str] = field(default_factory=list, compare=False)
+    trailer: list[str] = field(default_factory=list, compare=False)
+
+
 def setup_proxmox(
     *, storage_cfg: Path = CONFIGS_PROXMOX_STORAGE_CFG, pbs_password: str | None = None
 ) -> None:
@@ -24,19 +47,24 @@ def _remove_apt_sources() -> None:
     paths = {
         p
         for n in ["ceph", "pve-enterprise"]
-        if (p := Path(f"/etc/apt/sources.list.d/{n}.sources")).is_file()
+        if (p := rooted(f"/etc/apt/sources.list.d/{n}.sources")).is_file()
     }
     if len(paths) == 0:
         _LOGGER.info("'apt' sources already removed")
     else:
         _LOGGER.info("Removing 'apt' sources...")
         for p in paths:
-            p.unlink(missing_ok=True)
+            if not record_change(ChangeKind.file, str(p), detail="delete"):
+                p.unlink(missing_ok=True)
 
 
 def _setup_pve_fake_subscription() -> None:
-    path = Path("/etc/pve/.pve_fake_subscription_ran")
-    if not path.exists():
+    path = rooted("/etc/pve/.pve_fake_subscription_ran")
+    if path.exists():
+        _LOGGER.info("'pve-fake-subscription' is already installed")
+    elif not record_change(
+        ChangeKind.package, "pve-fake-subscription", detail="install"
+    ):
         with yield_github_download(
             "jamesits",
             "pve-fake-subscription",
@@ -47,22 +75,102 @@ def _setup_pve_fake_subscription() -> None:
 
 
 def _setup_storage_cfg(*, src: Path = CONFIGS_PROXMOX_STORAGE_CFG) -> None:
-    dest = Path("/etc/pve/storage.cfg")
-    if is_copied(src, dest):
-        _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
-    else:
-        _LOGGER.info("Copying %r -> %r...", str(src), str(dest))
-        copy(src, dest)
+    _ = _merge_storage_cfg(src.read_text(), src=str(src))
+
+
+def _merge_storage_cfg(text: str, /, *, src: str) -> bool:
+    # only the storages in `text` are managed; any others, e.g. added in the web
+    # UI, are kept as they are
+    dest = rooted(PROXMOX_STORAGE_CFG.path)
+    current = _parse_storage_cfg(dest.read_text()) if dest.is_file() else {}
+    merged = current | {
+        id_: replace(s, comments=c.comments, trailer=c.trailer)
+        if (c := current.get(id_)) is not None
+        else s
+        for id_, s in _parse_storage_cfg(text).items()
+    }
+    if merged == current:
+        _LOGGER.info("%r -> %r is already merged", src, str(dest))
+        return False
+    _LOGGER.info("Merging %r -> %r...", src, str(dest))
+    _write_pmxcfs(dest, _format_storage_cfg(merged))
+    return True
 
 
 def _setup_pbs_data_pw(*, password: str | None = None) -> None:
-    dest = Path("/etc/pve/priv/storage/pbs-data.pw")
+    dest = rooted("/etc/pve/priv/storage/pbs-data.pw")
     if password is None:
         _LOGGER.info("Skipping %r", str(dest))
+        return
+    src = CONFIGS_PROXMOX / "pbs-data.pw"
+    text = substitute(src.read_text(), password=password)
+    if dest.is_file() and (dest.read_text().strip() == text.strip()):
+        _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
-        src = CONFIGS_PROXMOX / "pbs-data.pw"
-        _LOGGER.info("Copying %4 -> %r...", str(src), str(dest))
-        copy(src, dest, password=password)
+        _LOGGER.info("Copying %r -> %r...", str(src), str(dest))
+        _write_pmxcfs(dest, text, detail="(contents hidden)")
+
+
+def _format_storage_cfg(stanzas: dict[str, _Stanza], /) -> str:
+    return "\n".join(
+        "".join([
+            *(f"{c}\n" for c in s.comments),
+            f"{s.type_}: {id_}\n",
+            *(f"\t{k} {v}".rstrip() + "\n" for k, v in s.options.items()),
+            *(f"{c}\n" for c in s.trailer),
+        ])
+        for id_, s in stanzas.items()
+    )
+
+
+def _parse_storage_cfg(text: str, /) -> dict[str, _Stanza]:
+    # a stanza is a `type: id` header, then indented `key value` lines, where
+    # flags have no value; storage IDs are unique across types
+    stanzas: dict[str, _Stanza] = {}
+    stanza: _Stanza | None = None
+    comments: list[str] = []
+    for line in text.splitlines():
+        if line.strip() == "":
+            continue
+        if line.lstrip().startswith("#"):
+            comments.append(line.rstrip())
+            continue
+        if not line[0].isspace():
+            type_, _, id_ = line.partition(":")
+            stanza = stanzas[id_.strip()] = _Stanza(
+                type_=type_.strip(), comments=comments
+            )
+            comments = []
+        elif stanza is None:
+            msg = f"Invalid storage config; got {line!r} outside a stanza"
+            raise ValueError(msg)
+        else:
+            key, _, value = line.strip().partition(" ")
+            stanza.options[key] = value.strip()
+    if stanza is not None:
+        stanza.trailer = comments
+    return stanzas
+
+
+def _write_pmxcfs(dest: Path, text: str, /, *, detail: str | None = None) -> None:
+    # pmxcfs replicates every write across the cluster, so the file is written in
+    # place, in one `write`, rather than via a temporary file and a rename
+    if is_planning() and (detail is None):
+        detail = get_file_diff(dest, text)
+    if (
+        record_change(ChangeKind.file, str(dest), detail=detail, content=text)
+        or is_pytest()
+    ):
+        return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    content = text.encode()
+    fd = os_open(dest, O_WRONLY | O_CREAT | O_TRUNC, 0o640)
+    try:
+        if (n := write(fd, content)) != len(content):
+            msg = f"Short write to {str(dest)!r}; wrote {n} of {len(content)} bytes"
+            raise OSError(msg)
+    finally:
+        close(fd)
 
 
 __all__ = ["setup_proxmox"]
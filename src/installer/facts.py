@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import asdict, dataclass
+from hashlib import sha256
+from ipaddress import IPv4Address, IPv4Network
+from itertools import pairwise
+from json import JSONDecodeError, dumps, loads
+from logging import getLogger
+from pathlib import Path
+from pwd import getpwnam
+from subprocess import PIPE, CalledProcessError, check_output
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+from utilities.atomicwrites import writer
+from utilities.functools import cache
+from utilities.os import is_pytest
+
+from installer.constants import NONROOT
+from installer.plan import is_planning
+from installer.rootfs import is_rooted, rooted
+from installer.trace import yield_span
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+_LOGGER = getLogger(__name__)
+FACTS = Path("/var/cache/installer/facts.json")
+_BOOT_ID = Path("/proc/sys/kernel/random/boot_id")
+_PASSWD = Path("/etc/passwd")
+_PVE = Path("/etc/pve")
+_FIB_LEAF = re.compile(r"^\s+\|-- (\d+\.\d+\.\d+\.\d+)$")
+_FIB_TRIE = Path("/proc/net/fib_trie")
+_ROUTE = Path("/proc/net/route")
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class Facts:
+    container: str | None
+    vm: str | None
+    proxmox: bool
+    non_root: bool
+    ips: tuple[str, ...]
+
+
+class FactsCache:
+    def __init__(self, path: Path = FACTS, /) -> None:
+        super().__init__()
+        self.path = path
+        self.entries: dict[str, tuple[str, Any]] = {}
+        self._lock = Lock()
+        self._dirty = False
+        try:
+            data = loads(path.read_text())
+        except (FileNotFoundError, JSONDecodeError):
+            return
+        self.entries = {
+            k: (v["key"], v["value"])
+            for k, v in data.items()
+            if (k in _FACTS) and isinstance(v, dict) and ({"key", "value"} <= v.keys())
+        }
+
+    def gather(self, *, jobs: int | None = None) -> Facts:
+        keys = {n: get_key() for n, (get_key, _) in _FACTS.items()}
+        with self._lock:
+            stale = [
+                n
+                for n, k in keys.items()
+                if ((entry := self.entries.get(n)) is None) or (entry[0] != k)
+            ]
+        if len(stale) >= 1:
+            with ThreadPoolExecutor(
+                max_workers=len(stale) if jobs is None else jobs,
+                thread_name_prefix="facts",
+            ) as pool:
+                _ = list(pool.map(self.get, stale))
+            self.save()
+        with self._lock:
+            values = {n: self.entries[n][1] for n in _FACTS}
+        return Facts(
+            container=values["container"],
+            vm=values["vm"],
+            proxmox=values["proxmox"],
+            non_root=values["non_root"],
+            ips=tuple(values["ips"]),
+        )
+
+    def get(self, name: str, /) -> Any:
+        # each fact is re-probed only when its key, e.g. an mtime, has changed
+        get_key, probe = _FACTS[name]
+        key = get_key()
+        with self._lock:
+            entry = self.entries.get(name)
+        if (entry is not None) and (entry[0] == key):
+            return entry[1]
+        with yield_span(name, category="fact"):
+            value = probe()
+        _LOGGER.debug("Probed fact %r = %r", name, value)
+        with self._lock:
+            self.entries[name] = (key, value)
+            self._dirty = True
+        return value
+
+    def save(self) -> None:
+        with self._lock:
+            if (not self._dirty) or is_pytest() or is_planning():
+                return
+            text = dumps(
+                {
+                    k: {"key": key, "value": v}
+                    for k, (key, v) in sorted(self.entries.items())
+                },
+                indent=2,
+            )
+            try:
+                with writer(self.path, overwrite=True) as temp:
+                    _ = temp.write_text(text)
+            except OSError:
+                _LOGGER.warning("Unable to write facts %r", str(self.path))
+                return
+            self._dirty = False
+
+
+@cache
+def get_facts_cache() -> FactsCache:
+    return FactsCache(rooted(FACTS))
+
+
+def get_facts() -> Facts:
+    return get_facts_cache().gather()
+
+
+def format_facts(facts: Facts, /) -> str:
+    return dumps(asdict(facts), indent=2)
+
+
+def _get_boot_id() -> str:
+    try:
+        return _BOOT_ID.read_text().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def _get_passwd_key() -> str:
+    try:
+        return str(rooted(_PASSWD).stat().st_mtime_ns)
+    except FileNotFoundError:
+        return ""
+
+
+def _get_ips_key() -> str:
+    hasher = sha256(_get_boot_id().encode())
+    for path in [_FIB_TRIE, _ROUTE]:
+        with suppress(FileNotFoundError):
+            hasher.update(path.read_bytes())
+    return hasher.hexdigest()
+
+
+def _probe_ips() -> list[str]:
+    # local addresses, those on the default route's interface first
+    try:
+        addresses = _parse_fib_trie(_FIB_TRIE.read_text())
+    except FileNotFoundError:
+        return []
+    try:
+        routes = _parse_route(_ROUTE.read_text())
+    except FileNotFoundError:
+        routes = []
+    defaults = [(r.metric, r.iface) for r in routes if r.network.prefixlen == 0]
+    default = min(defaults)[1] if len(defaults) >= 1 else None
+
+    def key(address: IPv4Address, /) -> tuple[bool, IPv4Address]:
+        ifaces = {
+            r.iface
+            for r in routes
+            if (r.network.prefixlen >= 1) and (address in r.network)
+        }
+        return default not in ifaces, address
+
+    return [str(a) for a in sorted(addresses, key=key)]
+
+
+def _probe_non_root() -> bool:
+    if is_rooted():
+        try:
+            lines = rooted(_PASSWD).read_text().splitlines()
+        except FileNotFoundError:
+            return False
+        return any(line.split(":", maxsplit=1)[0] == NONROOT for line in lines)
+    try:
+        _ = getpwnam(NONROOT)
+    except KeyError:
+        return False
+    return True
+
+
+def _probe_virt(flag: str, /) -> str | None:
+    if is_rooted():  # the target is not running
+        return None
+    try:
+        output = check_output(
+            ["systemd-detect-virt", flag], stderr=PIPE, text=True
+        ).strip()
+    except (CalledProcessError, FileNotFoundError):
+        return None
+    return None if output in {"", "none"} else output
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class _Route:
+    iface: str
+    network: IPv4Network
+    metric: int
+
+
+def _parse_fib_trie(text: str, /) -> list[IPv4Address]:
+    addresses: set[IPv4Address] = set()
+    lines = text.splitlines()
+    for line, next_ in pairwise(lines):
+        if ((match := _FIB_LEAF.match(line)) is not None) and (
+            next_.strip() == "/32 host LOCAL"
+        ):
+            address = IPv4Address(match.group(1))
+            if not address.is_loopback:
+                addresses.add(address)
+    return sorted(addresses)
+
+
+def _parse_route(text: str, /) -> list[_Route]:
+    routes: list[_Route] = []
+    for line in text.splitlines()[1:]:
+        try:
+            iface, dest, _, _, _, _, metric, mask, *_ = line.split()
+            network = IPv4Network(
+                (_parse_hex_address(dest), str(_parse_hex_address(mask))), strict=False
+            )
+        except ValueError:
+            continue
+        routes.append(_Route(iface=iface, network=network, metric=int(metric)))
+    return routes
+
+
+def _parse_hex_address(text: str, /) -> IPv4Address:
+    # `/proc/net/route` holds addresses in host (little-endian) byte order
+    return IPv4Address(int(text, 16).to_bytes(4, "little"))
+
+
+_FACTS: dict[str, tuple[Callable[[], str], Callable[[], Any]]] = {
+    "container": (_get_boot_id, lambda: _probe_virt("--container")),
+    "vm": (_get_boot_id, lambda: _probe_virt("--vm")),
+    "proxmox": (_get_boot_id, lambda: rooted(_PVE).is_dir()),
+    "non_root": (_get_passwd_key, _probe_non_root),
+    "ips": (_get_ips_key, _probe_ips),
+}
+
+
+__all__ = [
+    "FACTS",
+    "Facts",
+    "FactsCache",
+    "format_facts",
+    "get_facts",
+    "get_facts_cache",
+]
@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from json import JSONDecodeError
+from json import loads as json_loads
+from logging import getLogger
+from shlex import join, quote
+from subprocess import STDOUT, TimeoutExpired
+from subprocess import run as subprocess_run
+from sys import executable
+from time import perf_counter
+from tomllib import loads
+from typing import TYPE_CHECKING, assert_never
+
+from pydantic import BaseModel
+from requests import get
+
+from installer.constants import ENTRYPOINT_URL
+from installer.enums import GuestKind, Subnet
+from installer.scheduler import StepStatus
+from installer.settings import get_settings
+from installer.utilities import run
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+
+_LOGGER = getLogger(__name__)
+GUEST_PYZ = "/tmp/installer.pyz"  # noqa: S108
+_AGENT_CHUNK = 1 << 19
+
+
+class Host(BaseModel):
+    hostname: str
+    user: str | None = None
+    port: int | None = None
+    subnet: Subnet | None = None
+    version: str | None = None
+    proxmox: bool | None = None
+    proxmox_pbs_password: str | None = None
+    create_non_root: bool | None = None
+    password: str | None = None
+    docker: bool | None = None
+    jobs: int | None = None
+    plan: bool = False
+    overrides: dict[str, str] = {}  # template variables, e.g. `n`
+
+    @property
+    def destination(self) -> str:
+        return self.hostname if self.user is None else f"{self.user}@{self.hostname}"
+
+    @property
+    def label(self) -> str:
+        # unique per inventory entry, as one host can be reached on several ports
+        return (
+            self.destination if self.port is None else f"{self.destination}:{self.port}"
+        )
+
+    def to_args(self) -> list[str]:
+        # secrets are not arguments, as those are visible in `ps`; see `to_secrets`
+        args: list[str] = []
+        if self.version is not None:
+            args.append(f"--repo-version={self.version}")
+        if self.proxmox is not None:
+            args.append("--proxmox" if self.proxmox else "--no-proxmox")
+        if self.create_non_root is not None:
+            args.append(
+                "--create-non-root" if self.create_non_root else "--no-create-non-root"
+            )
+        args.extend(f"--override={k}={v}" for k, v in sorted(self.overrides.items()))
+        if self.docker is not None:
+            args.append("--docker" if self.docker else "--no-docker")
+        if self.jobs is not None:
+            args.append(f"--jobs={self.jobs}")
+        if self.plan:
+            args.append("--plan")
+        return args
+
+    def to_command(self) -> list[str]:
+        cmd = ["ssh", "-o", "BatchMode=yes"]
+        cmd.extend(["-o", f"ConnectTimeout={get_settings().fleet.connect_timeout}"])
+        if self.port is not None:
+            cmd.extend(["-p", str(self.port)])
+        remote = join(["python3", "-", *self.to_args()])
+        if self.subnet is not None:
+            remote = f"SUBNET={quote(self.subnet.value)} {remote}"
+        if len(secrets := self.to_secrets()) >= 1:
+            # read off stdin, one per line, ahead of the entrypoint; `read` takes
+            # one byte at a time from a pipe, so the rest is left for `python3`
+            reads = [f"IFS= read -r {k}" for k in secrets]
+            remote = " && ".join([*reads, f"export {' '.join(secrets)}", remote])
+        cmd.extend([self.destination, remote])
+        return cmd
+
+    def to_input(self, entrypoint: bytes, /) -> bytes:
+        secrets = "".join(f"{v}\n" for v in self.to_secrets().values())
+        return secrets.encode() + entrypoint
+
+    def to_secrets(self) -> dict[str, str]:
+        # as per the `envvar`s of the installer's options
+        secrets: dict[str, str] = {}
+        if self.password is not None:
+            secrets["INSTALLER_PASSWORD"] = self.password
+        if self.proxmox_pbs_password is not None:
+            secrets["INSTALLER_PROXMOX_PBS_PASSWORD"] = self.proxmox_pbs_password
+        for key, value in secrets.items():
+            if "\n" in value:
+                msg = f"{key} must be a single line"
+                raise ValueError(msg)
+        return secrets
+
+
+class Inventory(BaseModel):
+    hosts: list[Host]
+
+
+@dataclass(kw_only=True, slots=True)
+class HostResult:
+    hostname: str
+    status: StepStatus
+    duration: float
+    log: Path
+    returncode: int | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status is StepStatus.succeeded
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class Guest:
+    vmid: int
+    name: str
+    kind: GuestKind
+    running: bool = True
+
+    def to_command(
+        self, *, args: Iterable[str] = (), subnet: Subnet | None = None
+    ) -> list[str]:
+        remote = ["python3", GUEST_PYZ, *args]
+        if subnet is not None:
+            remote = ["env", f"SUBNET={subnet.value}", *remote]
+        return self._exec(remote)
+
+    def to_push(self, pyz: Path, /) -> list[tuple[list[str], bytes | None]]:
+        # commands, with their stdin, which copy the archive to `GUEST_PYZ`
+        match self.kind:
+            case GuestKind.lxc:
+                return [(["pct", "push", str(self.vmid), str(pyz), GUEST_PYZ], None)]
+            case GuestKind.qemu:
+                # `qm guest exec` forwards at most 1 MiB of stdin
+                content = pyz.read_bytes()
+                chunks = [
+                    content[i : i + _AGENT_CHUNK]
+                    for i in range(0, len(content), _AGENT_CHUNK)
+                ]
+                return [
+                    (
+                        self._exec(
+                            ["sh", "-c", f"cat {'>' if i == 0 else '>>'} {GUEST_PYZ}"],
+                            stdin=True,
+                        ),
+                        chunk,
+                    )
+                    for i, chunk in enumerate(chunks)
+                ]
+            case never:
+                assert_never(never)
+
+    def _exec(self, remote: list[str], /, *, stdin: bool = False) -> list[str]:
+        match self.kind:
+            case GuestKind.lxc:
+                return ["pct", "exec", str(self.vmid), "--", *remote]
+            case GuestKind.qemu:
+                timeout = get_settings().fleet.timeout
+                return [
+                    "qm",
+                    "guest",
+                    "exec",
+                    str(self.vmid),
+                    *(["--pass-stdin=1"] if stdin else []),
+                    f"--timeout={timeout}",
+                    "--",
+                    *remote,
+                ]
+            case never:
+                assert_never(never)
+
+
+def list_guests() -> list[Guest]:
+    pct, qm = run("pct list", output=True), run("qm list", output=True)
+    return sorted([*_parse_pct_list(pct), *_parse_qm_list(qm)])
+
+
+def load_inventory(path: Path, /) -> list[Host]:
+    data = loads(path.read_text())
+    defaults = data.get("defaults", {})
+    entries = [{**defaults, **h} for h in data.get("hosts", [])]
+    hosts = Inventory.model_validate({"hosts": entries}).hosts
+    if len(duplicates := _get_duplicates(h.label for h in hosts)) >= 1:
+        msg = f"Duplicate host(s) in inventory: {', '.join(duplicates)}"
+        raise ValueError(msg)
+    return hosts
+
+
+def run_fleet(
+    hosts: Iterable[Host],
+    /,
+    *,
+    log_dir: Path,
+    jobs: int = 1,
+    entrypoint_url: str = ENTRYPOINT_URL,
+) -> list[HostResult]:
+    hosts = list(hosts)
+    entrypoint = _get_entrypoint(entrypoint_url)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    _LOGGER.info("Running installer on %d host(s)...", len(hosts))
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="fleet") as pool:
+        futures = [
+            pool.submit(_run_host, h, entrypoint=entrypoint, log_dir=log_dir)
+            for h in hosts
+        ]
+        return [f.result() for f in futures]
+
+
+def run_guests(
+    guests: Iterable[Guest],
+    /,
+    *,
+    pyz: Path,
+    log_dir: Path,
+    jobs: int = 1,
+    args: Iterable[str] = (),
+    subnet: Subnet | None = None,
+) -> list[HostResult]:
+    # runs the installer in this node's guests, via `pct exec` for containers and
+    # the QEMU guest agent for VMs, so they need no SSH access; the zipapp is
+    # pushed in first, so they need no network route either
+    guests, args = [g for g in guests if g.running], list(args)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    _LOGGER.info("Running installer on %d guest(s)...", len(guests))
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="guests") as pool:
+        futures = [
+            pool.submit(
+                _run_guest, g, pyz=pyz, log_dir=log_dir, args=args, subnet=subnet
+            )
+            for g in guests
+        ]
+        return [f.result() for f in futures]
+
+
+def run_rootfs(
+    roots: Iterable[Path], /, *, log_dir: Path, jobs: int = 1, args: Iterable[str] = ()
+) -> list[HostResult]:
+    # provisions root filesystems on this host, each in its own installer process
+    roots, args = list(roots), list(args)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    _LOGGER.info("Running installer on %d root(s)...", len(roots))
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="rootfs") as pool:
+        futures = [
+            pool.submit(
+                _run_logged,
+                str(r),
+                [executable, "-m", "installer.main", f"--root={r}", *args],
+                log=log_dir / f"{str(r).strip('/').replace('/', '-')}.log",
+            )
+            for r in roots
+        ]
+        return [f.result() for f in futures]
+
+
+def format_results(results: Iterable[HostResult], /) -> str:
+    rows = [("HOST", "STATUS", "DURATION", "LOG")]
+    rows.extend(
+        (r.hostname, r.status.value, f"{r.duration:.1f}s", str(r.log)) for r in results
+    )
+    widths = [max(map(len, c)) for c in zip(*rows, strict=True)]
+    return "\n".join(
+        "  ".join(c.ljust(w) for c, w in zip(r, widths, strict=True)).rstrip()
+        for r in rows
+    )
+
+
+def _get_duplicates(labels: Iterable[str], /) -> list[str]:
+    seen: set[str] = set()
+    duplicates: set[str] = set()
+    for label in labels:
+        (duplicates if label in seen else seen).add(label)
+    return sorted(duplicates)
+
+
+def _get_entrypoint(url: str, /) -> bytes:
+    resp = get(url, timeout=get_settings().downloads.timeout)
+    resp.raise_for_status()
+    return resp.content
+
+
+def _parse_pct_list(text: str, /) -> list[Guest]:
+    # VMID, Status, Lock and Name, where Lock is usually blank
+    guests: list[Guest] = []
+    for line in text.splitlines()[1:]:
+        vmid, status, *_, name = line.split()
+        guests.append(
+            Guest(
+                vmid=int(vmid),
+                name=name,
+                kind=GuestKind.lxc,
+                running=status == "running",
+            )
+        )
+    return guests
+
+
+def _parse_qm_list(text: str, /) -> list[Guest]:
+    # the columns are the VM ID, name, status, memory, boot disk and PID
+    guests: list[Guest] = []
+    for line in text.splitlines()[1:]:
+        vmid, name, status, *_ = line.split()
+        guests.append(
+            Guest(
+                vmid=int(vmid),
+                name=name,
+                kind=GuestKind.qemu,
+                running=status == "running",
+            )
+        )
+    return guests
+
+
+def _run_guest(
+    guest: Guest, /, *, pyz: Path, log_dir: Path, args: list[str], subnet: Subnet | None
+) -> HostResult:
+    start, log = perf_counter(), log_dir / f"{guest.vmid}.log"
+    _LOGGER.info("Pushing %r to %r...", str(pyz), guest.name)
+    for cmd, input_ in guest.to_push(pyz):
+        if not (result := _run_guest_command(guest, cmd, log=log, input_=input_)).ok:
+            return replace(result, duration=perf_counter() - start)
+    result = _run_guest_command(
+        guest, guest.to_command(args=args, subnet=subnet), log=log
+    )
+    return replace(result, duration=perf_counter() - start)
+
+
+def _run_guest_command(
+    guest: Guest, cmd: list[str], /, *, log: Path, input_: bytes | None = None
+) -> HostResult:
+    result = _run_logged(guest.name, cmd, log=log, input_=input_)
+    if (guest.kind is GuestKind.qemu) and result.ok:
+        return _unwrap_agent_result(result)
+    return result
+
+
+def _unwrap_agent_result(result: HostResult, /) -> HostResult:
+    # `qm guest exec` succeeds regardless, and prints the exit code and output of
+    # the command as JSON; anything else means the outcome is unknown
+    try:
+        data = json_loads(result.log.read_text())
+    except JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        _LOGGER.error(
+            "Unable to parse the guest agent's output for %r; see %r",
+            result.hostname,
+            str(result.log),
+        )
+        return HostResult(
+            hostname=result.hostname,
+            status=StepStatus.failed,
+            duration=result.duration,
+            log=result.log,
+        )
+    _ = result.log.write_text(f"{data.get('out-data', '')}{data.get('err-data', '')}")
+    if (returncode := data.get("exitcode")) == 0:
+        return result
+    _LOGGER.error(
+        "Installer on %r failed with exit code %s; see %r",
+        result.hostname,
+        returncode,
+        str(result.log),
+    )
+    return HostResult(
+        hostname=result.hostname,
+        status=StepStatus.failed,
+        duration=result.duration,
+        log=result.log,
+        returncode=returncode,
+    )
+
+
+def _run_host(host: Host, /, *, entrypoint: bytes, log_dir: Path) -> HostResult:
+    return _run_logged(
+        host.label,
+        host.to_command(),
+        log=log_dir / f"{host.label}.log",
+        input_=host.to_input(entrypoint),
+    )
+
+
+def _run_logged(
+    hostname: str, cmd: list[str], /, *, log: Path, input_: bytes | None = None
+) -> HostResult:
+    _LOGGER.info("Running installer on %r...", hostname)
+    start = perf_counter()
+    with log.open("wb") as fh:
+        try:
+            result = subprocess_run(
+                cmd,
+                input=input_,
+                stdout=fh,
+                stderr=STDOUT,
+                timeout=get_settings().fleet.timeout,
+                check=False,
+            )
+        except TimeoutExpired:
+            _LOGGER.exception("Installer on %r timed out", hostname)
+            return HostResult(
+                hostname=hostname,
+                status=StepStatus.failed,
+                duration=perf_counter() - start,
+                log=log,
+            )
+    duration = perf_counter() - start
+    if result.returncode == 0:
+        _LOGGER.info("Finished running installer on %r", hostname)
+        status = StepStatus.succeeded
+    else:
+        _LOGGER.error(
+            "Installer on %r failed with exit code %d; see %r",
+            hostname,
+            result.returncode,
+            str(log),
+        )
+        status = StepStatus.failed
+    return HostResult(
+        hostname=hostname,
+        status=status,
+        duration=duration,
+        log=log,
+        returncode=result.returncode,
+    )
+
+
+__all__ = [
+    "ENTRYPOINT_URL",
+    "GUEST_PYZ",
+    "Guest",
+    "Host",
+    "HostResult",
+    "Inventory",
+    "format_results",
+    "list_guests",
+    "load_inventory",
+    "run_fleet",
+    "run_guests",
+    "run_rootfs",
+]
@@ -1,69 +1,113 @@
 from __future__ import annotations
 
 from logging import getLogger
-from pathlib import Path
+from os import defpath, environ, pathsep
+from platform import freedesktop_os_release
 from shutil import which
 
+from requests import get
+
 from installer.constants import CONFIGS, NONROOT
+from installer.dpkg import get_installed_versions
+from installer.managed import STARSHIP_CONFIG
+from installer.plan import ChangeKind, is_planning, record_change
+from installer.rootfs import chrooted, rooted
+from installer.settings import get_settings
 from installer.utilities import (
     apt_install,
-    apt_installed,
     copy,
     has_non_root,
     is_copied,
     run,
+    substitute,
 )
 
 _LOGGER = getLogger(__name__)
 
 
+DOCKER_PACKAGES = frozenset({
+    "containerd.io",
+    "docker-buildx-plugin",
+    "docker-ce",
+    "docker-ce-cli",
+    "docker-compose-plugin",
+})
+_DOCKER_GPG_URL = "https://download.docker.com/linux/debian/gpg"
+_STARSHIP_URL = "https://starship.rs/install.sh"
+_DOCKER_CONFLICTS = [
+    "containerd",
+    "docker-compose",
+    "docker-doc",
+    "docker.io",
+    "podman-docker",
+    "runc",
+]
+
+
 def install_docker() -> None:
-    if which("docker") is None:
-        _LOGGER.info("Installing 'docker'...")
-        run(
-            "for pkg in docker.io docker-doc docker-compose podman-docker containerd runc; do apt-get remove $pkg; done"
-        )
-        run("apt-get update")
-        run("apt-get install -y ca-certificates curl")
-        run("install -m 0755 -d /etc/apt/keyrings")
-        run(
-            "curl -fsSL https://download.docker.com/linux/debian/gpg -o /etc/apt/keyrings/docker.asc"
-        )
-        run("chmod a+r /etc/apt/keyrings/docker.asc")
-        run("""\
-tee /etc/apt/sources.list.d/docker.sources <<DOCKEREOF
-Types: deb
-URIs: https://download.docker.com/linux/debian
-Suites: $(. /etc/os-release && echo "$VERSION_CODENAME")
-Components: stable
-Signed-By: /etc/apt/keyrings/docker.asc
-DOCKEREOF""")
-        run("apt-get update")
-        run(
-            "apt-get install -y docker-ce docker-ce-cli containerd.io docker-buildx-plugin docker-compose-plugin"
-        )
+    setup_docker_apt_sources()
+    apt_install(*DOCKER_PACKAGES)
+    setup_docker_group()
+
+
+def setup_docker_apt_sources() -> None:
+    versions = get_installed_versions(*_DOCKER_CONFLICTS)
+    if len(conflicts := sorted(p for p, v in versions.items() if v is not None)) >= 1:
+        if is_planning():
+            for pkg in conflicts:
+                _ = record_change(ChangeKind.package, pkg, detail="remove")
+        else:
+            _LOGGER.info("Removing %s...", ", ".join(map(repr, conflicts)))
+            run(chrooted(f"apt-get remove -y {' '.join(conflicts)}"))
+    keyring = rooted("/etc/apt/keyrings/docker.asc")
+    if keyring.is_file():
+        _LOGGER.info("%r already exists", str(keyring))
+    elif record_change(ChangeKind.download, _DOCKER_GPG_URL, detail=str(keyring)):
+        pass
+    else:
+        _LOGGER.info("Downloading %r...", str(keyring))
+        resp = get(_DOCKER_GPG_URL, timeout=get_settings().downloads.timeout)
+        resp.raise_for_status()
+        copy(resp.text, keyring)
+    src = CONFIGS / "docker/docker.sources"
+    text = substitute(
+        src.read_text(), codename=freedesktop_os_release()["VERSION_CODENAME"]
+    )
+    dest = rooted("/etc/apt/sources.list.d/docker.sources")
+    if is_copied(text, dest):
+        _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
-        _LOGGER.info("'docker' is already installed")
-    if has_non_root():
-        run(f"usermod -aG docker {NONROOT}")
+        _LOGGER.info("Copying %r -> %r...", str(src), str(dest))
+        copy(text, dest)
+
+
+def setup_docker_group() -> None:
+    if has_non_root() and not record_change(
+        ChangeKind.command, f"usermod -aG docker {NONROOT}"
+    ):
+        run(chrooted(f"usermod -aG docker {NONROOT}"))
 
 
 def install_nfs_common() -> None:
-    if apt_installed("nfs-common"):
-        _LOGGER.info("'nfs-common' is already installed")
-        return
-    _LOGGER.info("Installing 'nfs-common'...")
     apt_install("nfs-common")
 
 
 def install_starship() -> None:
-    if which("starship") is None:
-        _LOGGER.info("Installing 'starship'...")
-        run("curl -sS https://starship.rs/install.sh | sh -s -- -b /usr/local/bin -y")
+    path = pathsep.join(
+        str(rooted(p)) for p in environ.get("PATH", defpath).split(pathsep)
+    )
+    if which("starship", path=path) is None:
+        if not record_change(ChangeKind.download, _STARSHIP_URL):
+            _LOGGER.info("Installing 'starship'...")
+            bin_ = rooted("/usr/local/bin")
+            run(f"curl -sS {_STARSHIP_URL} | sh -s -- -b {bin_} -y")
     else:
         _LOGGER.info("'starship' is already installed")
-    src = CONFIGS / "starship/starship.toml"
-    dest = Path("/etc/starship.toml")
+    setup_starship_config()
+
+
+def setup_starship_config() -> None:
+    src, dest = STARSHIP_CONFIG.src, rooted(STARSHIP_CONFIG.path)
     if is_copied(src, dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
@@ -71,4 +115,12 @@ def install_starship() -> None:
         copy(src, dest)
 
 
-__all__ = ["install_docker", "install_nfs_common", "install_starship"]
+__all__ = [
+    "DOCKER_PACKAGES",
+    "install_docker",
+    "install_nfs_common",
+    "install_starship",
+    "setup_docker_apt_sources",
+    "setup_docker_group",
+    "setup_starship_config",
+]
@@ -1,40 +1,40 @@
 from __future__ import annotations
 
+from functools import partial
 from logging import getLogger
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO
 
 import click
-from click import command, option
-from utilities.click import CONTEXT_SETTINGS_HELP_OPTION_NAMES
-from utilities.logging import basic_config
+from click import Context, argument, echo, group, option, pass_context
 
-import installer.setups
 from installer import __version__
-from installer.constants import CONFIGS_PROXMOX_STORAGE_CFG, CONFIGS_SSH_AUTHORIZED_KEYS
-from installer.envs.proxmox import setup_proxmox
-from installer.installs import install_docker, install_starship
-from installer.setups import (
-    set_password,
-    setup_git,
-    setup_profile,
-    setup_resolv_conf,
-    setup_ssh_authorized_keys,
-    setup_ssh_config_d,
-    setup_ssh_known_hosts,
-    setup_sshd_config_d,
-    setup_subnet_env_var,
-)
-from installer.utilities import is_lxc, is_proxmox, is_vm
+from installer.constants import (
+    CONFIGS_PROXMOX_STORAGE_CFG,
+    CONFIGS_SSH_AUTHORIZED_KEYS,
+    ENTRYPOINT_URL,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from installer.scheduler import Step
+
+# the steps, and the probes behind the defaults, are imported and run lazily so
+# that `--help` and subcommands start without spawning processes or loading settings
+
 
 _LOGGER = getLogger(__name__)
+# as per `utilities.click`, which is slow to import
+_CONTEXT_SETTINGS: dict[str, Any] = {"help_option_names": ["-h", "--help"]}
 
 
-@command(**CONTEXT_SETTINGS_HELP_OPTION_NAMES)
+@group(invoke_without_command=True, context_settings=_CONTEXT_SETTINGS)
 @option(
     "--proxmox/--no-proxmox",
     is_flag=True,
-    default=is_proxmox(),
-    show_default=True,
+    default=None,
+    show_default="detected",
     help="Set up Proxmox",
 )
 @option(
@@ -49,6 +49,7 @@ _LOGGER = getLogger(__name__)
     type=str,
     default=None,
     show_default=True,
+    envvar="INSTALLER_PROXMOX_PBS_PASSWORD",
     help="Proxmox `pbs-data` password",
 )
 @option(
@@ -58,7 +59,14 @@ _LOGGER = getLogger(__name__)
     show_default=True,
     help="Create 'nonroot'",
 )
-@option("--password", type=str, default=None, show_default=True, help="Password")
+@option(
+    "--password",
+    type=str,
+    default=None,
+    show_default=True,
+    envvar="INSTALLER_PASSWORD",
+    help="Password",
+)
 @option(
     "--ssh-authorized-keys",
     type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
@@ -69,42 +77,667 @@ _LOGGER = getLogger(__name__)
 @option(
     "--docker/--no-docker",
     is_flag=True,
-    default=is_lxc() or is_vm(),
-    show_default=True,
+    default=None,
+    show_default="detected in LXCs and VMs",
     help="Install Docker",
 )
+@option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of steps to run concurrently",
+)
+@option(
+    "--plan",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Report the changes that would be made, without making them",
+)
+@option(
+    "--root",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
+    default=None,
+    show_default="/",
+    help="Install into this root filesystem, e.g. an LXC template or VM image",
+)
+@option(
+    "--trace-file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    show_default=True,
+    help="Write a Chrome trace of steps and commands, plus a JSON-lines summary at `*.summary.jsonl`",
+)
+@option(
+    "--override",
+    "overrides",
+    type=str,
+    multiple=True,
+    metavar="KEY=VALUE",
+    help="Template variable, e.g. `n`, to use instead of the detected one",
+)
+@pass_context
 def _main(
+    ctx: Context,
+    /,
     *,
-    proxmox: bool,
+    proxmox: bool | None,
     proxmox_storage_cfg: Path,
     proxmox_pbs_password: str | None,
     create_non_root: bool,
     password: str | None,
     ssh_authorized_keys: Path,
-    docker: bool,
+    docker: bool | None,
+    jobs: int,
+    plan: bool,
+    root: Path | None,
+    trace_file: Path | None,
+    overrides: tuple[str, ...],
 ) -> None:
-    _LOGGER.info("Running installer %s...", __version__)
+    from utilities.logging import basic_config
+
+    basic_config(obj=_LOGGER, hostname=True)
+    if ctx.invoked_subcommand is not None:
+        return
+    from contextlib import ExitStack
+
+    from installer.facts import get_facts
+    from installer.manifest import get_manifest
+    from installer.plan import format_plan, yield_plan
+    from installer.rootfs import yield_root
+    from installer.scheduler import run_steps
+    from installer.services import flush_services
+    from installer.trace import write_trace, yield_span, yield_trace
+    from installer.utilities import (
+        commit_files,
+        discard_files,
+        is_lxc,
+        is_proxmox,
+        is_vm,
+        yield_chroot,
+        yield_overrides,
+        yield_transaction,
+    )
+
+    with ExitStack() as stack:
+        if root is not None:
+            _ = stack.enter_context(yield_root(root))
+            _LOGGER.info("Installing into %r", str(root))
+        stack.enter_context(yield_overrides(_parse_overrides(overrides)))
+        # entered before the facts are gathered, so that they are not written
+        changes = stack.enter_context(yield_plan()) if plan else None
+        _LOGGER.info("Running installer %s...", __version__)
+        _LOGGER.info("Gathered facts: %s", get_facts())
+        steps = _get_steps(
+            proxmox=is_proxmox() if proxmox is None else proxmox,
+            proxmox_storage_cfg=proxmox_storage_cfg,
+            proxmox_pbs_password=proxmox_pbs_password,
+            create_non_root=create_non_root,
+            password=password,
+            ssh_authorized_keys=ssh_authorized_keys,
+            docker=(is_lxc() or is_vm()) if docker is None else docker,
+        )
+        spans = stack.enter_context(yield_trace()) if trace_file is not None else None
+        stack.enter_context(yield_transaction())
+        stack.enter_context(yield_chroot())
+        try:
+            results = run_steps(steps, jobs=jobs)
+            # files staged by steps after, or failing before, the `commit_files` step
+            if all(r.ok for r in results):
+                commit_files()
+            else:
+                discard_files()
+            with yield_span("flush_services", category="step"):
+                flush_services()
+        finally:
+            get_manifest().save()
+            if (spans is not None) and (trace_file is not None):
+                _ = write_trace(spans, trace_file)
+    if changes is not None:
+        echo(format_plan(changes))
+    for result in results:
+        _LOGGER.info(
+            "%s: %s (%.2fs)", result.name, result.status.value, result.duration
+        )
+    if len(failed := [r.name for r in results if not r.ok]) >= 1:
+        msg = f"Step(s) did not succeed: {', '.join(failed)}"
+        raise RuntimeError(msg)
+    _LOGGER.info("Finished running installer %s", __version__)
+
+
+def _parse_overrides(overrides: Iterable[str], /) -> dict[str, str]:
+    parsed: dict[str, str] = {}
+    for override in overrides:
+        key, sep, value = override.partition("=")
+        if (sep == "") or (key == ""):
+            msg = f"Override must be of the form 'KEY=VALUE'; got {override!r}"
+            raise ValueError(msg)
+        parsed[key] = value
+    return parsed
+
+
+def _get_steps(
+    *,
+    proxmox: bool | None,
+    proxmox_storage_cfg: Path,
+    proxmox_pbs_password: str | None,
+    create_non_root: bool,
+    password: str | None,
+    ssh_authorized_keys: Path,
+    docker: bool,
+) -> list[Step]:
+    from installer.envs.proxmox import setup_proxmox
+    from installer.installs import (
+        DOCKER_PACKAGES,
+        install_starship,
+        setup_docker_apt_sources,
+        setup_docker_group,
+    )
+    from installer.scheduler import Step
+    from installer.setups import create_non_root as create_non_root_
+    from installer.setups import (
+        set_password,
+        setup_git,
+        setup_profile,
+        setup_resolv_conf,
+        setup_ssh_authorized_keys,
+        setup_ssh_config_d,
+        setup_ssh_known_hosts,
+        setup_sshd_config_d,
+        setup_subnet_env_var,
+    )
+    from installer.utilities import apt_install, commit_files
+
+    steps: list[Step] = []
     if proxmox:
-        setup_proxmox(
-            storage_cfg=proxmox_storage_cfg, pbs_password=proxmox_pbs_password
+        steps.append(
+            Step(
+                name="proxmox",
+                func=partial(
+                    setup_proxmox,
+                    storage_cfg=proxmox_storage_cfg,
+                    pbs_password=proxmox_pbs_password,
+                ),
+            )
         )
     if create_non_root:
-        installer.setups.create_non_root()
-    set_password(password=password)
-    setup_git()
-    setup_profile()
-    setup_resolv_conf()
-    setup_ssh_authorized_keys(ssh_authorized_keys)
-    setup_ssh_config_d()
-    setup_ssh_known_hosts()  # after `resolv.conf`
-    setup_sshd_config_d()
-    setup_subnet_env_var()
-    install_starship()
+        steps.append(Step(name="create_non_root", func=create_non_root_))
+    steps.extend([
+        Step(
+            name="set_password",
+            func=partial(set_password, password=password),
+            deps=frozenset({"create_non_root"}),
+        ),
+        Step(name="git", func=setup_git),
+        Step(name="profile", func=setup_profile),
+        Step(name="resolv_conf", func=setup_resolv_conf),
+        Step(
+            name="ssh_authorized_keys",
+            func=partial(setup_ssh_authorized_keys, ssh_authorized_keys),
+        ),
+        Step(name="ssh_config_d", func=setup_ssh_config_d),
+        Step(
+            name="ssh_known_hosts",
+            func=setup_ssh_known_hosts,
+            deps=frozenset({"commit_files"}),
+        ),
+        Step(name="sshd_config_d", func=setup_sshd_config_d),
+        Step(name="subnet_env_var", func=setup_subnet_env_var),
+        Step(name="starship", func=install_starship),
+    ])
     if docker:
-        install_docker()
-    _LOGGER.info("Finished running installer %s", __version__)
+        steps.extend([
+            Step(
+                name="docker_apt_sources",
+                func=setup_docker_apt_sources,
+                deps=frozenset({"proxmox"}),
+            ),
+            Step(
+                name="docker",
+                func=setup_docker_group,
+                deps=frozenset({"apt", "create_non_root"}),
+                packages=DOCKER_PACKAGES,
+            ),
+        ])
+    if len(packages := frozenset[str]().union(*(s.packages for s in steps))) >= 1:
+        steps.append(
+            Step(
+                name="apt",
+                func=partial(apt_install, *sorted(packages)),
+                deps=frozenset({"proxmox", "docker_apt_sources", "commit_files"}),
+            )
+        )
+    # the files written so far are made durable together, before the steps reading
+    # them, e.g. `ssh-keyscan` resolving hosts and `apt` reading the Docker sources
+    steps.append(
+        Step(
+            name="commit_files",
+            func=commit_files,
+            deps=frozenset({
+                "docker_apt_sources",
+                "git",
+                "profile",
+                "proxmox",
+                "resolv_conf",
+                "ssh_authorized_keys",
+                "ssh_config_d",
+                "sshd_config_d",
+                "subnet_env_var",
+            }),
+        )
+    )
+    return steps
+
+
+@_main.command(name="fleet", context_settings=_CONTEXT_SETTINGS)
+@argument(
+    "inventory",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+)
+@option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=16,
+    show_default=True,
+    help="Number of hosts to run concurrently",
+)
+@option(
+    "--log-dir",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=Path("fleet-logs"),
+    show_default=True,
+    help="Directory for the per-host logs",
+)
+@option(
+    "--entrypoint-url",
+    type=str,
+    default=ENTRYPOINT_URL,
+    show_default=True,
+    help="URL of `entrypoint.py`",
+)
+@option(
+    "--plan",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Report the changes that would be made on each host; the entrypoint still caches the repo and its environment, but fails rather than install 'git', 'curl' or 'uv'",
+)
+def _fleet(
+    *, inventory: Path, jobs: int, log_dir: Path, entrypoint_url: str, plan: bool
+) -> None:
+    from installer.fleet import format_results, load_inventory, run_fleet
+
+    hosts = load_inventory(inventory)
+    if plan:
+        hosts = [h.model_copy(update={"plan": True}) for h in hosts]
+    results = run_fleet(
+        hosts, log_dir=log_dir, jobs=jobs, entrypoint_url=entrypoint_url
+    )
+    echo(format_results(results))
+    if len(failed := [r.hostname for r in results if not r.ok]) >= 1:
+        msg = f"Host(s) did not succeed: {', '.join(failed)}"
+        raise RuntimeError(msg)
+
+
+@_main.command(name="guests", context_settings=_CONTEXT_SETTINGS)
+@option(
+    "--vmid",
+    "vmids",
+    type=int,
+    multiple=True,
+    help="Guest to provision; defaults to every running guest",
+)
+@option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    show_default="number of CPUs",
+    help="Number of guests to provision concurrently",
+)
+@option(
+    "--log-dir",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=Path("guest-logs"),
+    show_default=True,
+    help="Directory for the per-guest logs",
+)
+@option(
+    "--pyz",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    show_default="built for the guests",
+    help="Zipapp to push into each guest, as built by `zipapp`",
+)
+@option(
+    "--subnet",
+    type=click.Choice(["qrt", "main", "test"]),
+    default=None,
+    show_default="detected by each guest",
+    help="Subnet of the guests",
+)
+@option(
+    "--arg",
+    "args",
+    type=str,
+    multiple=True,
+    help="Installer option for every guest, e.g. `--arg=--docker`",
+)
+def _guests(
+    *,
+    vmids: tuple[int, ...],
+    jobs: int | None,
+    log_dir: Path,
+    pyz: Path | None,
+    subnet: str | None,
+    args: tuple[str, ...],
+) -> None:
+    from os import cpu_count
+    from tempfile import TemporaryDirectory
+
+    from installer.enums import Subnet
+    from installer.fleet import format_results, list_guests, run_guests
+    from installer.zipapp import build_zipapp
+
+    guests = list_guests()
+    if len(vmids) >= 1:
+        if len(missing := set(vmids) - {g.vmid for g in guests}) >= 1:
+            msg = f"Guest(s) not found: {', '.join(map(str, sorted(missing)))}"
+            raise ValueError(msg)
+        guests = [g for g in guests if g.vmid in vmids]
+    with TemporaryDirectory() as temp_dir:
+        if pyz is None:
+            pyz = build_zipapp(Path(temp_dir, "installer.pyz"))
+        results = run_guests(
+            guests,
+            pyz=pyz,
+            log_dir=log_dir,
+            jobs=(cpu_count() or 1) if jobs is None else jobs,
+            args=args,
+            subnet=None if subnet is None else Subnet(subnet),
+        )
+    echo(format_results(results))
+    if len(failed := [r.hostname for r in results if not r.ok]) >= 1:
+        msg = f"Guest(s) did not succeed: {', '.join(failed)}"
+        raise RuntimeError(msg)
+
+
+@_main.command(name="rootfs", context_settings=_CONTEXT_SETTINGS)
+@argument(
+    "roots",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
+)
+@option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    show_default="number of CPUs",
+    help="Number of roots to provision concurrently",
+)
+@option(
+    "--log-dir",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=Path("rootfs-logs"),
+    show_default=True,
+    help="Directory for the per-root logs",
+)
+@option(
+    "--arg",
+    "args",
+    type=str,
+    multiple=True,
+    help="Installer option for every root, e.g. `--arg=--docker`",
+)
+def _rootfs(
+    *, roots: tuple[Path, ...], jobs: int | None, log_dir: Path, args: tuple[str, ...]
+) -> None:
+    from os import cpu_count
+
+    from installer.fleet import format_results, run_rootfs
+
+    results = run_rootfs(
+        roots,
+        log_dir=log_dir,
+        jobs=(cpu_count() or 1) if jobs is None else jobs,
+        args=args,
+    )
+    echo(format_results(results))
+    if len(failed := [r.hostname for r in results if not r.ok]) >= 1:
+        msg = f"Root(s) did not succeed: {', '.join(failed)}"
+        raise RuntimeError(msg)
+
+
+@_main.command(name="export-overlay", context_settings=_CONTEXT_SETTINGS)
+@argument(
+    "output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=Path("dist/overlay.tar.gz"),
+)
+@option(
+    "--subnet",
+    type=click.Choice(["qrt", "main", "test"]),
+    default=None,
+    show_default="detected",
+    help="Subnet of the target hosts",
+)
+@option(
+    "--proxmox/--no-proxmox",
+    is_flag=True,
+    default=False,
+    show_default=True,
+    help="Include the Proxmox files",
+)
+@option(
+    "--proxmox-storage-cfg",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+    default=CONFIGS_PROXMOX_STORAGE_CFG,
+    show_default=True,
+    help="Proxmox `storage.cfg`",
+)
+@option(
+    "--ssh-authorized-keys",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+    default=CONFIGS_SSH_AUTHORIZED_KEYS,
+    show_default=True,
+    help="SSH authorized keys",
+)
+def _export_overlay(
+    *,
+    output: Path,
+    subnet: str | None,
+    proxmox: bool,
+    proxmox_storage_cfg: Path,
+    ssh_authorized_keys: Path,
+) -> None:
+    from installer.enums import Subnet
+    from installer.overlay import export_overlay, render_overlay
+
+    files = render_overlay(
+        subnet=None if subnet is None else Subnet(subnet),
+        ssh_authorized_keys=ssh_authorized_keys,
+        proxmox=proxmox,
+        proxmox_storage_cfg=proxmox_storage_cfg,
+    )
+    path = export_overlay(files, output)
+    echo(f"Exported {len(files)} file(s) to {str(path)!r}")
+
+
+@_main.command(name="render", context_settings=_CONTEXT_SETTINGS)
+@argument(
+    "inventory",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+)
+@option(
+    "--store",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=Path("dist/store"),
+    show_default=True,
+    help="Content-addressed store for the rendered files",
+)
+@option(
+    "--bundles",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=None,
+    help="Directory for a per-host overlay archive",
+)
+@option(
+    "--proxmox-storage-cfg",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+    default=CONFIGS_PROXMOX_STORAGE_CFG,
+    show_default=True,
+    help="Proxmox `storage.cfg`",
+)
+@option(
+    "--ssh-authorized-keys",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+    default=CONFIGS_SSH_AUTHORIZED_KEYS,
+    show_default=True,
+    help="SSH authorized keys",
+)
+def _render(
+    *,
+    inventory: Path,
+    store: Path,
+    bundles: Path | None,
+    proxmox_storage_cfg: Path,
+    ssh_authorized_keys: Path,
+) -> None:
+    from installer.fleet import load_inventory
+    from installer.render import render_hosts, write_bundles
+
+    results = render_hosts(
+        load_inventory(inventory),
+        store=store,
+        ssh_authorized_keys=ssh_authorized_keys,
+        proxmox_storage_cfg=proxmox_storage_cfg,
+    )
+    if bundles is not None:
+        write_bundles(store, results, bundles)
+    echo(f"Rendered {len(results)} host(s) to {str(store)!r}")
+
+
+@_main.command(name="apply-overlay", context_settings=_CONTEXT_SETTINGS)
+@argument("archive", type=click.File("rb"), default="-")
+@option(
+    "--root",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path),
+    default=Path("/"),
+    show_default=True,
+    help="Root filesystem to apply the overlay to",
+)
+def _apply_overlay(*, archive: BinaryIO, root: Path) -> None:
+    from installer.overlay import apply_overlay
+    from installer.rootfs import yield_root
+    from installer.services import flush_services
+    from installer.utilities import yield_chroot
+
+    with yield_root(root), yield_chroot():
+        applied = apply_overlay(archive)
+        flush_services()
+    echo(f"Applied {len(applied)} file(s)")
+
+
+@_main.command(name="facts", context_settings=_CONTEXT_SETTINGS)
+def _facts() -> None:
+    from installer.facts import format_facts, get_facts
+
+    echo(format_facts(get_facts()))
+
+
+@_main.command(name="zipapp", context_settings=_CONTEXT_SETTINGS)
+@argument(
+    "output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=Path("dist/installer.pyz"),
+)
+@option(
+    "--python-version",
+    type=str,
+    default="3.13",
+    show_default=True,
+    help="Python version of the target hosts",
+)
+@option(
+    "--python-platform",
+    type=str,
+    default="x86_64-manylinux_2_28",
+    show_default=True,
+    help="Platform of the target hosts",
+)
+def _zipapp(*, output: Path, python_version: str, python_platform: str) -> None:
+    from installer.zipapp import build_zipapp
+
+    path = build_zipapp(
+        output, python_version=python_version, python_platform=python_platform
+    )
+    echo(f"Built {str(path)!r}")
+
+
+@_main.command(name="bench", context_settings=_CONTEXT_SETTINGS)
+@option(
+    "--fleet-size",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of fake roots to provision concurrently",
+)
+@option(
+    "--latency",
+    type=str,
+    multiple=True,
+    help="Latency of a simulated command, or 'github', as NAME=SECONDS",
+)
+@option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    show_default=True,
+    help="Write the timings as JSON",
+)
+@option(
+    "--baseline",
+    type=click.Path(exists=True, file_okay=True, dir_okay=False, path_type=Path),
+    default=None,
+    show_default=True,
+    help="Fail if slower than these timings",
+)
+@option(
+    "--tolerance",
+    type=click.FloatRange(min=0.0),
+    default=0.5,
+    show_default=True,
+    help="Allowed slowdown relative to the baseline",
+)
+def _bench(
+    *,
+    fleet_size: int,
+    latency: tuple[str, ...],
+    output: Path | None,
+    baseline: Path | None,
+    tolerance: float,
+) -> None:
+    from installer.bench import compare_bench, format_bench, run_bench, write_bench
+
+    latencies: dict[str, float] = {}
+    for item in latency:
+        name, _, seconds = item.partition("=")
+        try:
+            latencies[name] = float(seconds)
+        except ValueError:
+            msg = f"Invalid latency; got {item!r}"
+            raise click.BadParameter(msg, param_hint="--latency") from None
+    result = run_bench(fleet_size=fleet_size, latencies=latencies)
+    echo(format_bench(result))
+    if output is not None:
+        write_bench(result, output)
+    if baseline is not None:
+        regressions = compare_bench(result, baseline, tolerance=tolerance)
+        if len(regressions) >= 1:
+            msg = f"Benchmark(s) regressed: {'; '.join(regressions)}"
+            raise RuntimeError(msg)
 
 
 if __name__ == "__main__":
-    basic_config(obj=_LOGGER, hostname=True)
     _main()
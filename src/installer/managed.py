@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from installer.constants import (
+    CONFIGS,
+    CONFIGS_PROFILE,
+    CONFIGS_PROXMOX_STORAGE_CFG,
+    CONFIGS_SSH,
+    CONFIGS_SSH_AUTHORIZED_KEYS,
+)
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class ManagedFile:
+    path: PurePosixPath  # on the target
+    src: Path
+    template: bool = False
+    immutable: bool = False
+    proxmox: bool = False
+
+
+# the files the steps copy from `configs`, shared with `render_hosts`; secrets,
+# e.g. `pbs-data.pw`, are left out so they are never rendered ahead of time
+GITCONFIG = ManagedFile(
+    path=PurePosixPath("/etc/gitconfig"), src=CONFIGS / "git/config"
+)
+PROFILE_DEFAULT = ManagedFile(
+    path=PurePosixPath("/etc/profile.d/default.sh"), src=CONFIGS_PROFILE / "default.sh"
+)
+PROFILE_SUBNET = ManagedFile(
+    path=PurePosixPath("/etc/profile.d/subnet.sh"),
+    src=CONFIGS_PROFILE / "subnet.sh",
+    template=True,
+)
+PROXMOX_STORAGE_CFG = ManagedFile(
+    path=PurePosixPath("/etc/pve/storage.cfg"),
+    src=CONFIGS_PROXMOX_STORAGE_CFG,
+    proxmox=True,
+)
+RESOLV_CONF = ManagedFile(
+    path=PurePosixPath("/etc/resolv.conf"),
+    src=CONFIGS / "networking/resolv.conf",
+    template=True,
+    immutable=True,
+)
+SSH_AUTHORIZED_KEYS = ManagedFile(
+    path=PurePosixPath("/etc/ssh/authorized_keys"), src=CONFIGS_SSH_AUTHORIZED_KEYS
+)
+SSH_CONFIG_D = ManagedFile(
+    path=PurePosixPath("/etc/ssh/ssh_config.d/default.conf"),
+    src=CONFIGS_SSH / "ssh_config.d/default.conf",
+)
+SSHD_CONFIG_D = ManagedFile(
+    path=PurePosixPath("/etc/ssh/sshd_config.d/default.conf"),
+    src=CONFIGS_SSH / "sshd_config.d/default.conf",
+)
+STARSHIP_CONFIG = ManagedFile(
+    path=PurePosixPath("/etc/starship.toml"), src=CONFIGS / "starship/starship.toml"
+)
+MANAGED_FILES = [
+    GITCONFIG,
+    PROFILE_DEFAULT,
+    PROFILE_SUBNET,
+    PROXMOX_STORAGE_CFG,
+    RESOLV_CONF,
+    SSH_AUTHORIZED_KEYS,
+    SSH_CONFIG_D,
+    SSHD_CONFIG_D,
+    STARSHIP_CONFIG,
+]
+
+
+__all__ = [
+    "GITCONFIG",
+    "MANAGED_FILES",
+    "PROFILE_DEFAULT",
+    "PROFILE_SUBNET",
+    "PROXMOX_STORAGE_CFG",
+    "RESOLV_CONF",
+    "SSHD_CONFIG_D",
+    "SSH_AUTHORIZED_KEYS",
+    "SSH_CONFIG_D",
+    "STARSHIP_CONFIG",
+    "ManagedFile",
+]
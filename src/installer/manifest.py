@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+from logging import getLogger
+from pathlib import Path
+from threading import Lock
+from typing import Self
+
+from utilities.atomicwrites import writer
+from utilities.functools import cache
+from utilities.os import is_pytest
+
+from installer.plan import is_planning
+from installer.rootfs import rooted
+
+_LOGGER = getLogger(__name__)
+MANIFEST = Path("/var/lib/installer/manifest.json")
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class ManifestEntry:
+    inputs: str
+    sha256: str
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @classmethod
+    def from_path(cls, path: Path, /, *, inputs: str, content: bytes) -> Self:
+        stat = path.stat()
+        return cls(
+            inputs=inputs,
+            sha256=sha256(content).hexdigest(),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            inode=stat.st_ino,
+        )
+
+    def matches(self, path: Path, /, *, inputs: str) -> bool:
+        if inputs != self.inputs:
+            return False
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino) == (
+            self.size,
+            self.mtime_ns,
+            self.inode,
+        )
+
+
+class Manifest:
+    def __init__(self, path: Path = MANIFEST, /) -> None:
+        super().__init__()
+        self.path = path
+        self.entries: dict[str, ManifestEntry] = {}
+        self._lock = Lock()
+        self._dirty = False
+        try:
+            data = loads(path.read_text())
+        except (FileNotFoundError, JSONDecodeError):
+            return
+        try:
+            self.entries = {k: ManifestEntry(**v) for k, v in data.items()}
+        except TypeError:
+            _LOGGER.warning("Ignoring invalid manifest %r", str(path))
+
+    def is_current(self, dest: Path, /, *, inputs: str) -> bool:
+        with self._lock:
+            entry = self.entries.get(str(dest))
+        return (entry is not None) and entry.matches(dest, inputs=inputs)
+
+    def record(self, dest: Path, /, *, inputs: str, content: bytes) -> None:
+        entry = ManifestEntry.from_path(dest, inputs=inputs, content=content)
+        with self._lock:
+            if self.entries.get(str(dest)) != entry:
+                self.entries[str(dest)] = entry
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if (not self._dirty) or is_pytest() or is_planning():
+                return
+            text = dumps(
+                {k: asdict(v) for k, v in sorted(self.entries.items())}, indent=2
+            )
+            with writer(self.path, overwrite=True) as temp:
+                _ = temp.write_text(text)
+            self._dirty = False
+
+
+@cache
+def get_manifest() -> Manifest:
+    return Manifest(rooted(MANIFEST))
+
+
+def hash_inputs(*parts: bytes | str) -> str:
+    hasher = sha256()
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else part
+        hasher.update(len(data).to_bytes(8))
+        hasher.update(data)
+    return hasher.hexdigest()
+
+
+__all__ = ["MANIFEST", "Manifest", "ManifestEntry", "get_manifest", "hash_inputs"]
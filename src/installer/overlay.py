@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import tarfile
+from dataclasses import dataclass
+from functools import partial
+from io import BytesIO
+from logging import getLogger
+from os import chown, geteuid
+from pathlib import Path, PurePosixPath
+from tempfile import TemporaryDirectory
+from time import time
+from typing import IO, TYPE_CHECKING
+
+from utilities.atomicwrites import writer
+from utilities.os import temp_environ
+
+from installer.constants import CONFIGS_PROXMOX_STORAGE_CFG, CONFIGS_SSH_AUTHORIZED_KEYS
+from installer.envs.proxmox import _merge_storage_cfg, _setup_storage_cfg, _write_pmxcfs
+from installer.installs import setup_starship_config
+from installer.managed import PROXMOX_STORAGE_CFG
+from installer.plan import ChangeKind, yield_plan
+from installer.rootfs import get_root, rooted, yield_root
+from installer.services import flush_services, mark_dirty
+from installer.setups import (
+    setup_git,
+    setup_profile,
+    setup_resolv_conf,
+    setup_ssh_authorized_keys,
+    setup_ssh_config_d,
+    setup_sshd_config_d,
+    setup_subnet_env_var,
+)
+from installer.utilities import clear_immutable, set_immutable
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from installer.enums import Subnet
+
+
+_LOGGER = getLogger(__name__)
+# tar has no field for file flags, so they go in a PAX extended header
+OVERLAY_IMMUTABLE = "INSTALLER.immutable"
+_SLASH = PurePosixPath("/")
+_PVE = PurePosixPath("etc/pve")
+_SSHD_CONFIG_D = PurePosixPath("etc/ssh/sshd_config.d")
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class OverlayFile:
+    path: PurePosixPath
+    content: bytes
+    mode: int = 0o644
+    immutable: bool = False
+
+
+def render_overlay(
+    *,
+    subnet: Subnet | None = None,
+    ssh_authorized_keys: Path = CONFIGS_SSH_AUTHORIZED_KEYS,
+    proxmox: bool = False,
+    proxmox_storage_cfg: Path = CONFIGS_PROXMOX_STORAGE_CFG,
+) -> list[OverlayFile]:
+    # the file steps are planned against an empty root, so that every file they
+    # manage is rendered, and the planned contents are collected
+    steps: list[Callable[[], None]] = [
+        setup_git,
+        setup_profile,
+        setup_resolv_conf,
+        setup_subnet_env_var,
+        partial(setup_ssh_authorized_keys, ssh_authorized_keys),
+        setup_ssh_config_d,
+        setup_sshd_config_d,
+        setup_starship_config,
+    ]
+    if proxmox:
+        steps.append(partial(_setup_storage_cfg, src=proxmox_storage_cfg))
+    env = {} if subnet is None else {"SUBNET": subnet.value}
+    with (
+        TemporaryDirectory() as temp_dir,
+        yield_root(Path(temp_dir)) as root,
+        temp_environ(env),
+        yield_plan() as changes,
+    ):
+        for step in steps:
+            step()
+        flush_services()  # planned, so that nothing is left pending
+    files: dict[PurePosixPath, OverlayFile] = {}
+    immutable: set[PurePosixPath] = set()
+    for change in changes:
+        if change.kind is not ChangeKind.file:
+            continue
+        path = _SLASH / PurePosixPath(change.target).relative_to(root)
+        if change.content is not None:
+            files[path] = OverlayFile(path=path, content=change.content.encode())
+        elif change.detail == "set immutable":
+            immutable.add(path)
+    return sorted(
+        OverlayFile(path=f.path, content=f.content, immutable=f.path in immutable)
+        for f in files.values()
+    )
+
+
+def export_overlay(files: Iterable[OverlayFile], path: Path, /) -> Path:
+    mode = "w:gz" if path.suffix in {".gz", ".tgz"} else "w"
+    mtime = int(time())
+    with writer(path, overwrite=True) as temp, tarfile.open(temp, mode=mode) as tar:
+        for file in files:
+            info = tarfile.TarInfo(str(file.path.relative_to(_SLASH)))
+            info.size = len(file.content)
+            info.mode = file.mode
+            info.mtime = mtime
+            info.uid = info.gid = 0
+            info.uname = info.gname = "root"
+            if file.immutable:
+                info.pax_headers = {OVERLAY_IMMUTABLE: "1"}
+            tar.addfile(info, BytesIO(file.content))
+    return path
+
+
+def apply_overlay(fileobj: IO[bytes], /) -> list[Path]:
+    # a single streaming pass, so the archive can be piped in over SSH
+    applied: list[Path] = []
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            name = PurePosixPath(info.name)
+            if name.is_absolute() or (".." in name.parts):
+                msg = f"Invalid overlay member; got {info.name!r}"
+                raise ValueError(msg)
+            dest = rooted(f"/{name}")
+            if (member := tar.extractfile(info)) is None:
+                continue
+            content = member.read()
+            if name.is_relative_to(_PVE):
+                if _apply_pmxcfs(dest, content, src=info.name):
+                    applied.append(dest)
+                continue
+            if dest.is_file():
+                clear_immutable(dest)
+            with writer(dest, overwrite=True) as temp:
+                _ = temp.write_bytes(content)
+                temp.chmod(info.mode)
+                if geteuid() == 0:
+                    chown(temp, info.uid, info.gid)
+            if info.pax_headers.get(OVERLAY_IMMUTABLE) == "1":
+                set_immutable(dest)
+            if name.parent == _SSHD_CONFIG_D:
+                mark_dirty("sshd")
+            applied.append(dest)
+    _LOGGER.info("Applied %d file(s) to %r", len(applied), str(get_root()))
+    return applied
+
+
+def _apply_pmxcfs(dest: Path, content: bytes, /, *, src: str) -> bool:
+    # pmxcfs is shared by the cluster and has no temporary files, modes or flags,
+    # so `storage.cfg` is merged as by the step, and other files written in place
+    text = content.decode()
+    if dest == rooted(PROXMOX_STORAGE_CFG.path):
+        return _merge_storage_cfg(text, src=src)
+    if dest.is_file() and (dest.read_text() == text):
+        _LOGGER.info("%r -> %r is already copied", src, str(dest))
+        return False
+    _LOGGER.info("Copying %r -> %r...", src, str(dest))
+    _write_pmxcfs(dest, text)
+    return True
+
+
+__all__ = [
+    "OVERLAY_IMMUTABLE",
+    "OverlayFile",
+    "apply_overlay",
+    "export_overlay",
+    "render_overlay",
+]
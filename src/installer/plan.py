@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from difflib import unified_diff
+from enum import StrEnum, unique
+from logging import getLogger
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable
+    from pathlib import Path
+
+
+_LOGGER = getLogger(__name__)
+_LOCK = Lock()
+
+
+@unique
+class ChangeKind(StrEnum):
+    file = "file"
+    package = "package"
+    service = "service"
+    download = "download"
+    command = "command"
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class Change:
+    kind: ChangeKind
+    target: str
+    detail: str | None = None
+    # the new contents of a file, as rendered; used for overlays
+    content: str | None = field(default=None, compare=False, repr=False)
+
+
+@dataclass(kw_only=True, slots=True)
+class _PlanState:
+    changes: list[Change] | None = None
+
+
+_STATE = _PlanState()
+
+
+def format_plan(changes: Iterable[Change], /) -> str:
+    lines: list[str] = []
+    for change in sorted(changes):
+        lines.append(f"{change.kind.value}: {change.target}")
+        if change.detail is not None:
+            lines.extend(f"    {line}" for line in change.detail.splitlines())
+    return "\n".join(lines) if len(lines) >= 1 else "No changes"
+
+
+def get_file_diff(dest: Path, text: str, /) -> str:
+    try:
+        current = dest.read_text(errors="replace")
+    except FileNotFoundError:
+        current = ""
+    diff = unified_diff(
+        current.splitlines(keepends=True),
+        text.splitlines(keepends=True),
+        fromfile=str(dest),
+        tofile=str(dest),
+    )
+    return "".join(diff).rstrip("\n")
+
+
+def is_planning() -> bool:
+    return _STATE.changes is not None
+
+
+def record_change(
+    kind: ChangeKind,
+    target: str,
+    /,
+    *,
+    detail: str | None = None,
+    content: str | None = None,
+) -> bool:
+    # returns whether the change was recorded, in which case it must not be made
+    with _LOCK:
+        if _STATE.changes is None:
+            return False
+        _LOGGER.info("Planning %s change to %r", kind.value, target)
+        _STATE.changes.append(
+            Change(kind=kind, target=target, detail=detail, content=content)
+        )
+        return True
+
+
+@contextmanager
+def yield_plan() -> Generator[list[Change]]:
+    changes: list[Change] = []
+    with _LOCK:
+        _STATE.changes = changes
+    try:
+        yield changes
+    finally:
+        with _LOCK:
+            _STATE.changes = None
+
+
+__all__ = [
+    "Change",
+    "ChangeKind",
+    "format_plan",
+    "get_file_diff",
+    "is_planning",
+    "record_change",
+    "yield_plan",
+]
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from hashlib import sha256
+from json import dumps, loads
+from logging import getLogger
+from pathlib import Path, PurePosixPath
+from string import Template
+from typing import TYPE_CHECKING
+
+from utilities.atomicwrites import writer
+
+from installer.constants import CONFIGS_PROXMOX_STORAGE_CFG, CONFIGS_SSH_AUTHORIZED_KEYS
+from installer.managed import (
+    MANAGED_FILES,
+    PROXMOX_STORAGE_CFG,
+    SSH_AUTHORIZED_KEYS,
+    ManagedFile,
+)
+from installer.overlay import OverlayFile, export_overlay
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from installer.fleet import Host
+
+
+_LOGGER = getLogger(__name__)
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class RenderedFile:
+    path: PurePosixPath
+    sha256: str
+    mode: int = 0o644
+    immutable: bool = False
+
+
+def render_hosts(
+    hosts: Iterable[Host],
+    /,
+    *,
+    store: Path,
+    ssh_authorized_keys: Path = CONFIGS_SSH_AUTHORIZED_KEYS,
+    proxmox_storage_cfg: Path = CONFIGS_PROXMOX_STORAGE_CFG,
+) -> dict[str, list[RenderedFile]]:
+    # each template is parsed once, and rendered once per distinct set of the
+    # variables it uses; outputs go in `store/objects`, keyed on their SHA-256
+    srcs = {
+        SSH_AUTHORIZED_KEYS: ssh_authorized_keys,
+        PROXMOX_STORAGE_CFG: proxmox_storage_cfg,
+    }
+    sources = [replace(f, src=srcs[f]) if f in srcs else f for f in MANAGED_FILES]
+    parsed: list[tuple[ManagedFile, Template | str, frozenset[str]]] = []
+    blobs: dict[str, bytes] = {}
+    for source in sources:
+        text = source.src.read_text()
+        if source.template:
+            template = Template(text)
+            parsed.append((source, template, frozenset(template.get_identifiers())))
+        else:
+            parsed.append((source, _add_blob(blobs, text.encode()), frozenset()))
+    rendered: dict[tuple[int, tuple[tuple[str, str], ...]], str] = {}
+    results: dict[str, list[RenderedFile]] = {}
+    for host in hosts:
+        variables = _get_variables(host)
+        files: list[RenderedFile] = []
+        for i, (source, template, identifiers) in enumerate(parsed):
+            if source.proxmox and not host.proxmox:
+                continue
+            if len(missing := identifiers - variables.keys()) >= 1:
+                _LOGGER.warning(
+                    "Skipping %r for %r; missing variable(s) %s",
+                    str(source.path),
+                    host.hostname,
+                    ", ".join(sorted(missing)),
+                )
+                continue
+            if isinstance(template, str):
+                digest = template
+            else:
+                key = (i, tuple(sorted((k, variables[k]) for k in identifiers)))
+                if (digest := rendered.get(key)) is None:
+                    content = template.substitute(variables).encode()
+                    digest = rendered[key] = _add_blob(blobs, content)
+            files.append(
+                RenderedFile(
+                    path=source.path, sha256=digest, immutable=source.immutable
+                )
+            )
+        results[host.hostname] = sorted(files)
+    _write_store(store, blobs=blobs, results=results)
+    _LOGGER.info(
+        "Rendered %d host(s) to %d unique file(s) in %r",
+        len(results),
+        len(blobs),
+        str(store),
+    )
+    return results
+
+
+def load_bundle(store: Path, hostname: str, /) -> list[OverlayFile]:
+    data = loads((store / "hosts" / f"{hostname}.json").read_text())
+    return [
+        OverlayFile(
+            path=PurePosixPath(f["path"]),
+            content=_get_blob_path(store, f["sha256"]).read_bytes(),
+            mode=f["mode"],
+            immutable=f["immutable"],
+        )
+        for f in data
+    ]
+
+
+def write_bundles(
+    store: Path, results: dict[str, list[RenderedFile]], bundles: Path, /
+) -> None:
+    # hosts with the same files share one archive, with a symlink per host
+    bundles.mkdir(parents=True, exist_ok=True)
+    for hostname, files in results.items():
+        digest = sha256(_dump_files(files).encode()).hexdigest()
+        if not (archive := bundles / f"{digest}.tar").is_file():
+            _ = export_overlay(load_bundle(store, hostname), archive)
+        link = bundles / f"{hostname}.tar"
+        link.unlink(missing_ok=True)
+        link.symlink_to(archive.name)
+
+
+def _add_blob(blobs: dict[str, bytes], content: bytes, /) -> str:
+    digest = sha256(content).hexdigest()
+    _ = blobs.setdefault(digest, content)
+    return digest
+
+
+def _dump_files(files: Iterable[RenderedFile], /) -> str:
+    return dumps(
+        [
+            {
+                "path": str(f.path),
+                "sha256": f.sha256,
+                "mode": f.mode,
+                "immutable": f.immutable,
+            }
+            for f in files
+        ],
+        indent=2,
+    )
+
+
+def _get_blob_path(store: Path, digest: str, /) -> Path:
+    return store / "objects" / digest[:2] / digest[2:]
+
+
+def _get_variables(host: Host, /) -> dict[str, str]:
+    # those the steps pass to `substitute`, then the host's overrides on top
+    variables: dict[str, str] = {}
+    if host.subnet is not None:
+        variables.update(subnet=host.subnet.value, n=str(host.subnet.n))
+    return {**variables, **host.overrides}
+
+
+def _write_store(
+    store: Path, /, *, blobs: dict[str, bytes], results: dict[str, list[RenderedFile]]
+) -> None:
+    for digest, content in blobs.items():
+        if not (path := _get_blob_path(store, digest)).is_file():
+            with writer(path) as temp:
+                _ = temp.write_bytes(content)
+    for hostname, files in results.items():
+        with writer(store / "hosts" / f"{hostname}.json", overwrite=True) as temp:
+            _ = temp.write_text(_dump_files(files))
+
+
+__all__ = ["RenderedFile", "load_bundle", "render_hosts", "write_bundles"]
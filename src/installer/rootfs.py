@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path, PurePath
+from shlex import quote
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+
+_LOCK = Lock()
+_SLASH = Path("/")
+
+
+@dataclass(kw_only=True, slots=True)
+class _RootState:
+    root: Path = field(default_factory=lambda: _SLASH)
+
+
+_STATE = _RootState()
+
+
+def chrooted(cmd: str, /) -> str:
+    # runs `cmd` with the target's binaries and databases, e.g. `apt` and `passwd`
+    if (root := get_root()) == _SLASH:
+        return cmd
+    return f"chroot {quote(str(root))} {cmd}"
+
+
+def get_root() -> Path:
+    with _LOCK:
+        return _STATE.root
+
+
+def is_rooted() -> bool:
+    return get_root() != _SLASH
+
+
+def rooted(path: PurePath | str, /) -> Path:
+    # maps an absolute path on the target system to where it is on this one
+    path = Path(path)
+    if (root := get_root()) == _SLASH:
+        return path
+    return root / path.relative_to(_SLASH)
+
+
+@contextmanager
+def yield_root(root: Path, /) -> Generator[Path]:
+    # process-wide, rather than a context variable, as steps run in worker threads
+    with _LOCK:
+        prev, _STATE.root = _STATE.root, root.resolve()
+    try:
+        yield _STATE.root
+    finally:
+        with _LOCK:
+            _STATE.root = prev
+
+
+__all__ = ["chrooted", "get_root", "is_rooted", "rooted", "yield_root"]
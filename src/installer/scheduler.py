@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from enum import StrEnum, unique
+from logging import getLogger
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from installer.trace import yield_step_span
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+
+_LOGGER = getLogger(__name__)
+
+
+@unique
+class StepStatus(StrEnum):
+    succeeded = "succeeded"
+    failed = "failed"
+    skipped = "skipped"
+
+
+@dataclass(kw_only=True, slots=True)
+class Step:
+    name: str
+    func: Callable[[], None]
+    deps: frozenset[str] = field(default_factory=frozenset)
+    packages: frozenset[str] = field(default_factory=frozenset)
+
+
+@dataclass(kw_only=True, slots=True)
+class StepResult:
+    name: str
+    status: StepStatus
+    duration: float = 0.0
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status is StepStatus.succeeded
+
+
+def run_steps(steps: Iterable[Step], /, *, jobs: int = 1) -> list[StepResult]:
+    # dependencies on steps outside of `steps` are treated as satisfied
+    by_name = _get_steps_by_name(steps)
+    pending = dict(by_name)
+    results: dict[str, StepResult] = {}
+    running: dict[Future[StepResult], str] = {}
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="step") as pool:
+        while (len(pending) >= 1) or (len(running) >= 1):
+            for name, step in list(pending.items()):
+                deps = step.deps & by_name.keys()
+                if not deps <= results.keys():
+                    continue
+                del pending[name]
+                if len(failed := sorted(d for d in deps if not results[d].ok)) >= 1:
+                    _LOGGER.warning("Skipping %r; %s did not succeed", name, failed)
+                    results[name] = StepResult(name=name, status=StepStatus.skipped)
+                else:
+                    running[pool.submit(_run_step, step)] = name
+            if len(running) == 0:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return [results[n] for n in by_name]
+
+
+def _get_steps_by_name(steps: Iterable[Step], /) -> dict[str, Step]:
+    by_name: dict[str, Step] = {}
+    for step in steps:
+        if step.name in by_name:
+            msg = f"Duplicate step {step.name!r}"
+            raise ValueError(msg)
+        by_name[step.name] = step
+    visiting: set[str] = set()
+    visited: set[str] = set()
+
+    def visit(name: str, /) -> None:
+        if name in visited:
+            return
+        if name in visiting:
+            msg = f"Cyclic dependency on step {name!r}"
+            raise ValueError(msg)
+        visiting.add(name)
+        for dep in by_name[name].deps & by_name.keys():
+            visit(dep)
+        visiting.remove(name)
+        visited.add(name)
+
+    for name in by_name:
+        visit(name)
+    return by_name
+
+
+def _run_step(step: Step, /) -> StepResult:
+    start = perf_counter()
+    with yield_step_span(step.name) as args:
+        try:
+            step.func()
+        except Exception as error:
+            _LOGGER.exception("Step %r failed", step.name)
+            args["status"] = StepStatus.failed.value
+            return StepResult(
+                name=step.name,
+                status=StepStatus.failed,
+                duration=perf_counter() - start,
+                error=error,
+            )
+        args["status"] = StepStatus.succeeded.value
+    return StepResult(
+        name=step.name, status=StepStatus.succeeded, duration=perf_counter() - start
+    )
+
+
+__all__ = ["Step", "StepResult", "StepStatus", "run_steps"]
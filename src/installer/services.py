@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from enum import StrEnum, unique
+from logging import getLogger
+from threading import Lock
+
+from installer.plan import ChangeKind, record_change
+from installer.rootfs import chrooted, is_rooted
+from installer.utilities import run
+
+_LOGGER = getLogger(__name__)
+_LOCK = Lock()
+# commands checking a service's configuration before it is bounced
+_VALIDATORS: dict[str, str] = {"sshd": "sshd -t"}
+# services which re-read their configuration on `reload` without dropping connections
+_RELOADABLE: frozenset[str] = frozenset({"sshd"})
+
+
+@unique
+class ServiceAction(StrEnum):
+    reload = "reload"
+    restart = "restart"
+
+
+@dataclass(kw_only=True, slots=True)
+class _ServicesState:
+    pending: dict[str, ServiceAction] = field(default_factory=dict)
+
+
+_STATE = _ServicesState()
+
+
+def flush_services() -> None:
+    with _LOCK:
+        pending = sorted(_STATE.pending.items())
+        _STATE.pending.clear()
+    for service, action in pending:
+        if record_change(ChangeKind.service, service, detail=action.value):
+            continue
+        if (validator := _VALIDATORS.get(service)) is not None:
+            _LOGGER.info("Validating %r configuration...", service)
+            if not run(chrooted(validator), failable=True):
+                msg = f"{validator!r} failed; not running {action.value} of {service!r}"
+                raise RuntimeError(msg)
+        if is_rooted():
+            _LOGGER.info(
+                "Skipping %s of %r; the target is not running", action.value, service
+            )
+            continue
+        _LOGGER.info("Running %s of %r...", action.value, service)
+        run(f"systemctl {action.value} {service}")
+
+
+def get_pending_services() -> dict[str, ServiceAction]:
+    with _LOCK:
+        return dict(_STATE.pending)
+
+
+def mark_dirty(service: str, /, *, restart: bool = False) -> None:
+    action = (
+        ServiceAction.reload
+        if (service in _RELOADABLE) and not restart
+        else ServiceAction.restart
+    )
+    with _LOCK:
+        if _STATE.pending.get(service) is not ServiceAction.restart:
+            _STATE.pending[service] = action
+
+
+__all__ = ["ServiceAction", "flush_services", "get_pending_services", "mark_dirty"]
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
 from collections.abc import Sequence
+from hashlib import sha256
+from logging import getLogger
+from os import environ
+from pathlib import Path
 from typing import ClassVar
 
+from pydantic import ValidationError
 from pydantic_settings import BaseSettings
+from utilities.atomicwrites import writer
+from utilities.functools import cache
+from utilities.os import is_pytest
 from utilities.pydantic_settings import (
     CustomBaseSettings,
     PathLikeOrWithSection,
@@ -11,24 +19,50 @@ from utilities.pydantic_settings import (
 )
 
 from installer.constants import CONFIGS
+from installer.rootfs import rooted
+
+_LOGGER = getLogger(__name__)
+_TOML_FILES = [CONFIGS / "config.toml"]
+SNAPSHOTS = Path("/var/cache/installer/settings")
 
 
 class _Settings(CustomBaseSettings):
-    toml_files: ClassVar[Sequence[PathLikeOrWithSection]] = [CONFIGS / "config.toml"]
+    toml_files: ClassVar[Sequence[PathLikeOrWithSection]] = _TOML_FILES
 
+    apt: _Apt
     downloads: _Downloads
+    fleet: _Fleet
     ssh: _SSH
     subnets: _Subnets
 
 
+class _Apt(BaseSettings):
+    ttl: int
+
+
 class _Downloads(BaseSettings):
-    timeout: int
+    cache: Path
     chunk_size: int
+    github_api_url: str
+    github_url: str
+    parallelism: int
+    part_size: int
+    timeout: int
+    ttl: int
+
+
+class _Fleet(BaseSettings):
+    connect_timeout: int
+    timeout: int
 
 
 class _SSH(BaseSettings):
+    backoff: float
+    backoff_max: float
+    deadline: int
     known_hosts: list[_SSHKnownHost]
     max_tries: int
+    timeout: int
 
 
 class _SSHKnownHost(BaseSettings):
@@ -42,7 +76,33 @@ class _Subnets(BaseSettings):
     test: int
 
 
-SETTINGS = load_settings(_Settings)
-
-
-__all__ = ["SETTINGS"]
+@cache
+def get_settings(*, snapshots: Path | None = None) -> _Settings:
+    # validated settings are snapshotted, keyed on the config file contents and
+    # any `SECTION__FIELD` environment overrides
+    snapshots_use = (
+        (None if is_pytest() else rooted(SNAPSHOTS)) if snapshots is None else snapshots
+    )
+    path = None
+    if snapshots_use is not None:
+        hasher = sha256(b"".join(Path(p).read_bytes() for p in _TOML_FILES))
+        for k, v in sorted(environ.items()):
+            if "__" in k:
+                hasher.update(f"\0{k}={v}".encode())
+        key = hasher.hexdigest()
+        path = snapshots_use / f"{key}.json"
+        try:
+            return _Settings.model_validate_json(path.read_bytes())
+        except (FileNotFoundError, ValidationError):
+            pass
+    settings = load_settings(_Settings)
+    if path is not None:
+        try:
+            with writer(path, overwrite=True) as temp:
+                _ = temp.write_text(settings.model_dump_json())
+        except OSError:
+            _LOGGER.warning("Unable to write settings snapshot %r", str(path))
+    return settings
+
+
+__all__ = ["SNAPSHOTS", "get_settings"]
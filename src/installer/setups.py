@@ -1,12 +1,28 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
-from pathlib import Path
+from random import uniform
+from time import monotonic, sleep
+from typing import TYPE_CHECKING
 
 from utilities.os import is_pytest
 
-from installer.constants import CONFIGS, CONFIGS_PROFILE, CONFIGS_SSH, NONROOT, ROOT
-from installer.settings import SETTINGS
+from installer.constants import NONROOT, ROOT
+from installer.managed import (
+    GITCONFIG,
+    PROFILE_DEFAULT,
+    PROFILE_SUBNET,
+    RESOLV_CONF,
+    SSH_AUTHORIZED_KEYS,
+    SSH_CONFIG_D,
+    SSHD_CONFIG_D,
+)
+from installer.manifest import get_manifest, hash_inputs
+from installer.plan import ChangeKind, record_change
+from installer.rootfs import chrooted, rooted
+from installer.services import mark_dirty
+from installer.settings import get_settings
 from installer.utilities import (
     copy,
     get_subnet,
@@ -14,12 +30,16 @@ from installer.utilities import (
     is_copied,
     is_immutable,
     run,
+    run_batch,
     set_immutable,
     substitute,
-    systemctl_restart,
     touch,
 )
 
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
 _LOGGER = getLogger(__name__)
 
 
@@ -27,9 +47,13 @@ def create_non_root() -> None:
     if has_non_root():
         _LOGGER.info("%r already exists", NONROOT)
         return
+    if record_change(ChangeKind.command, f"useradd {NONROOT}"):
+        return
     _LOGGER.info("Creating %r...", NONROOT)
-    run(f"useradd --create-home --shell /bin/bash {NONROOT}")
-    run(f"usermod -aG sudo {NONROOT}")
+    _ = run_batch(
+        chrooted(f"useradd --create-home --shell /bin/bash {NONROOT}"),
+        chrooted(f"usermod -aG sudo {NONROOT}"),
+    )
 
 
 def set_password(*, password: str | None = None) -> None:
@@ -44,13 +68,15 @@ def set_password(*, password: str | None = None) -> None:
 
 
 def _set_password_one(username: str, password: str, /) -> None:
+    if record_change(ChangeKind.command, f"chpasswd {username}"):
+        return
     _LOGGER.info("Setting %r password...", ROOT)
-    run(f"echo '{username}:{password}' | chpasswd")
+    # over stdin, so that the password is in neither `ps` nor the trace
+    run(chrooted("chpasswd"), input_=f"{username}:{password}\n")
 
 
 def setup_git() -> None:
-    src = CONFIGS / "git/config"
-    dest = Path("/etc/gitconfig")
+    src, dest = GITCONFIG.src, rooted(GITCONFIG.path)
     if is_copied(src, dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
@@ -59,8 +85,7 @@ def setup_git() -> None:
 
 
 def setup_profile() -> None:
-    src = CONFIGS_PROFILE / "default.sh"
-    dest = Path("/etc/profile.d/default.sh")
+    src, dest = PROFILE_DEFAULT.src, rooted(PROFILE_DEFAULT.path)
     if is_copied(src, dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
@@ -74,9 +99,8 @@ def setup_resolv_conf() -> None:
     except (KeyError, ValueError):
         _LOGGER.warning("Unable to determine subnet")
         return
-    src = CONFIGS / "networking/resolv.conf"
+    src, dest = RESOLV_CONF.src, rooted(RESOLV_CONF.path)
     text = substitute(src.read_text(), n=subnet.n, subnet=subnet.value)
-    dest = Path("/etc/resolv.conf")
     if is_copied(text, dest) and is_immutable(dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
@@ -91,9 +115,8 @@ def setup_subnet_env_var() -> None:
     except (KeyError, ValueError):
         _LOGGER.warning("Unable to determine subnet")
         return
-    src = CONFIGS_PROFILE / "subnet.sh"
+    src, dest = PROFILE_SUBNET.src, rooted(PROFILE_SUBNET.path)
     text = substitute(src.read_text(), subnet=subnet.value)
-    dest = Path("/etc/profile.d/subnet.sh")
     if is_copied(text, dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
@@ -104,7 +127,7 @@ def setup_subnet_env_var() -> None:
 def setup_ssh_authorized_keys(*srcs: Path) -> None:
     src_desc = ", ".join(map(str, srcs))
     text = "\n".join(s.read_text() for s in srcs)
-    dest = Path("/etc/ssh/authorized_keys")
+    dest = rooted(SSH_AUTHORIZED_KEYS.path)
     if is_copied(text, dest):
         _LOGGER.info("%r -> %r is already copied", src_desc, str(dest))
     else:
@@ -113,51 +136,82 @@ def setup_ssh_authorized_keys(*srcs: Path) -> None:
 
 
 def setup_ssh_config_d() -> None:
-    src = CONFIGS_SSH / "ssh_config.d/default.conf"
-    dest = Path("/etc/ssh/ssh_config.d/default.conf")
+    src, dest = SSH_CONFIG_D.src, rooted(SSH_CONFIG_D.path)
     if is_copied(src, dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
         _LOGGER.info("Copying %r -> %r...", str(src), str(dest))
         copy(src, dest)
-        systemctl_restart("sshd")
 
 
 def setup_ssh_known_hosts() -> None:
     # after `resolv.conf`
     if is_pytest():
         return
-    path = Path("/etc/ssh/known_hosts")
+    path = rooted("/etc/ssh/known_hosts")
+    if len(get_settings().ssh.known_hosts) == 0:
+        _LOGGER.info("No known hosts to scan into %r", str(path))
+        return
+    inputs = hash_inputs(
+        *(f"{h.hostname}:{h.port}" for h in get_settings().ssh.known_hosts)
+    )
+    manifest = get_manifest()
+    if manifest.is_current(path, inputs=inputs):
+        _LOGGER.info("%r is already scanned", str(path))
+        return
+    hostnames = ", ".join(h.hostname for h in get_settings().ssh.known_hosts)
+    if record_change(ChangeKind.file, str(path), detail=f"scan {hostnames}"):
+        return
     touch(path)
-    for known_host in SETTINGS.ssh.known_hosts:
-        _setup_ssh_known_hosts_one(known_host.hostname, port=known_host.port)
-    systemctl_restart("sshd")
-
-
-def _setup_ssh_known_hosts_one(hostname: str, /, *, port: int | None = None) -> None:
-    _ = run(f"ssh-keygen -R {hostname}", failable=True)
-    parts: list[str] = ["ssh-keyscan -H -q -t ed25519"]
+    for known_host in get_settings().ssh.known_hosts:
+        _ = run(chrooted(f"ssh-keygen -R {known_host.hostname}"), failable=True)
+    deadline = monotonic() + get_settings().ssh.deadline
+    with ThreadPoolExecutor(
+        max_workers=len(get_settings().ssh.known_hosts), thread_name_prefix="keyscan"
+    ) as pool:
+        futures = [
+            pool.submit(_scan_known_host, h.hostname, port=h.port, deadline=deadline)
+            for h in get_settings().ssh.known_hosts
+        ]
+        keys = [f.result() for f in futures]
+    with path.open("a") as fh:
+        _ = fh.write("".join(f"{k}\n" for k in keys))
+    manifest.record(path, inputs=inputs, content=path.read_bytes())
+
+
+def _scan_known_host(
+    hostname: str, /, *, port: int | None = None, deadline: float
+) -> str:
+    parts: list[str] = [f"ssh-keyscan -H -q -t ed25519 -T {get_settings().ssh.timeout}"]
     if port is not None:
         parts.append(f"-p {port}")
-    parts.append(f"{hostname} >> /etc/ssh/known_hosts")
+    parts.append(hostname)
     cmd = " ".join(parts)
-    for _ in range(1, SETTINGS.ssh.max_tries + 1):
-        if run(cmd, failable=True):
-            systemctl_restart("sshd")
-            return
-    msg = f"{cmd!r} failed after {SETTINGS.ssh.max_tries} tries"
+    delay, max_tries = get_settings().ssh.backoff, get_settings().ssh.max_tries
+    for i in range(1, max_tries + 1):
+        # `ssh-keyscan` exits 0 on unreachable hosts, so check for output too
+        if keys := run(cmd, output=True, failable=True):
+            _LOGGER.info("Scanned %r after %d tries", hostname, i)
+            return keys
+        if (remaining := deadline - monotonic()) <= 0:
+            msg = f"{cmd!r} failed within {get_settings().ssh.deadline}s ({i} tries)"
+            raise RuntimeError(msg)
+        if i < max_tries:
+            _LOGGER.warning("Failed to scan %r (try %d); retrying...", hostname, i)
+            sleep(min(uniform(0, delay), remaining))
+            delay = min(2 * delay, get_settings().ssh.backoff_max)
+    msg = f"{cmd!r} failed after {max_tries} tries"
     raise RuntimeError(msg)
 
 
 def setup_sshd_config_d() -> None:
-    src = CONFIGS_SSH / "sshd_config.d/default.conf"
-    dest = Path("/etc/ssh/sshd_config.d/default.conf")
+    src, dest = SSHD_CONFIG_D.src, rooted(SSHD_CONFIG_D.path)
     if is_copied(src, dest):
         _LOGGER.info("%r -> %r is already copied", str(src), str(dest))
     else:
         _LOGGER.info("Copying %r -> %r...", str(src), str(dest))
         copy(src, dest)
-        systemctl_restart("sshd")
+        mark_dirty("sshd")
 
 
 __all__ = [
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from json import dumps
+from logging import getLogger
+from threading import Lock, current_thread
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from utilities.atomicwrites import writer
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable
+    from pathlib import Path
+
+
+_LOGGER = getLogger(__name__)
+_LOCK = Lock()
+_STEP: ContextVar[str | None] = ContextVar("_STEP", default=None)
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class Span:
+    start: float
+    duration: float
+    name: str
+    category: str
+    thread: str
+    step: str | None = None
+    args: dict[str, Any] = field(default_factory=dict, compare=False, hash=False)
+
+
+@dataclass(kw_only=True, slots=True)
+class _TraceState:
+    spans: list[Span] | None = None
+    origin: float = 0.0
+
+
+_STATE = _TraceState()
+
+
+def is_tracing() -> bool:
+    return _STATE.spans is not None
+
+
+def write_trace(spans: Iterable[Span], path: Path, /) -> Path:
+    # writes a Chrome trace to `path` and a JSON-lines summary next to it
+    spans = sorted(spans)
+    threads = {s.thread: None for s in spans}
+    tids = {t: i for i, t in enumerate(threads, start=1)}
+    events: list[dict[str, Any]] = [
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": i, "args": {"name": t}}
+        for t, i in tids.items()
+    ]
+    events.extend(
+        {
+            "name": s.name,
+            "cat": s.category,
+            "ph": "X",
+            "ts": round(s.start * 1e6),
+            "dur": round(s.duration * 1e6),
+            "pid": 1,
+            "tid": tids[s.thread],
+            "args": {"step": s.step, **s.args},
+        }
+        for s in spans
+    )
+    with writer(path, overwrite=True) as temp:
+        _ = temp.write_text(dumps({"traceEvents": events}))
+    summary = path.with_suffix(".summary.jsonl")
+    with writer(summary, overwrite=True) as temp:
+        _ = temp.write_text("".join(f"{dumps(asdict(s))}\n" for s in spans))
+    _LOGGER.info("Wrote trace %r and summary %r", str(path), str(summary))
+    return summary
+
+
+@contextmanager
+def yield_span(
+    name: str, /, *, category: str, **args: Any
+) -> Generator[dict[str, Any]]:
+    # the yielded dict may be updated with results such as exit codes
+    args = dict(args)
+    if not is_tracing():
+        yield args
+        return
+    step = _STEP.get()
+    start = perf_counter()
+    try:
+        yield args
+    finally:
+        end = perf_counter()
+        with _LOCK:
+            if _STATE.spans is not None:
+                _STATE.spans.append(
+                    Span(
+                        start=start - _STATE.origin,
+                        duration=end - start,
+                        name=name,
+                        category=category,
+                        thread=current_thread().name,
+                        step=step,
+                        args=args,
+                    )
+                )
+
+
+@contextmanager
+def yield_step_span(name: str, /) -> Generator[dict[str, Any]]:
+    token = _STEP.set(name)
+    try:
+        with yield_span(name, category="step") as args:
+            yield args
+    finally:
+        _STEP.reset(token)
+
+
+@contextmanager
+def yield_trace() -> Generator[list[Span]]:
+    spans: list[Span] = []
+    with _LOCK:
+        _STATE.spans = spans
+        _STATE.origin = perf_counter()
+    try:
+        yield spans
+    finally:
+        with _LOCK:
+            _STATE.spans = None
+
+
+__all__ = [
+    "Span",
+    "is_tracing",
+    "write_trace",
+    "yield_span",
+    "yield_step_span",
+    "yield_trace",
+]
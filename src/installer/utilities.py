@@ -1,53 +1,152 @@
 from __future__ import annotations
 
+import re
 from contextlib import contextmanager
+from ctypes import CDLL, get_errno
+from dataclasses import dataclass, field
 from fcntl import ioctl
-from ipaddress import IPv4Address
 from logging import getLogger
-from os import environ
+from os import O_DIRECTORY, O_RDONLY, close, defpath, environ, fdopen, strerror
+from os import open as os_open
 from pathlib import Path
-from socket import AF_INET, SOCK_DGRAM, socket
-from stat import S_IXUSR
+from shlex import quote, split
+from shutil import which
 from string import Template
 from struct import pack, unpack
-from subprocess import PIPE, CalledProcessError, check_call, check_output
+from subprocess import CalledProcessError
+from subprocess import run as subprocess_run
+from tempfile import mkstemp
+from threading import Lock
+from time import time
 from typing import TYPE_CHECKING, Any, Literal, NoReturn, assert_never, overload
 
-from requests import get
 from utilities.atomicwrites import writer
 from utilities.functools import cache
 from utilities.iterables import OneEmptyError, one
 from utilities.os import is_pytest
-from utilities.tempfile import TemporaryDirectory
 
-from installer.constants import NONROOT
+from installer.dpkg import get_installed_versions, is_installed
 from installer.enums import Subnet
-from installer.settings import SETTINGS
+from installer.facts import get_facts
+from installer.manifest import get_manifest, hash_inputs
+from installer.plan import ChangeKind, get_file_diff, is_planning, record_change
+from installer.rootfs import chrooted, get_root, is_rooted, rooted
+from installer.settings import get_settings
+from installer.trace import yield_span
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
-
+    from collections.abc import Generator, Iterable, Mapping
 
 _LOGGER = getLogger(__name__)
+_LOCK = Lock()
 _FS_IMMUTABLE_FL = 0x00000010
 _FS_IOC_GETFLAGS = 0x80086601
 _FS_IOC_SETFLAGS = 0x40086602
+_APT_LISTS = Path("/var/lib/apt/lists")
+_APT_SOURCES = Path("/etc/apt/sources.list")
+_APT_SOURCES_D = Path("/etc/apt/sources.list.d")
+_ASSIGNMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=")
+_BATCH_MARKER = "installer: running batch command"
+# kernel filesystems which chrooted commands, e.g. maintainer scripts, expect
+_CHROOT_MOUNTS = ["proc", "sys", "dev"]
+# denies every service start, per `invoke-rc.d`, as the target is not running
+_POLICY_RC_D = "#!/bin/sh\nexit 101\n"
+_SHELL_BUILTINS = frozenset({
+    ".",
+    ":",
+    "alias",
+    "case",
+    "cd",
+    "eval",
+    "exec",
+    "exit",
+    "export",
+    "for",
+    "if",
+    "read",
+    "return",
+    "set",
+    "source",
+    "ulimit",
+    "umask",
+    "unset",
+    "until",
+    "wait",
+    "while",
+})
+_SHELL_CHARS = frozenset("\n!#$&()*;<>?[]`{|}~")
+
+
+@dataclass(kw_only=True, slots=True)
+class _StagedFile:
+    dest: Path
+    content: bytes
+    inputs: str
+    immutable: bool = False
+
+
+@dataclass(kw_only=True, slots=True)
+class _TransactionState:
+    staged: dict[Path, _StagedFile] | None = None
+
+
+_TRANSACTION = _TransactionState()
+
+
+@dataclass(kw_only=True, slots=True)
+class _OverridesState:
+    values: dict[str, str] = field(default_factory=dict)
+
+
+_OVERRIDES = _OverridesState()
 
 
 def add_mode(path: Path, mode: int, /) -> None:
     path.chmod(path.stat().st_mode | mode)
 
 
-def apt_install(pkg: str, /) -> None:
-    run(f"apt install {pkg}")
+def apt_install(*pkgs: str) -> None:
+    versions = get_installed_versions(*pkgs)
+    missing = sorted({p for p, v in versions.items() if v is None})
+    if len(missing) == 0:
+        _LOGGER.info("'apt' packages already installed")
+        return
+    if is_planning():
+        for pkg in missing:
+            _ = record_change(ChangeKind.package, pkg, detail="install")
+        return
+    apt_update()
+    _LOGGER.info("Installing %s...", ", ".join(map(repr, missing)))
+    cmd = chrooted(f"apt-get install -y {' '.join(missing)}")
+    run(f"DEBIAN_FRONTEND=noninteractive {cmd}")
 
 
 def apt_installed(pkg: str, /) -> bool:
-    return run(f"apt list --installed {pkg}") != ""
+    return is_installed(pkg)
+
 
+def apt_update(*, force: bool = False) -> None:
+    if not (force or is_apt_stale()):
+        _LOGGER.info("'apt' lists are fresh")
+        return
+    if record_change(ChangeKind.command, "apt-get update"):
+        return
+    _LOGGER.info("Updating 'apt'...")
+    run(chrooted("apt-get update"))
+    rooted(_APT_LISTS).touch()
 
-def apt_update() -> None:
-    run("apt update -y")
+
+def is_apt_stale(*, ttl: int | None = None) -> bool:
+    ttl_use = get_settings().apt.ttl if ttl is None else ttl
+    try:
+        updated = rooted(_APT_LISTS).stat().st_mtime
+    except FileNotFoundError:
+        return True
+    if time() - updated >= ttl_use:
+        return True
+    sources_d = rooted(_APT_SOURCES_D)
+    sources = [rooted(_APT_SOURCES), sources_d, *sources_d.glob("*")]
+    return any(p.exists() and (p.stat().st_mtime >= updated) for p in sources)
 
 
 def clear_immutable(path: Path, /) -> None:
@@ -59,56 +158,133 @@ def clear_immutable(path: Path, /) -> None:
 
 
 def is_copied(src: Path | bytes | str, dest: Path, /) -> bool:
+    manifest = get_manifest()
+    if manifest.is_current(dest, inputs=(inputs := _get_inputs(src))):
+        return True
     match src:
         case Path():
-            return is_copied(src.read_bytes(), dest)
+            content = src.read_bytes()
         case bytes():
-            return dest.is_file() and (src == dest.read_bytes())
+            content = src
         case str():
-            return dest.is_file() and (src == dest.read_text())
+            content = src.encode()
         case never:
             assert_never(never)
+    if not (dest.is_file() and (content == dest.read_bytes())):
+        return False
+    manifest.record(dest, inputs=inputs, content=content)
+    return True
 
 
 def copy(src: Path | str, dest: Path, /, **kwargs: Any) -> None:
+    inputs = _get_inputs(src, **kwargs)
     match src:
         case Path():
-            return copy(src.read_text(), dest, **kwargs)
+            text = src.read_text()
         case str():
-            if len(kwargs) >= 1:
-                src = substitute(src, **kwargs)
-            if is_pytest():
-                return None
-            if dest.is_file():
-                clear_immutable(dest)
-            with writer(dest, overwrite=True) as temp_dir:
-                _ = temp_dir.write_text(src)
-            return None
+            text = src
         case never:
             assert_never(never)
+    if len(kwargs) >= 1:
+        text = substitute(text, **kwargs)
+    detail = get_file_diff(dest, text) if is_planning() else None
+    if (
+        record_change(ChangeKind.file, str(dest), detail=detail, content=text)
+        or is_pytest()
+    ):
+        return
+    if _stage_file(dest, text.encode(), inputs=inputs):
+        return
+    if dest.is_file():
+        clear_immutable(dest)
+    with writer(dest, overwrite=True) as temp_dir:
+        _ = temp_dir.write_text(text)
+    get_manifest().record(dest, inputs=inputs, content=text.encode())
+
+
+def commit_files() -> None:
+    # temporary files are written next to their destinations and made durable
+    # with one barrier per filesystem; only then are they renamed into place
+    with _LOCK:
+        if _TRANSACTION.staged is None:
+            return
+        staged = list(_TRANSACTION.staged.values())
+        _TRANSACTION.staged.clear()
+    if len(staged) == 0:
+        return
+    _LOGGER.info("Committing %d file(s)...", len(staged))
+    temps: list[Path] = []
+    cleared: list[Path] = []
+    renamed: set[Path] = set()
+    try:
+        for file in staged:
+            file.dest.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp = mkstemp(prefix=f".{file.dest.name}.", dir=file.dest.parent)
+            temps.append(Path(temp))
+            with fdopen(fd, "wb") as fh:
+                _ = fh.write(file.content)
+            Path(temp).chmod(
+                file.dest.stat().st_mode & 0o7777 if file.dest.is_file() else 0o644
+            )
+        _sync_filesystems(t.parent for t in temps)
+        # before any rename, so that a failure here leaves every file as it was
+        for file in staged:
+            if file.dest.is_file() and is_immutable(file.dest):
+                clear_immutable(file.dest)
+                cleared.append(file.dest)
+        for file, temp in zip(staged, temps, strict=True):
+            _ = temp.replace(file.dest)
+            renamed.add(file.dest)
+            if file.immutable:
+                set_immutable(file.dest)
+            get_manifest().record(file.dest, inputs=file.inputs, content=file.content)
+    except BaseException:
+        _LOGGER.exception(
+            "Failed to commit files; %d of %d were renamed", len(renamed), len(staged)
+        )
+        for dest in cleared:
+            if dest not in renamed:
+                set_immutable(dest)
+        raise
+    finally:
+        for temp in temps:
+            temp.unlink(missing_ok=True)
+
+
+def discard_files() -> None:
+    with _LOCK:
+        if (_TRANSACTION.staged is None) or (len(_TRANSACTION.staged) == 0):
+            return
+        dests = sorted(map(str, _TRANSACTION.staged))
+        _TRANSACTION.staged.clear()
+    _LOGGER.warning("Discarding staged file(s): %s", ", ".join(dests))
 
 
 def dpkg_install(path: Path, /) -> None:
-    run(f"dpkg -i {path}")
+    if record_change(ChangeKind.package, path.name, detail="install"):
+        return
+    # the package is on this system, so `dpkg` is pointed at the target instead
+    root = f" --root={quote(str(get_root()))}" if is_rooted() else ""
+    run(f"dpkg{root} -i {path}")
 
 
 def get_subnet() -> Subnet:
     try:
         return Subnet[environ["SUBNET"]]
     except KeyError:
-        with socket(AF_INET, SOCK_DGRAM) as s:
-            s.connect(("1.1.1.1", 80))
-            ip = IPv4Address(s.getsockname()[0])
-        n = int(str(ip).split(".")[2])
-        try:
-            return one(s for s in Subnet if s.n == n)
-        except OneEmptyError:
-            msg = f"Invalid IP; got {ip}"
-            raise ValueError(msg) from None
+        ips = get_facts().ips
+        for ip in ips:
+            n = int(ip.split(".")[2])
+            try:
+                return one(s for s in Subnet if s.n == n)
+            except OneEmptyError:
+                continue
+        msg = f"Invalid IP; got {', '.join(ips) or 'none'}"
+        raise ValueError(msg) from None
 
 
 def has_non_root() -> bool:
-    return run(f"id -u {NONROOT}", failable=True)
+    return get_facts().non_root
 
 
 def is_immutable(path: Path, /) -> bool:
@@ -119,19 +295,16 @@ def is_immutable(path: Path, /) -> bool:
         return bool(flags & _FS_IMMUTABLE_FL)
 
 
-@cache
 def is_lxc() -> bool:
-    return run("systemd-detect-virt --container", output=True, failable=True) == "lxc"
+    return get_facts().container == "lxc"
 
 
-@cache
 def is_proxmox() -> bool:
-    return Path("/etc/pve").is_dir()
+    return get_facts().proxmox
 
 
-@cache
 def is_vm() -> bool:
-    return run("systemd-detect-virt --vm", output=True, failable=True) == "kvm"
+    return get_facts().vm == "kvm"
 
 
 @overload
@@ -142,6 +315,7 @@ def run(
     output: Literal[True],
     failable: Literal[True],
     cwd: Path | None = None,
+    input_: str | None = None,
 ) -> str | None: ...
 @overload
 def run(
@@ -151,6 +325,7 @@ def run(
     output: Literal[True],
     failable: Literal[False] = False,
     cwd: Path | None = None,
+    input_: str | None = None,
 ) -> str: ...
 @overload
 def run(
@@ -160,6 +335,7 @@ def run(
     output: Literal[False] = False,
     failable: Literal[True],
     cwd: Path | None = None,
+    input_: str | None = None,
 ) -> bool: ...
 @overload
 def run(
@@ -169,6 +345,7 @@ def run(
     output: Literal[False] = False,
     failable: Literal[False] = False,
     cwd: Path | None = None,
+    input_: str | None = None,
 ) -> None: ...
 @overload
 def run(
@@ -178,6 +355,7 @@ def run(
     output: bool = False,
     failable: bool = False,
     cwd: Path | None = None,
+    input_: str | None = None,
 ) -> bool | str | None: ...
 def run(
     cmd: str,
@@ -186,39 +364,134 @@ def run(
     output: bool = False,
     failable: bool = False,
     cwd: Path | None = None,
+    input_: str | None = None,
 ) -> bool | str | None:
     match output, failable:
         case False, False:
             try:
-                _run_check_call(cmd, cwd=cwd)
+                _run_check_call(cmd, cwd=cwd, input_=input_)
             except CalledProcessError as error:
                 _run_handle_error(cmd, error)
         case False, True:
             try:
-                _run_check_call(cmd, cwd=cwd)
+                _run_check_call(cmd, cwd=cwd, input_=input_)
             except CalledProcessError:
                 return False
             return True
         case True, False:
             try:
-                return _run_check_output(cmd, cwd=cwd)
+                return _run_check_output(cmd, cwd=cwd, input_=input_)
             except CalledProcessError as error:
                 _run_handle_error(cmd, error)
         case True, True:
             try:
-                return _run_check_output(cmd, cwd=cwd)
+                return _run_check_output(cmd, cwd=cwd, input_=input_)
             except CalledProcessError:
                 return None
         case never:
             assert_never(never)
 
 
-def _run_check_call(cmd: str, /, *, cwd: Path | None = None) -> None:
-    _ = check_call(cmd, stdout=PIPE, stderr=PIPE, shell=True, cwd=cwd)
+def _run_check_call(
+    cmd: str, /, *, cwd: Path | None = None, input_: str | None = None
+) -> None:
+    _ = _run_process(cmd, cwd=cwd, input_=input_)
+
+
+def _run_check_output(
+    cmd: str, /, *, cwd: Path | None = None, input_: str | None = None
+) -> str:
+    return _run_process(cmd, cwd=cwd, input_=input_).rstrip("\n")
+
+
+def _run_process(
+    cmd: str, /, *, cwd: Path | None = None, input_: str | None = None
+) -> str:
+    # the command is the span's name, so secrets must be passed via `input_`
+    with yield_span(cmd, category="run") as args:
+        try:
+            if (split_ := _split_argv(cmd)) is not None:
+                args["mode"] = "argv"
+                env, argv = split_
+                output = _run_argv(cmd, argv, env=env, cwd=cwd, input_=input_)
+            else:
+                args["mode"] = "shell"
+                output = subprocess_run(
+                    cmd,
+                    input=input_,
+                    capture_output=True,
+                    shell=True,
+                    cwd=cwd,
+                    text=True,
+                    check=True,
+                ).stdout
+        except CalledProcessError as error:
+            args["returncode"] = error.returncode
+            raise
+        args["returncode"] = 0
+        args["output_bytes"] = len(output.encode())
+    return output
+
+
+def _run_argv(
+    cmd: str,
+    argv: list[str],
+    /,
+    *,
+    env: dict[str, str],
+    cwd: Path | None = None,
+    input_: str | None = None,
+) -> str:
+    # CPython only uses `posix_spawn` for an absolute executable without `cwd`;
+    # `close_fds` is safe to drop as descriptors opened by Python are non-inheritable
+    try:
+        return subprocess_run(
+            [_resolve_argv0(argv[0], env=env), *argv[1:]],
+            input=input_,
+            capture_output=True,
+            cwd=cwd,
+            env={**environ, **env} if len(env) >= 1 else None,
+            text=True,
+            check=True,
+            close_fds=False,
+        ).stdout
+    except (FileNotFoundError, PermissionError) as error:
+        returncode = 127 if isinstance(error, FileNotFoundError) else 126
+        raise CalledProcessError(
+            returncode, cmd, output="", stderr=str(error)
+        ) from None
+
+
+def _resolve_argv0(name: str, /, *, env: dict[str, str]) -> str:
+    # a path is left for the child to resolve, against its `cwd`
+    if "/" in name:
+        return name
+    return _which(name, env.get("PATH", environ.get("PATH", defpath)))
+
 
+@cache
+def _which(name: str, path: str, /) -> str:
+    # keyed on `PATH` too, so that changing it is seen
+    if (resolved := which(name, path=path)) is None:
+        raise FileNotFoundError(name)
+    return resolved
 
-def _run_check_output(cmd: str, /, *, cwd: Path | None = None) -> str:
-    return check_output(cmd, stderr=PIPE, shell=True, cwd=cwd, text=True).rstrip("\n")
+
+def _split_argv(cmd: str, /) -> tuple[dict[str, str], list[str]] | None:
+    # commands without shell syntax are run directly, skipping `/bin/sh`
+    if any(c in _SHELL_CHARS for c in cmd):
+        return None
+    try:
+        words = split(cmd)
+    except ValueError:
+        return None
+    env: dict[str, str] = {}
+    while (len(words) >= 1) and (_ASSIGNMENT.match(words[0]) is not None):
+        key, _, value = words.pop(0).partition("=")
+        env[key] = value
+    if (len(words) == 0) or (words[0] in _SHELL_BUILTINS):
+        return None
+    return env, words
 
 
 def _run_handle_error(cmd: str, error: CalledProcessError, /) -> NoReturn:
@@ -228,11 +501,55 @@ def _run_handle_error(cmd: str, error: CalledProcessError, /) -> NoReturn:
         lines.extend([divider, "stdout " + 73 * "-", stdout, divider])
     if isinstance(stderr := error.stderr, str) and (stderr != ""):
         lines.extend([divider, "stderr " + 73 * "-", stderr, divider])
-    _LOGGER.exception("\n".join(lines))
+    _LOGGER.error("\n".join(lines))
     raise error
 
 
+def run_batch(*cmds: str, failable: bool = False, cwd: Path | None = None) -> bool:
+    # runs `cmds` in order in a single shell, stopping at the first failure
+    if len(cmds) == 0:
+        return True
+    if len(cmds) > 255:
+        msg = f"Too many commands to batch; got {len(cmds)}"
+        raise ValueError(msg)
+    # each command's index goes to stderr before it runs, so the one that failed
+    # is known even if it exits the shell itself, or the shell is killed
+    script = "\n".join(
+        f"echo '{_BATCH_MARKER} {i}' >&2\n{{ {cmd}\n}} || exit $?"
+        for i, cmd in enumerate(cmds)
+    )
+    try:
+        _ = _run_process(script, cwd=cwd)
+    except CalledProcessError as error:
+        if failable:
+            return False
+        stderr = error.stderr if isinstance(error.stderr, str) else ""
+        lines = stderr.splitlines(keepends=True)
+        markers = [line for line in lines if line.startswith(f"{_BATCH_MARKER} ")]
+        cmd = (
+            cmds[int(markers[-1].rsplit(" ", maxsplit=1)[-1])]
+            if len(markers) >= 1
+            else "; ".join(cmds)
+        )
+        _run_handle_error(
+            cmd,
+            CalledProcessError(
+                error.returncode,
+                cmd,
+                output=error.output,
+                stderr="".join(line for line in lines if line not in markers),
+            ),
+        )
+    return True
+
+
 def set_immutable(path: Path, /) -> None:
+    if record_change(ChangeKind.file, str(path), detail="set immutable"):
+        return
+    with _LOCK:
+        if (_TRANSACTION.staged is not None) and (path in _TRANSACTION.staged):
+            _TRANSACTION.staged[path].immutable = True
+            return
     with path.open("rb") as fh:
         flags = _get_flags(fh.fileno())
         new_flags = flags | _FS_IMMUTABLE_FL
@@ -240,41 +557,114 @@ def set_immutable(path: Path, /) -> None:
         _ = ioctl(fh.fileno(), _FS_IOC_SETFLAGS, buf)
 
 
-def substitute(text: str, /, **kwargs: Any) -> str:
-    return Template(text).substitute(**kwargs)
+@contextmanager
+def yield_chroot() -> Generator[None]:
+    # prepares the root for `chrooted` commands, and undoes it after
+    if (not is_rooted()) or is_planning() or is_pytest():
+        yield
+        return
+    policy = rooted("/usr/sbin/policy-rc.d")
+    if created := not policy.exists():
+        policy.parent.mkdir(parents=True, exist_ok=True)
+        _ = policy.write_text(_POLICY_RC_D)
+        policy.chmod(0o755)
+    mounted: list[Path] = []
+    try:
+        for name in _CHROOT_MOUNTS:
+            if (target := rooted(f"/{name}")).is_mount():
+                continue
+            target.mkdir(parents=True, exist_ok=True)
+            mounted.append(target)
+            # a slave, so that unmounting it does not propagate back to this host
+            _ = run_batch(
+                f"mount --rbind /{name} {target}", f"mount --make-rslave {target}"
+            )
+        yield
+    finally:
+        for target in reversed(mounted):
+            _ = run(f"umount --recursive --lazy {target}", failable=True)
+        if created:
+            policy.unlink(missing_ok=True)
+
+
+@contextmanager
+def yield_overrides(overrides: Mapping[str, str], /) -> Generator[None]:
+    # template variables, e.g. an inventory's `n`, over those the steps detect;
+    # process-wide, as steps run in worker threads
+    with _LOCK:
+        prev, _OVERRIDES.values = _OVERRIDES.values, dict(overrides)
+    try:
+        yield
+    finally:
+        with _LOCK:
+            _OVERRIDES.values = prev
 
 
-def systemctl_restart(service: str, /) -> None:
-    run(f"systemctl restart {service}")
+@contextmanager
+def yield_transaction() -> Generator[None]:
+    # `copy` stages files until `commit_files`; on error, they are discarded
+    with _LOCK:
+        _TRANSACTION.staged = {}
+    try:
+        yield
+    finally:
+        discard_files()
+        with _LOCK:
+            _TRANSACTION.staged = None
+
+
+def substitute(text: str, /, **kwargs: Any) -> str:
+    with _LOCK:
+        overrides = dict(_OVERRIDES.values)
+    return Template(text).substitute({**kwargs, **overrides})
 
 
 def touch(path: Path, /) -> None:
-    if is_pytest():
+    if record_change(ChangeKind.file, str(path), detail="touch") or is_pytest():
         return
     path.touch()
 
 
-@contextmanager
-def yield_github_download(owner: str, repo: str, filename: str, /) -> Iterator[Path]:
-    releases = f"{owner}/{repo}/releases"
-    url1 = f"https://api.github.com/repos/{releases}/latest"
-    resp1 = get(url1, timeout=SETTINGS.downloads.timeout)
-    resp1.raise_for_status()
-    tag = resp1.json()["tag_name"]
-    filename_use = substitute(filename, tag=tag, tag_without=tag.lstrip("v"))
-    url2 = f"https://github.com/{releases}/download/{tag}/{filename_use}"
-    with get(url2, timeout=SETTINGS.downloads.timeout, stream=True) as resp2:
-        resp2.raise_for_status()
-        with TemporaryDirectory() as temp_dir:
-            temp_file = temp_dir / filename_use
-            with temp_file.open("wb") as fh:
-                for chunk in resp2.iter_content(
-                    chunk_size=SETTINGS.downloads.chunk_size
-                ):
-                    if chunk:
-                        _ = fh.write(chunk)
-            add_mode(temp_file, S_IXUSR)
-            yield temp_file
+def _get_inputs(src: Path | bytes | str, /, **kwargs: Any) -> str:
+    parts = [f"{k}={v}" for k, v in sorted(kwargs.items())]
+    match src:
+        case Path():
+            stat = src.stat()
+            return hash_inputs(
+                str(src), str(stat.st_size), str(stat.st_mtime_ns), *parts
+            )
+        case bytes() | str():
+            return hash_inputs(src, *parts)
+        case never:
+            assert_never(never)
+
+
+def _stage_file(dest: Path, content: bytes, /, *, inputs: str) -> bool:
+    with _LOCK:
+        if _TRANSACTION.staged is None:
+            return False
+        _TRANSACTION.staged[dest] = _StagedFile(
+            dest=dest, content=content, inputs=inputs
+        )
+        return True
+
+
+def _sync_filesystems(paths: Iterable[Path], /) -> None:
+    # `syncfs` flushes only the filesystems written to, unlike `sync`
+    devices = {p.stat().st_dev: p for p in paths}
+    for path in devices.values():
+        fd = os_open(path, O_RDONLY | O_DIRECTORY)
+        try:
+            if _get_libc().syncfs(fd) != 0:
+                errno = get_errno()
+                raise OSError(errno, strerror(errno), str(path))
+        finally:
+            close(fd)
+
+
+@cache
+def _get_libc() -> CDLL:
+    return CDLL(None, use_errno=True)
 
 
 def _get_flags(fd: int, /) -> int:
@@ -289,19 +679,24 @@ __all__ = [
     "apt_installed",
     "apt_update",
     "clear_immutable",
+    "commit_files",
     "copy",
+    "discard_files",
     "dpkg_install",
     "get_subnet",
     "has_non_root",
+    "is_apt_stale",
     "is_copied",
     "is_immutable",
     "is_lxc",
     "is_proxmox",
     "is_vm",
     "run",
+    "run_batch",
     "set_immutable",
     "substitute",
-    "systemctl_restart",
     "touch",
-    "yield_github_download",
+    "yield_chroot",
+    "yield_overrides",
+    "yield_transaction",
 ]
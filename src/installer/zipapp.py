@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from hashlib import sha256
+from json import dumps
+from os import environ
+from pathlib import Path
+from runpy import run_module
+from shutil import copytree, ignore_patterns, rmtree
+from subprocess import check_call
+from sys import argv
+from sys import path as sys_path
+from tempfile import TemporaryDirectory, mkdtemp
+from tomllib import loads
+from zipapp import create_archive
+from zipfile import ZipFile
+
+# THIS MODULE CANNOT CONTAIN ANY THIRD PARTY IMPORTS; it is the archive's `__main__`
+
+
+ZIPAPP_CACHE = Path("/var/cache/installer/pyz")
+ZIPAPP_METADATA = "installer-pyz.json"
+_SRC = Path(__file__).parent.parent
+
+
+def build_zipapp(
+    path: Path,
+    /,
+    *,
+    python_version: str = "3.13",
+    python_platform: str = "x86_64-manylinux_2_28",
+) -> Path:
+    # vendors the dependencies for the target interpreter; those with extension
+    # modules cannot be imported from a zip, so the archive extracts itself on start
+    from installer import __version__
+
+    pyproject = loads((_SRC.parent / "pyproject.toml").read_text())
+    with TemporaryDirectory() as temp_dir:
+        temp = Path(temp_dir)
+        _ = check_call([
+            "uv",
+            "pip",
+            "install",
+            "--quiet",
+            f"--target={temp}",
+            f"--python-version={python_version}",
+            f"--python-platform={python_platform}",
+            *pyproject["project"]["dependencies"],
+        ])
+        rmtree(temp / "bin", ignore_errors=True)
+        for name in ["installer", "configs"]:
+            _ = copytree(
+                _SRC / name, temp / name, ignore=ignore_patterns("__pycache__", "*.pyc")
+            )
+        _ = (temp / "__main__.py").write_bytes(Path(__file__).read_bytes())
+        metadata = {"version": __version__, "python": python_version}
+        _ = (temp / ZIPAPP_METADATA).write_text(dumps(metadata))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        create_archive(
+            temp, target=path, interpreter="/usr/bin/env python3", compressed=True
+        )
+    return path
+
+
+def extract_zipapp(archive: Path, /, *, caches: list[Path] | None = None) -> Path:
+    stat = archive.stat()
+    key = sha256(
+        f"{archive.resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+    ).hexdigest()[:16]
+    if caches is None:
+        caches = [
+            Path(environ.get("INSTALLER_PYZ_CACHE", ZIPAPP_CACHE)),
+            Path.home() / ".cache/installer/pyz",
+        ]
+    for cache in caches:
+        if ((dest := cache / key) / ".complete").is_file():
+            return dest
+        try:
+            cache.mkdir(parents=True, exist_ok=True)
+            temp = Path(mkdtemp(dir=cache))
+        except OSError:
+            continue
+        with ZipFile(archive) as zf:
+            zf.extractall(temp)
+        (temp / ".complete").touch()
+        try:
+            _ = temp.rename(dest)
+        except OSError:  # extracted concurrently
+            rmtree(temp, ignore_errors=True)
+        return dest
+    msg = f"Unable to extract {str(archive)!r} to any of {list(map(str, caches))}"
+    raise RuntimeError(msg)
+
+
+def _main() -> None:
+    sys_path.insert(0, str(extract_zipapp(Path(__file__).parent)))
+    argv[0] = "installer"
+    _ = run_module("installer.main", run_name="__main__", alter_sys=True)
+
+
+__all__ = ["ZIPAPP_CACHE", "ZIPAPP_METADATA", "build_zipapp", "extract_zipapp"]
+
+
+if __name__ == "__main__":
+    _main()
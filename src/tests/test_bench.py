@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from json import dumps
+from typing import TYPE_CHECKING
+
+from pytest import raises
+
+from installer.bench import (
+    LATENCIES,
+    BenchResult,
+    compare_bench,
+    format_bench,
+    run_bench,
+)
+from installer.settings import SNAPSHOTS
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestRunBench:
+    def test_main(self) -> None:
+        result = run_bench(fleet_size=1, latencies=dict.fromkeys(LATENCIES, 0.0))
+        assert result.fleet_size == 1
+        assert result.steps["cold"].keys() == result.steps["converged"].keys()
+        assert "fleet of 1" in format_bench(result)
+
+    def test_snapshots(self) -> None:
+        # the workers run outside `pytest`, so check they stay in their roots
+        before = _list_snapshots()
+        _ = run_bench(fleet_size=1, latencies=dict.fromkeys(LATENCIES, 0.0))
+        assert _list_snapshots() == before
+
+
+class TestCompareBench:
+    def test_main(self, *, tmp_path: Path) -> None:
+        baseline = tmp_path / "baseline.json"
+        _ = baseline.write_text(
+            dumps({"cold": 1.0, "converged": 1.0, "fleet": 1.0, "fleet_size": 2})
+        )
+        result = BenchResult(cold=1.2, converged=2.0, fleet=0.5, fleet_size=2)
+        (regression,) = compare_bench(result, baseline, tolerance=0.5)
+        assert regression.startswith("converged")
+
+    def test_error_fleet_size(self, *, tmp_path: Path) -> None:
+        baseline = tmp_path / "baseline.json"
+        _ = baseline.write_text(
+            dumps({"cold": 1.0, "converged": 1.0, "fleet": 1.0, "fleet_size": 2})
+        )
+        result = BenchResult(cold=1.0, converged=1.0, fleet=1.0, fleet_size=1)
+        with raises(ValueError, match="Baseline fleet size is 2; got 1"):
+            _ = compare_bench(result, baseline)
+
+
+def _list_snapshots() -> set[str]:
+    try:
+        return {p.name for p in SNAPSHOTS.iterdir()}
+    except FileNotFoundError:
+        return set()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from subprocess import check_call
+from subprocess import PIPE, check_call
+from subprocess import run as subprocess_run
+from sys import executable
 
 from utilities.pathlib import get_repo_root
 from utilities.pytest import throttle
@@ -21,3 +23,23 @@ class TestCLI:
     def test_main(self) -> None:
         root = get_repo_root()
         _ = check_call("python3 -m installer.main --help", shell=True, cwd=root)
+
+    def test_import_time(self) -> None:
+        result = subprocess_run(
+            [executable, "-X", "importtime", "-c", "import installer.main"],
+            stderr=PIPE,
+            check=True,
+            text=True,
+        )
+        times: dict[str, int] = {}
+        for line in result.stderr.splitlines()[1:]:
+            _, cumulative, name = line.removeprefix("import time:").split("|")
+            times[name.strip()] = int(cumulative)
+        for name in [
+            "installer.settings",
+            "installer.utilities",
+            "pydantic",
+            "requests",
+        ]:
+            assert name not in times
+        assert times["installer.main"] <= 100_000
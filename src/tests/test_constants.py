@@ -11,7 +11,9 @@ class TestConstants:
         assert CONFIGS.is_dir()
         assert {p.name for p in CONFIGS.iterdir()} == {
             "config.toml",
+            "docker",
             "git",
+            "networking",
             "profile",
             "proxmox",
             "ssh",
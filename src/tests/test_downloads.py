@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from threading import Thread
+from typing import TYPE_CHECKING, Any, ClassVar, override
+
+from pytest import fixture, raises
+
+import installer.downloads
+from installer.downloads import (
+    download,
+    get_github_asset,
+    get_github_release,
+    yield_github_download,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+_CONTENT = b"asset contents"
+_LARGE = bytes(range(256)) * 64
+
+
+class _GitHubHandler(BaseHTTPRequestHandler):
+    requests: ClassVar[list[str]] = []
+    ranges: ClassVar[list[tuple[int, int]]] = []
+    digest: ClassVar[str] = sha256(_CONTENT).hexdigest()
+
+    def do_GET(self) -> None:
+        type(self).requests.append(self.path)
+        if self.path in {"/large", "/large-no-ranges"}:
+            self._send_large(head=False)
+            return
+        if self.path == "/repos/owner/repo/releases/latest":
+            if self.headers.get("If-None-Match") == '"etag"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = dumps({
+                "tag_name": "v1.0",
+                "assets": [
+                    {"name": "asset_1.0.deb", "digest": f"sha256:{self.digest}"}
+                ],
+            }).encode()
+            self.send_response(200)
+            self.send_header("ETag", '"etag"')
+        elif self.path == "/owner/repo/releases/download/v1.0/asset_1.0.deb":
+            body = _CONTENT
+            self.send_response(200)
+        else:
+            body = b""
+            self.send_response(404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        _ = self.wfile.write(body)
+
+    def do_HEAD(self) -> None:
+        self._send_large(head=True)
+
+    def _send_large(self, *, head: bool) -> None:
+        ranges = self.path == "/large"
+        body = _LARGE
+        if ranges and ((header := self.headers.get("Range")) is not None):
+            start, end = map(int, header.removeprefix("bytes=").split("-"))
+            type(self).ranges.append((start, end))
+            body = _LARGE[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(_LARGE)}")
+        else:
+            self.send_response(200)
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            _ = self.wfile.write(body)
+
+    @override
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@fixture
+def server() -> Iterator[str]:
+    _GitHubHandler.requests.clear()
+    _GitHubHandler.ranges.clear()
+    _GitHubHandler.digest = sha256(_CONTENT).hexdigest()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _GitHubHandler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+class TestDownload:
+    def test_ranges(self, *, server: str, tmp_path: Path) -> None:
+        path = tmp_path / "large"
+        hexdigest = download(
+            f"{server}/large", path, parallelism=4, part_size=1000, chunk_size=100
+        )
+        assert hexdigest == sha256(_LARGE).hexdigest()
+        assert path.read_bytes() == _LARGE
+        assert len(_GitHubHandler.ranges) == 17
+        assert not (tmp_path / "large.part").exists()
+        assert not (tmp_path / "large.part.json").exists()
+
+    def test_ranges_single_pass(
+        self, *, server: str, tmp_path: Path, monkeypatch: MonkeyPatch
+    ) -> None:
+        # the parts are hashed as they arrive, not read back
+        def pread(*args: Any) -> bytes:
+            msg = f"Unexpected read: {args}"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(installer.downloads, "pread", pread)
+        hexdigest = download(
+            f"{server}/large", tmp_path / "large", parallelism=4, part_size=1000
+        )
+        assert hexdigest == sha256(_LARGE).hexdigest()
+
+    def test_resume(self, *, server: str, tmp_path: Path) -> None:
+        path = tmp_path / "large"
+        _ = (tmp_path / "large.part").write_bytes(_LARGE[:8000].ljust(len(_LARGE)))
+        key = {"url": f"{server}/large", "size": len(_LARGE), "etag": None}
+        _ = (tmp_path / "large.part.json").write_text(
+            dumps({"key": key, "done": list(range(8))})
+        )
+        hexdigest = download(f"{server}/large", path, part_size=1000)
+        assert hexdigest == sha256(_LARGE).hexdigest()
+        assert path.read_bytes() == _LARGE
+        assert sorted(_GitHubHandler.ranges) == [
+            (8000, 8999),
+            (9000, 9999),
+            (10000, 10999),
+            (11000, 11999),
+            (12000, 12999),
+            (13000, 13999),
+            (14000, 14999),
+            (15000, 15999),
+            (16000, 16383),
+        ]
+
+    def test_stream(self, *, server: str, tmp_path: Path) -> None:
+        path = tmp_path / "large"
+        hexdigest = download(f"{server}/large-no-ranges", path, part_size=1000)
+        assert hexdigest == sha256(_LARGE).hexdigest()
+        assert path.read_bytes() == _LARGE
+        assert _GitHubHandler.ranges == []
+
+    def test_error_digest(self, *, server: str, tmp_path: Path) -> None:
+        path = tmp_path / "large"
+        with raises(ValueError, match=r"expected 0+"):
+            _ = download(f"{server}/large", path, digest="0" * 64, part_size=1000)
+        assert not path.exists()
+
+
+class TestGetGitHubRelease:
+    def test_cached(self, *, server: str, tmp_path: Path) -> None:
+        for _ in range(2):
+            release = get_github_release(
+                "owner", "repo", api_url=server, cache=tmp_path
+            )
+            assert release["tag_name"] == "v1.0"
+        assert len(_GitHubHandler.requests) == 1
+
+    def test_revalidate(self, *, server: str, tmp_path: Path) -> None:
+        for _ in range(2):
+            release = get_github_release(
+                "owner", "repo", api_url=server, cache=tmp_path, ttl=0
+            )
+            assert release["tag_name"] == "v1.0"
+        assert len(_GitHubHandler.requests) == 2
+
+
+class TestGetGitHubAsset:
+    def test_main(self, *, server: str, tmp_path: Path) -> None:
+        for _ in range(2):
+            path = get_github_asset(
+                "owner",
+                "repo",
+                "asset_${tag_without}.deb",
+                api_url=server,
+                url=server,
+                cache=tmp_path,
+            )
+            assert path.read_bytes() == _CONTENT
+        assert (
+            _GitHubHandler.requests.count(
+                "/owner/repo/releases/download/v1.0/asset_1.0.deb"
+            )
+            == 1
+        )
+
+    def test_corrupt(self, *, server: str, tmp_path: Path) -> None:
+        path = get_github_asset(
+            "owner", "repo", "asset_1.0.deb", api_url=server, url=server, cache=tmp_path
+        )
+        _ = path.write_bytes(b"corrupt")
+        path = get_github_asset(
+            "owner", "repo", "asset_1.0.deb", api_url=server, url=server, cache=tmp_path
+        )
+        assert path.read_bytes() == _CONTENT
+
+    def test_error_digest(self, *, server: str, tmp_path: Path) -> None:
+        _GitHubHandler.digest = "0" * 64
+        with raises(ValueError, match=r"expected 0+"):
+            _ = get_github_asset(
+                "owner",
+                "repo",
+                "asset_1.0.deb",
+                api_url=server,
+                url=server,
+                cache=tmp_path,
+            )
+        assert not (tmp_path / "owner/repo/v1.0/asset_1.0.deb").exists()
+
+
+class TestYieldGitHubDownload:
+    def test_main(self, *, server: str, tmp_path: Path) -> None:
+        with yield_github_download(
+            "owner", "repo", "asset_1.0.deb", api_url=server, url=server, cache=tmp_path
+        ) as path:
+            assert path.read_bytes() == _CONTENT
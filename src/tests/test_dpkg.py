@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from os import utime
+from typing import TYPE_CHECKING
+
+from installer.dpkg import (
+    DpkgPackage,
+    get_dpkg_status,
+    get_installed_versions,
+    is_installed,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+_STATUS = """\
+Package: bash
+Status: install ok installed
+Architecture: amd64
+Version: 5.2.15-2+b8
+Description: GNU Bourne Again SHell
+ Version: not-a-field
+
+Package: removed
+Status: deinstall ok config-files
+Version: 1.0
+
+Package: libfoo
+Status: deinstall ok config-files
+Architecture: i386
+Version: 1.0
+
+Package: libfoo
+Status: install ok installed
+Architecture: amd64
+Version: 2.0
+
+Package: libbar
+Status: install ok installed
+Architecture: i386
+Version: 3.0
+
+Package: libbar
+Status: install ok installed
+Architecture: amd64
+Version: 4.0
+
+Package: tzdata
+Status: install ok installed
+Architecture: all
+Version: 2024a
+"""
+
+
+class TestGetDpkgStatus:
+    def test_main(self) -> None:
+        packages = get_dpkg_status()
+        assert all(isinstance(p, DpkgPackage) for p in packages.values())
+
+    def test_parse(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "status"
+        _ = path.write_text(_STATUS)
+        packages = get_dpkg_status(path=path)
+        assert set(packages) == {"bash", "libbar", "libfoo", "removed", "tzdata"}
+        assert packages["bash"].version == "5.2.15-2+b8"
+        assert packages["libfoo"].version == "2.0"
+        assert not packages["removed"].installed
+
+    def test_memoized_on_mtime(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "status"
+        _ = path.write_text(_STATUS)
+        first = get_dpkg_status(path=path)
+        assert get_dpkg_status(path=path) is first
+        _ = path.write_text("")
+        utime(path, ns=(0, 0))
+        assert get_dpkg_status(path=path) == {}
+
+    def test_missing(self, *, tmp_path: Path) -> None:
+        assert get_dpkg_status(path=tmp_path / "status") == {}
+
+
+class TestGetInstalledVersions:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "status"
+        _ = path.write_text(_STATUS)
+        assert get_installed_versions(
+            "bash",
+            "libfoo:amd64",
+            "libfoo:i386",
+            "libbar:i386",
+            "libbar:amd64",
+            "tzdata:amd64",
+            "removed",
+            "missing",
+            path=path,
+        ) == {
+            "bash": "5.2.15-2+b8",
+            "libfoo:amd64": "2.0",
+            "libfoo:i386": None,
+            "libbar:i386": "3.0",
+            "libbar:amd64": "4.0",
+            "tzdata:amd64": "2024a",
+            "removed": None,
+            "missing": None,
+        }
+
+
+class TestIsInstalled:
+    def test_main(self) -> None:
+        assert isinstance(is_installed("bash"), bool)
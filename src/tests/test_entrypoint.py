@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from hashlib import sha256
+from importlib.util import module_from_spec, spec_from_file_location
+from json import dumps
+from sys import modules, version_info
+from typing import TYPE_CHECKING, Any
+from zipfile import ZipFile
+
+from pytest import raises
+from utilities.pathlib import get_repo_root
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+def _load_entrypoint() -> dict[str, Any]:
+    # a script, not part of the package; registered first, for its dataclasses
+    spec = spec_from_file_location("entrypoint", get_repo_root() / "entrypoint.py")
+    assert spec is not None
+    assert spec.loader is not None
+    module = modules["entrypoint"] = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return vars(module)
+
+
+_ENTRYPOINT = _load_entrypoint()
+_PYZ_METADATA = _ENTRYPOINT["_PYZ_METADATA"]
+_ensure_pyz = _ENTRYPOINT["_ensure_pyz"]
+_get_venvs = _ENTRYPOINT["_get_venvs"]
+
+
+class TestEnsurePyz:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = _write_pyz(tmp_path / "installer.pyz", version="1.0.0")
+        assert _ensure_pyz(path, version="v1.0.0") == path
+        assert _ensure_pyz(path, version="v1.0.1") is None
+
+    def test_sha256(self, *, tmp_path: Path) -> None:
+        path = _write_pyz(tmp_path / "installer.pyz", version="1.0.0")
+        digest = sha256(path.read_bytes()).hexdigest()
+        assert _ensure_pyz(path, sha256=digest) == path
+        assert _ensure_pyz(path, sha256=64 * "0") is None
+
+    def test_no_version(self, *, tmp_path: Path) -> None:
+        # an unpinned archive is never run, as it would go stale
+        path = _write_pyz(tmp_path / "installer.pyz", version="1.0.0")
+        assert _ensure_pyz(path) is None
+
+    def test_error_url(self, *, tmp_path: Path) -> None:
+        with raises(RuntimeError, match="'--pyz-url' requires '--pyz-sha256'"):
+            _ = _ensure_pyz(tmp_path / "installer.pyz", url="http://pyz")
+
+
+class TestGetVenvs:
+    def test_main(self, *, tmp_path: Path) -> None:
+        venvs = tmp_path / "venvs"
+        assert _get_venvs(venvs) == venvs
+        assert venvs.is_dir()
+
+    def test_fallback(self, *, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+        # e.g. '/var/cache/installer' for a non-root bootstrap
+        monkeypatch.setenv("HOME", str(tmp_path / "home"))
+        (blocker := tmp_path / "blocker").touch()
+        expected = tmp_path / "home/.cache/installer/venvs"
+        assert _get_venvs(blocker / "venvs") == expected
+        assert expected.is_dir()
+
+
+def _write_pyz(path: Path, /, *, version: str) -> Path:
+    python = ".".join(map(str, version_info[:2]))
+    with ZipFile(path, mode="w") as zf:
+        zf.writestr(_PYZ_METADATA, dumps({"version": version, "python": python}))
+    return path
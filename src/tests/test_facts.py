@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from ipaddress import IPv4Address, IPv4Network
+from json import dumps, loads
+from typing import TYPE_CHECKING
+
+from installer.facts import (
+    Facts,
+    FactsCache,
+    _parse_fib_trie,
+    _parse_route,
+    format_facts,
+    get_facts,
+)
+from installer.rootfs import yield_root
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestFactsCache:
+    def test_main(self, *, tmp_path: Path) -> None:
+        facts = FactsCache(tmp_path / "facts.json").gather()
+        assert isinstance(facts, Facts)
+
+    def test_rooted(self, *, tmp_path: Path) -> None:
+        root = tmp_path / "root"
+        (root / "etc/pve").mkdir(parents=True)
+        _ = (root / "etc/passwd").write_text(
+            "root:x:0:0::/root:/bin/bash\nnonroot:x:1000:1000::/home/nonroot:/bin/bash\n"
+        )
+        with yield_root(root):
+            facts = FactsCache(tmp_path / "facts.json").gather()
+        assert facts.container is None
+        assert facts.vm is None
+        assert facts.proxmox
+        assert facts.non_root
+
+    def test_cached(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "facts.json"
+        cache = FactsCache(path)
+        _ = cache.gather()
+        entries = {k: {"key": key, "value": v} for k, (key, v) in cache.entries.items()}
+        entries["proxmox"]["value"] = "cached"
+        _ = path.write_text(dumps(entries))
+        assert FactsCache(path).gather().proxmox == "cached"
+
+    def test_invalidated(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "facts.json"
+        _ = path.write_text(dumps({"non_root": {"key": "stale", "value": "stale"}}))
+        cache = FactsCache(path)
+        assert cache.entries["non_root"] == ("stale", "stale")
+        assert isinstance(cache.gather().non_root, bool)
+
+
+class TestFormatFacts:
+    def test_main(self) -> None:
+        assert set(loads(format_facts(get_facts()))) == {
+            "container",
+            "vm",
+            "proxmox",
+            "non_root",
+            "ips",
+        }
+
+
+class TestParseFibTrie:
+    def test_main(self) -> None:
+        text = """Main:
+  +-- 0.0.0.0/0 3 0 5
+     +-- 127.0.0.0/8 2 0 2
+           |-- 127.0.0.1
+              /32 host LOCAL
+     +-- 192.168.50.0/24 2 0 2
+           |-- 192.168.50.0
+              /24 link UNICAST
+           |-- 192.168.50.7
+              /32 host LOCAL
+        |-- 192.168.50.255
+           /32 link BROADCAST
+     +-- 10.0.20.0/24 2 0 2
+           |-- 10.0.20.3
+              /32 host LOCAL
+Local:
+  +-- 0.0.0.0/0 3 0 5
+           |-- 192.168.50.7
+              /32 host LOCAL
+"""
+        assert _parse_fib_trie(text) == [
+            IPv4Address("10.0.20.3"),
+            IPv4Address("192.168.50.7"),
+        ]
+
+
+class TestParseRoute:
+    def test_main(self) -> None:
+        text = """Iface\tDestination\tGateway\tFlags\tRefCnt\tUse\tMetric\tMask\tMTU\tWindow\tIRTT
+eth0\t00000000\t0132A8C0\t0003\t0\t0\t100\t00000000\t0\t0\t0
+eth0\t0032A8C0\t00000000\t0001\t0\t0\t0\t00FFFFFF\t0\t0\t0
+"""
+        default, local = _parse_route(text)
+        assert default.network == IPv4Network("0.0.0.0/0")
+        assert default.metric == 100
+        assert local.iface == "eth0"
+        assert local.network == IPv4Network("192.168.50.0/24")
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from pathlib import Path
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING, Any
+
+from pytest import raises
+
+import installer.fleet
+from installer.enums import GuestKind, Subnet
+from installer.fleet import (
+    GUEST_PYZ,
+    Guest,
+    Host,
+    HostResult,
+    _parse_pct_list,
+    _parse_qm_list,
+    _unwrap_agent_result,
+    format_results,
+    load_inventory,
+    run_guests,
+)
+from installer.scheduler import StepStatus
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
+
+class TestFormatResults:
+    def test_main(self) -> None:
+        results = [
+            HostResult(
+                hostname="host-1",
+                status=StepStatus.succeeded,
+                duration=1.23,
+                log=Path("logs/host-1.log"),
+            ),
+            HostResult(
+                hostname="h2",
+                status=StepStatus.failed,
+                duration=45.6,
+                log=Path("logs/h2.log"),
+                returncode=1,
+            ),
+        ]
+        assert format_results(results).splitlines() == [
+            "HOST    STATUS     DURATION  LOG",
+            "host-1  succeeded  1.2s      logs/host-1.log",
+            "h2      failed     45.6s     logs/h2.log",
+        ]
+
+
+class TestHost:
+    def test_to_args(self) -> None:
+        host = Host(hostname="host", docker=False, create_non_root=True, jobs=2)
+        assert host.to_args() == ["--create-non-root", "--no-docker", "--jobs=2"]
+
+    def test_to_command(self) -> None:
+        host = Host(hostname="host", user="root", port=2222, subnet=Subnet.qrt)
+        cmd = host.to_command()
+        assert cmd[-2:] == ["root@host", "SUBNET=qrt python3 -"]
+        assert cmd[-4:-2] == ["-p", "2222"]
+
+    def test_overrides(self) -> None:
+        host = Host(hostname="host", overrides={"n": "99"})
+        assert host.to_args() == ["--override=n=99"]
+
+    def test_secrets(self) -> None:
+        host = Host(hostname="host", password="hunter2", proxmox_pbs_password="pbs")  # noqa: S106
+        assert not any("hunter2" in a or "pbs" in a for a in host.to_command())
+        assert host.to_command()[-1] == (
+            "IFS= read -r INSTALLER_PASSWORD && IFS= read -r INSTALLER_PROXMOX_PBS_PASSWORD"
+            " && export INSTALLER_PASSWORD INSTALLER_PROXMOX_PBS_PASSWORD && python3 -"
+        )
+        assert host.to_input(b"entrypoint") == b"hunter2\npbs\nentrypoint"
+
+    def test_secrets_error(self) -> None:
+        host = Host(hostname="host", password="a\nb")  # noqa: S106
+        with raises(ValueError, match="INSTALLER_PASSWORD must be a single line"):
+            _ = host.to_secrets()
+
+    def test_label(self) -> None:
+        assert Host(hostname="host").label == "host"
+        assert Host(hostname="host", user="root", port=2222).label == "root@host:2222"
+
+
+class TestLoadInventory:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "inventory.toml"
+        _ = path.write_text("""\
+[defaults]
+  docker = true
+  subnet = "main"
+
+[[hosts]]
+  hostname = "host-1"
+
+[[hosts]]
+  docker = false
+  hostname = "host-2"
+  subnet = "qrt"
+""")
+        host1, host2 = load_inventory(path)
+        assert host1 == Host(hostname="host-1", docker=True, subnet=Subnet.main)
+        assert host2 == Host(hostname="host-2", docker=False, subnet=Subnet.qrt)
+
+    def test_duplicates(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "inventory.toml"
+        _ = path.write_text("""\
+[[hosts]]
+  hostname = "host"
+  port = 2222
+
+[[hosts]]
+  hostname = "host"
+  port = 2223
+
+[[hosts]]
+  hostname = "host"
+  port = 2222
+""")
+        with raises(ValueError, match=r"host:2222$"):
+            _ = load_inventory(path)
+
+
+class TestGuest:
+    def test_lxc(self) -> None:
+        guest = Guest(vmid=101, name="ct", kind=GuestKind.lxc)
+        cmd = guest.to_command(args=["--docker"], subnet=Subnet.main)
+        assert cmd == [
+            "pct",
+            "exec",
+            "101",
+            "--",
+            "env",
+            "SUBNET=main",
+            "python3",
+            GUEST_PYZ,
+            "--docker",
+        ]
+
+    def test_qemu(self) -> None:
+        cmd = Guest(vmid=102, name="vm", kind=GuestKind.qemu).to_command()
+        assert cmd[:4] == ["qm", "guest", "exec", "102"]
+        assert "--pass-stdin=1" not in cmd
+        assert cmd[-3:] == ["--", "python3", GUEST_PYZ]
+
+    def test_push_lxc(self, *, tmp_path: Path) -> None:
+        pyz = tmp_path / "installer.pyz"
+        guest = Guest(vmid=101, name="ct", kind=GuestKind.lxc)
+        assert guest.to_push(pyz) == [
+            (["pct", "push", "101", str(pyz), GUEST_PYZ], None)
+        ]
+
+    def test_push_qemu(self, *, tmp_path: Path) -> None:
+        # in chunks, as `qm guest exec` forwards at most 1 MiB of stdin
+        _ = (pyz := tmp_path / "installer.pyz").write_bytes(b"\x00" * (3 << 19))
+        push = Guest(vmid=102, name="vm", kind=GuestKind.qemu).to_push(pyz)
+        assert [cmd[-1] for cmd, _ in push] == [
+            f"cat > {GUEST_PYZ}",
+            f"cat >> {GUEST_PYZ}",
+            f"cat >> {GUEST_PYZ}",
+        ]
+        assert all("--pass-stdin=1" in cmd for cmd, _ in push)
+        assert b"".join(input_ or b"" for _, input_ in push) == pyz.read_bytes()
+
+
+class TestRunGuests:
+    def test_offline(self, *, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+        # the guests are given the archive, so they never fetch anything
+        cmds: list[list[str]] = []
+
+        def subprocess_run(cmd: list[str], /, **kwargs: Any) -> CompletedProcess[bytes]:
+            _ = kwargs
+            cmds.append(cmd)
+            return CompletedProcess(cmd, 0)
+
+        def get(*args: Any, **kwargs: Any) -> None:
+            _ = (args, kwargs)
+            msg = "No network access"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(installer.fleet, "subprocess_run", subprocess_run)
+        monkeypatch.setattr(installer.fleet, "get", get)
+        _ = (pyz := tmp_path / "installer.pyz").write_bytes(b"pyz")
+        guest = Guest(vmid=101, name="ct", kind=GuestKind.lxc)
+        (result,) = run_guests([guest], pyz=pyz, log_dir=tmp_path / "logs")
+        assert result.ok
+        assert cmds == [
+            ["pct", "push", "101", str(pyz), GUEST_PYZ],
+            ["pct", "exec", "101", "--", "python3", GUEST_PYZ],
+        ]
+        assert not any(
+            n in arg for cmd in cmds for arg in cmd for n in ["curl", "git", "http"]
+        )
+
+
+class TestParseLists:
+    def test_pct(self) -> None:
+        text = """\
+VMID       Status     Lock         Name
+101        running                 ct-1
+102        stopped    backup       ct-2
+"""
+        assert _parse_pct_list(text) == [
+            Guest(vmid=101, name="ct-1", kind=GuestKind.lxc),
+            Guest(vmid=102, name="ct-2", kind=GuestKind.lxc, running=False),
+        ]
+
+    def test_qm(self) -> None:
+        text = """\
+      VMID NAME                 STATUS     MEM(MB)    BOOTDISK(GB) PID
+       201 vm-1                 running    2048              32.00 1234
+       202 vm-2                 stopped    2048              32.00 0
+"""
+        assert _parse_qm_list(text) == [
+            Guest(vmid=201, name="vm-1", kind=GuestKind.qemu),
+            Guest(vmid=202, name="vm-2", kind=GuestKind.qemu, running=False),
+        ]
+
+
+class TestUnwrapAgentResult:
+    def test_main(self, *, tmp_path: Path) -> None:
+        log = tmp_path / "201.log"
+        _ = log.write_text('{"exitcode": 1, "exited": 1, "out-data": "out\\n"}')
+        result = HostResult(
+            hostname="vm-1", status=StepStatus.succeeded, duration=1.0, log=log
+        )
+        unwrapped = _unwrap_agent_result(result)
+        assert (unwrapped.status, unwrapped.returncode) == (StepStatus.failed, 1)
+        assert log.read_text() == "out\n"
+
+    def test_unparseable(self, *, tmp_path: Path) -> None:
+        log = tmp_path / "201.log"
+        _ = log.write_text("Agent error: QEMU guest agent is not running")
+        result = HostResult(
+            hostname="vm-1", status=StepStatus.succeeded, duration=1.0, log=log
+        )
+        unwrapped = _unwrap_agent_result(result)
+        assert (unwrapped.status, unwrapped.returncode) == (StepStatus.failed, None)
+        assert log.read_text().startswith("Agent error")
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from click.testing import CliRunner
+
+import installer.facts
+import installer.scheduler
+from installer.facts import FACTS, FactsCache
+from installer.main import _main
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+class TestMain:
+    def test_plan(self, *, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+        # writes are no-ops under pytest, so that is switched off
+        monkeypatch.delenv("PYTEST_VERSION")
+
+        def run_steps(*args: Any, **kwargs: Any) -> list[Any]:
+            _ = (args, kwargs)
+            return []
+
+        facts = FactsCache(tmp_path / FACTS.relative_to("/"))
+        monkeypatch.setattr(installer.scheduler, "run_steps", run_steps)
+        monkeypatch.setattr(installer.facts, "get_facts_cache", lambda: facts)
+        result = CliRunner().invoke(
+            _main, ["--plan", f"--root={tmp_path}", "--no-proxmox", "--no-docker"]
+        )
+        assert result.exit_code == 0, result.output
+        assert list(tmp_path.iterdir()) == []
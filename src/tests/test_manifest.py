@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from installer.manifest import Manifest, get_manifest, hash_inputs
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestGetManifest:
+    def test_main(self) -> None:
+        assert isinstance(get_manifest(), Manifest)
+
+
+class TestHashInputs:
+    def test_main(self) -> None:
+        assert hash_inputs("a", b"b") == hash_inputs(b"a", "b")
+
+    def test_boundaries(self) -> None:
+        assert hash_inputs("ab", "c") != hash_inputs("a", "bc")
+
+
+class TestManifest:
+    def test_main(self, *, tmp_path: Path) -> None:
+        manifest = Manifest(tmp_path / "manifest.json")
+        dest = tmp_path / "dest"
+        _ = dest.write_text("text")
+        assert not manifest.is_current(dest, inputs="inputs")
+        manifest.record(dest, inputs="inputs", content=b"text")
+        assert manifest.is_current(dest, inputs="inputs")
+        assert not manifest.is_current(dest, inputs="other")
+
+    def test_modified(self, *, tmp_path: Path) -> None:
+        manifest = Manifest(tmp_path / "manifest.json")
+        dest = tmp_path / "dest"
+        _ = dest.write_text("text")
+        manifest.record(dest, inputs="inputs", content=b"text")
+        _ = dest.write_text("modified")
+        assert not manifest.is_current(dest, inputs="inputs")
+
+    def test_deleted(self, *, tmp_path: Path) -> None:
+        manifest = Manifest(tmp_path / "manifest.json")
+        dest = tmp_path / "dest"
+        _ = dest.write_text("text")
+        manifest.record(dest, inputs="inputs", content=b"text")
+        dest.unlink()
+        assert not manifest.is_current(dest, inputs="inputs")
+
+    def test_invalid(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "manifest.json"
+        _ = path.write_text("{")
+        assert Manifest(path).entries == {}
+        _ = path.write_text('{"dest": {"invalid": 0}}')
+        assert Manifest(path).entries == {}
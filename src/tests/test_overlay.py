@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import tarfile
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+
+from pytest import raises
+
+from installer.enums import Subnet
+from installer.envs.proxmox import _parse_storage_cfg
+from installer.overlay import (
+    OVERLAY_IMMUTABLE,
+    OverlayFile,
+    apply_overlay,
+    export_overlay,
+    render_overlay,
+)
+from installer.plan import yield_plan
+from installer.rootfs import yield_root
+
+
+class TestRenderOverlay:
+    def test_main(self) -> None:
+        files = {f.path: f for f in render_overlay(subnet=Subnet.main)}
+        assert PurePosixPath("/etc/gitconfig") in files
+        assert PurePosixPath("/etc/starship.toml") in files
+        assert PurePosixPath("/etc/pve/storage.cfg") not in files
+        resolv_conf = files[PurePosixPath("/etc/resolv.conf")]
+        assert resolv_conf.immutable
+        assert str(Subnet.main.n).encode() in resolv_conf.content
+
+    def test_proxmox(self) -> None:
+        paths = {f.path for f in render_overlay(subnet=Subnet.main, proxmox=True)}
+        assert PurePosixPath("/etc/pve/storage.cfg") in paths
+
+
+class TestExportOverlay:
+    def test_main(self, *, tmp_path: Path) -> None:
+        files = [
+            OverlayFile(path=PurePosixPath("/etc/a.conf"), content=b"a\n", mode=0o600),
+            OverlayFile(
+                path=PurePosixPath("/etc/b/b.conf"), content=b"b\n", immutable=True
+            ),
+        ]
+        archive = export_overlay(files, tmp_path / "overlay.tar.gz")
+        with tarfile.open(archive) as tar:
+            a, b = tar.getmembers()
+        assert (a.name, a.mode, a.uid) == ("etc/a.conf", 0o600, 0)
+        assert OVERLAY_IMMUTABLE not in a.pax_headers
+        assert b.pax_headers[OVERLAY_IMMUTABLE] == "1"
+
+
+class TestApplyOverlay:
+    def test_main(self, *, tmp_path: Path) -> None:
+        files = [
+            OverlayFile(path=PurePosixPath("/etc/a.conf"), content=b"a\n", mode=0o600)
+        ]
+        archive = export_overlay(files, tmp_path / "overlay.tar")
+        root = tmp_path / "root"
+        root.mkdir()
+        with yield_root(root), archive.open("rb") as fh:
+            (applied,) = apply_overlay(fh)
+        assert applied == root.resolve() / "etc/a.conf"
+        assert applied.read_bytes() == b"a\n"
+        assert applied.stat().st_mode & 0o777 == 0o600
+
+    def test_pmxcfs(self, *, tmp_path: Path) -> None:
+        # `/etc/pve` is merged and written in place; unchanged files are skipped
+        (pve := tmp_path / "root/etc/pve").mkdir(parents=True)
+        _ = (pve / "storage.cfg").write_text("dir: extra\n\tpath /mnt/extra\n")
+        _ = (pve / "b.cfg").write_text("b\n")
+        files = [
+            OverlayFile(
+                path=PurePosixPath("/etc/pve/storage.cfg"),
+                content=b"dir: local\n\tpath /var/lib/vz\n",
+            ),
+            OverlayFile(path=PurePosixPath("/etc/pve/a.cfg"), content=b"a\n"),
+            OverlayFile(path=PurePosixPath("/etc/pve/b.cfg"), content=b"b\n"),
+        ]
+        archive = export_overlay(files, tmp_path / "overlay.tar")
+        with (
+            yield_root(tmp_path / "root"),
+            yield_plan() as changes,
+            archive.open("rb") as fh,
+        ):
+            applied = apply_overlay(fh)
+        assert [p.name for p in applied] == ["storage.cfg", "a.cfg"]
+        storage_cfg, a_cfg = changes
+        assert list(_parse_storage_cfg(storage_cfg.content or "")) == ["extra", "local"]
+        assert a_cfg.content == "a\n"
+        assert not (pve / "a.cfg").exists()
+
+    def test_error_member(self) -> None:
+        buffer = BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            info = tarfile.TarInfo("../etc/a.conf")
+            tar.addfile(info, BytesIO())
+        _ = buffer.seek(0)
+        with raises(ValueError, match="Invalid overlay member"):
+            _ = apply_overlay(buffer)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from installer.plan import (
+    Change,
+    ChangeKind,
+    format_plan,
+    get_file_diff,
+    is_planning,
+    record_change,
+    yield_plan,
+)
+from installer.rootfs import yield_root
+from installer.utilities import copy
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+class TestFormatPlan:
+    def test_main(self) -> None:
+        changes = [
+            Change(kind=ChangeKind.service, target="sshd", detail="restart"),
+            Change(kind=ChangeKind.file, target="/etc/gitconfig"),
+        ]
+        assert format_plan(changes).splitlines() == [
+            "file: /etc/gitconfig",
+            "service: sshd",
+            "    restart",
+        ]
+
+    def test_empty(self) -> None:
+        assert format_plan([]) == "No changes"
+
+
+class TestGetFileDiff:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "file"
+        _ = path.write_text("a\nb\n")
+        diff = get_file_diff(path, "a\nc\n")
+        assert diff.splitlines()[-2:] == ["-b", "+c"]
+
+    def test_missing(self, *, tmp_path: Path) -> None:
+        diff = get_file_diff(tmp_path / "file", "a\n")
+        assert diff.splitlines()[-1] == "+a"
+
+    def test_binary(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "file"
+        _ = path.write_bytes(b"\xff\n")
+        diff = get_file_diff(path, "a\n")
+        assert diff.splitlines()[-1] == "+a"
+
+
+class TestYieldPlan:
+    def test_main(self) -> None:
+        assert not is_planning()
+        assert not record_change(ChangeKind.command, "cmd")
+        with yield_plan() as changes:
+            assert is_planning()
+            assert record_change(ChangeKind.command, "cmd")
+        assert not is_planning()
+        assert changes == [Change(kind=ChangeKind.command, target="cmd")]
+
+    def test_copy(self, *, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+        # `copy` is a no-op under pytest, so that is switched off
+        monkeypatch.delenv("PYTEST_VERSION")
+        dest = tmp_path / "dest"
+        with yield_root(tmp_path):
+            with yield_plan() as changes:
+                copy("text", dest)
+            assert not dest.exists()
+            copy("text", dest)
+        (file,) = changes
+        assert file.target == str(dest)
+        assert file.detail is not None
+        assert file.detail.endswith("+text")
+        assert dest.read_text() == "text"
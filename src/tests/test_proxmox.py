@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pytest import raises
+
+from installer.constants import CONFIGS_PROXMOX_STORAGE_CFG
+from installer.envs.proxmox import (
+    _format_storage_cfg,
+    _parse_storage_cfg,
+    _setup_pbs_data_pw,
+    _setup_storage_cfg,
+)
+from installer.plan import yield_plan
+from installer.rootfs import yield_root
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestParseStorageCfg:
+    def test_main(self) -> None:
+        stanzas = _parse_storage_cfg(CONFIGS_PROXMOX_STORAGE_CFG.read_text())
+        assert list(stanzas) == ["local", "qrt-dataset", "local-zfs"]
+        assert stanzas["local-zfs"].type_ == "zfspool"
+        assert stanzas["local-zfs"].options["sparse"] == ""
+
+    def test_round_trip(self) -> None:
+        stanzas = _parse_storage_cfg(CONFIGS_PROXMOX_STORAGE_CFG.read_text())
+        assert _parse_storage_cfg(_format_storage_cfg(stanzas)) == stanzas
+
+    def test_error(self) -> None:
+        with raises(ValueError, match="outside a stanza"):
+            _ = _parse_storage_cfg("  path /var/lib/vz\n")
+
+
+class TestSetupStorageCfg:
+    def _setup(self, root: Path, text: str, /) -> list[str]:
+        (pve := root / "etc/pve").mkdir(parents=True)
+        _ = (pve / "storage.cfg").write_text(text)
+        with yield_root(root), yield_plan() as changes:
+            _setup_storage_cfg()
+        return [c.content or "" for c in changes]
+
+    def test_unchanged(self, *, tmp_path: Path) -> None:
+        # reordered and reindented, as written by Proxmox
+        stanzas = _parse_storage_cfg(CONFIGS_PROXMOX_STORAGE_CFG.read_text())
+        text = _format_storage_cfg(dict(reversed(stanzas.items())))
+        assert self._setup(tmp_path, text) == []
+
+    def test_merge(self, *, tmp_path: Path) -> None:
+        text = "dir: local\n\tpath /srv\n\ndir: extra\n\tpath /mnt/extra\n"
+        (content,) = self._setup(tmp_path, text)
+        merged = _parse_storage_cfg(content)
+        assert list(merged) == ["local", "extra", "qrt-dataset", "local-zfs"]
+        assert merged["local"].options["path"] == "/var/lib/vz"
+        assert merged["extra"].options["path"] == "/mnt/extra"
+
+    def test_comments(self, *, tmp_path: Path) -> None:
+        text = "# local\ndir: local\n\tpath /srv\n\n# extra\ndir: extra\n\tpath /mnt/extra\n# end\n"
+        (content,) = self._setup(tmp_path, text)
+        assert content.startswith("# local\ndir: local\n")
+        assert "\n# extra\ndir: extra\n\tpath /mnt/extra\n# end\n" in content
+        # a change to only the comments is not a change
+        current = _parse_storage_cfg(CONFIGS_PROXMOX_STORAGE_CFG.read_text())
+        assert (
+            self._setup(tmp_path / "root", f"# comment\n{_format_storage_cfg(current)}")
+            == []
+        )
+
+
+class TestSetupPbsDataPw:
+    def test_unchanged(self, *, tmp_path: Path) -> None:
+        (storage := tmp_path / "etc/pve/priv/storage").mkdir(parents=True)
+        _ = (storage / "pbs-data.pw").write_text("password\n")
+        with yield_root(tmp_path), yield_plan() as changes:
+            _setup_pbs_data_pw(password="password")  # noqa: S106
+            assert changes == []
+            _setup_pbs_data_pw(password="other")  # noqa: S106
+        (change,) = changes
+        assert change.detail == "(contents hidden)"
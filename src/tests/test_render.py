@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
+
+from installer.enums import Subnet
+from installer.fleet import Host
+from installer.overlay import render_overlay
+from installer.render import load_bundle, render_hosts, write_bundles
+
+if TYPE_CHECKING:
+    from pytest import LogCaptureFixture
+
+
+class TestRenderHosts:
+    def test_main(self, *, tmp_path: Path) -> None:
+        hosts = [Host(hostname=f"host{i}", subnet=Subnet.main) for i in range(3)]
+        results = render_hosts(hosts, store=tmp_path)
+        assert len({tuple(files) for files in results.values()}) == 1
+        assert len(list((tmp_path / "objects").rglob("*"))) >= 1
+        assert {p.name for p in (tmp_path / "hosts").iterdir()} == {
+            "host0.json",
+            "host1.json",
+            "host2.json",
+        }
+
+    def test_dedupe(self, *, tmp_path: Path) -> None:
+        hosts = [
+            Host(hostname="a", subnet=Subnet.main),
+            Host(hostname="b", subnet=Subnet.test),
+            Host(hostname="c", subnet=Subnet.main, overrides={"n": "99"}),
+        ]
+        results = render_hosts(hosts, store=tmp_path)
+        resolv_confs = {
+            h: next(f for f in files if f.path == PurePosixPath("/etc/resolv.conf"))
+            for h, files in results.items()
+        }
+        assert len({f.sha256 for f in resolv_confs.values()}) == 3
+        assert resolv_confs["a"].immutable
+        gitconfigs = {
+            next(f for f in files if f.path == PurePosixPath("/etc/gitconfig")).sha256
+            for files in results.values()
+        }
+        assert len(gitconfigs) == 1
+
+    def test_no_subnet(self, *, tmp_path: Path, caplog: LogCaptureFixture) -> None:
+        results = render_hosts([Host(hostname="a")], store=tmp_path)
+        paths = {f.path for f in results["a"]}
+        assert PurePosixPath("/etc/gitconfig") in paths
+        assert PurePosixPath("/etc/resolv.conf") not in paths
+        assert (
+            "Skipping '/etc/resolv.conf' for 'a'; missing variable(s) n, subnet"
+            in caplog.messages
+        )
+
+    def test_proxmox(self, *, tmp_path: Path) -> None:
+        hosts = [
+            Host(hostname="a"),
+            Host(hostname="b", proxmox=True, proxmox_pbs_password="password"),  # noqa: S106
+        ]
+        results = render_hosts(hosts, store=tmp_path)
+        storage_cfg = PurePosixPath("/etc/pve/storage.cfg")
+        assert storage_cfg not in {f.path for f in results["a"]}
+        assert storage_cfg in {f.path for f in results["b"]}
+        # secrets are never rendered into the shared store
+        assert all(
+            "password" not in p.read_text() for p in tmp_path.rglob("*") if p.is_file()
+        )
+        assert PurePosixPath("/etc/pve/priv/storage/pbs-data.pw") not in {
+            f.path for f in results["b"]
+        }
+
+    def test_overlay(self, *, tmp_path: Path) -> None:
+        _ = render_hosts([Host(hostname="a", subnet=Subnet.main)], store=tmp_path)
+        bundle = {(f.path, f.content, f.immutable) for f in load_bundle(tmp_path, "a")}
+        overlay = {
+            (f.path, f.content, f.immutable) for f in render_overlay(subnet=Subnet.main)
+        }
+        assert bundle == overlay
+
+
+class TestWriteBundles:
+    def test_main(self, *, tmp_path: Path) -> None:
+        store, bundles = tmp_path / "store", tmp_path / "bundles"
+        hosts = [Host(hostname=f"host{i}", subnet=Subnet.main) for i in range(3)]
+        results = render_hosts(hosts, store=store)
+        write_bundles(store, results, bundles)
+        archives = [p for p in bundles.iterdir() if not p.is_symlink()]
+        assert len(archives) == 1
+        assert (bundles / "host0.tar").resolve() == archives[0].resolve()
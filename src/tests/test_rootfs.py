@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from installer.rootfs import chrooted, get_root, is_rooted, rooted, yield_root
+
+
+class TestChrooted:
+    def test_main(self) -> None:
+        assert chrooted("apt-get update") == "apt-get update"
+
+    def test_yield_root(self, *, tmp_path: Path) -> None:
+        with yield_root(tmp_path):
+            assert is_rooted()
+            assert chrooted("apt-get update") == f"chroot {tmp_path} apt-get update"
+        assert not is_rooted()
+
+
+class TestRooted:
+    def test_main(self) -> None:
+        assert rooted("/etc/gitconfig") == Path("/etc/gitconfig")
+
+    def test_yield_root(self, *, tmp_path: Path) -> None:
+        with yield_root(tmp_path):
+            assert get_root() == tmp_path.resolve()
+            assert rooted("/etc/gitconfig") == tmp_path.resolve() / "etc/gitconfig"
+        assert get_root() == Path("/")
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from time import perf_counter, sleep
+
+from pytest import raises
+
+from installer.scheduler import Step, StepStatus, run_steps
+
+
+def _noop() -> None:
+    pass
+
+
+def _fail() -> None:
+    msg = "failed"
+    raise RuntimeError(msg)
+
+
+class TestRunSteps:
+    def test_main(self) -> None:
+        order: list[str] = []
+        steps = [
+            Step(name="b", func=lambda: order.append("b"), deps=frozenset({"a"})),
+            Step(name="a", func=lambda: order.append("a")),
+        ]
+        results = run_steps(steps, jobs=2)
+        assert [r.name for r in results] == ["b", "a"]
+        assert all(r.status is StepStatus.succeeded for r in results)
+        assert order == ["a", "b"]
+
+    def test_concurrent(self) -> None:
+        steps = [Step(name=str(i), func=lambda: sleep(0.1)) for i in range(4)]
+        start = perf_counter()
+        _ = run_steps(steps, jobs=4)
+        assert perf_counter() - start <= 0.3
+
+    def test_missing_deps_are_satisfied(self) -> None:
+        steps = [Step(name="a", func=_noop, deps=frozenset({"missing"}))]
+        (result,) = run_steps(steps)
+        assert result.status is StepStatus.succeeded
+
+    def test_failure(self) -> None:
+        steps = [
+            Step(name="a", func=_fail),
+            Step(name="b", func=_noop, deps=frozenset({"a"})),
+            Step(name="c", func=_noop),
+        ]
+        a, b, c = run_steps(steps, jobs=2)
+        assert a.status is StepStatus.failed
+        assert isinstance(a.error, RuntimeError)
+        assert b.status is StepStatus.skipped
+        assert c.status is StepStatus.succeeded
+
+    def test_error_duplicate(self) -> None:
+        with raises(ValueError, match="Duplicate step 'a'"):
+            _ = run_steps([Step(name="a", func=_noop), Step(name="a", func=_noop)])
+
+    def test_error_cyclic(self) -> None:
+        steps = [
+            Step(name="a", func=_noop, deps=frozenset({"b"})),
+            Step(name="b", func=_noop, deps=frozenset({"a"})),
+        ]
+        with raises(ValueError, match="Cyclic dependency"):
+            _ = run_steps(steps)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from pytest import raises
+
+import installer.services
+from installer.plan import Change, ChangeKind, yield_plan
+from installer.services import (
+    ServiceAction,
+    flush_services,
+    get_pending_services,
+    mark_dirty,
+)
+
+if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
+
+class TestMarkDirty:
+    def test_reload(self) -> None:
+        mark_dirty("sshd")
+        mark_dirty("sshd")
+        assert get_pending_services()["sshd"] is ServiceAction.reload
+        with yield_plan():
+            flush_services()
+
+    def test_restart_wins(self) -> None:
+        mark_dirty("sshd", restart=True)
+        mark_dirty("sshd")
+        assert get_pending_services()["sshd"] is ServiceAction.restart
+        with yield_plan():
+            flush_services()
+
+
+class TestFlushServices:
+    def test_plan(self) -> None:
+        for _ in range(3):
+            mark_dirty("cron")
+        with yield_plan() as changes:
+            flush_services()
+        assert changes == [
+            Change(kind=ChangeKind.service, target="cron", detail="restart")
+        ]
+        assert get_pending_services() == {}
+
+    def test_reload(self, *, monkeypatch: MonkeyPatch) -> None:
+        cmds = self._patch(monkeypatch, valid=True)
+        mark_dirty("sshd")
+        mark_dirty("sshd")
+        mark_dirty("cron")
+        flush_services()
+        assert cmds == ["systemctl restart cron", "sshd -t", "systemctl reload sshd"]
+        assert get_pending_services() == {}
+
+    def test_error_validation(self, *, monkeypatch: MonkeyPatch) -> None:
+        cmds = self._patch(monkeypatch, valid=False)
+        mark_dirty("sshd")
+        with raises(RuntimeError, match="'sshd -t' failed; not running reload"):
+            flush_services()
+        assert cmds == ["sshd -t"]
+
+    def _patch(self, monkeypatch: MonkeyPatch, /, *, valid: bool) -> list[str]:
+        cmds: list[str] = []
+
+        def run(cmd: str, /, **kwargs: Any) -> bool:
+            _ = kwargs
+            cmds.append(cmd)
+            return valid
+
+        monkeypatch.setattr(installer.services, "run", run)
+        return cmds
@@ -1,8 +1,31 @@
 from __future__ import annotations
 
-from installer.settings import SETTINGS, _Settings
+from typing import TYPE_CHECKING
 
+from utilities.os import temp_environ
 
-class TestSettings:
+from installer.settings import _Settings, get_settings
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestGetSettings:
     def test_main(self) -> None:
-        assert isinstance(SETTINGS, _Settings)
+        assert isinstance(get_settings(), _Settings)
+
+    def test_snapshots(self, *, tmp_path: Path) -> None:
+        settings = get_settings(snapshots=tmp_path)
+        (snapshot,) = tmp_path.iterdir()
+        assert snapshot.suffix == ".json"
+        assert _Settings.model_validate_json(snapshot.read_bytes()) == settings
+
+    def test_snapshots_env(self, *, tmp_path: Path) -> None:
+        # `SECTION__FIELD` overrides are part of the snapshot key
+        _ = get_settings(snapshots=tmp_path / "default")
+        with temp_environ({"FLEET__TIMEOUT": "1"}):
+            settings = get_settings(snapshots=tmp_path / "override")
+        assert settings.fleet.timeout == 1
+        (default,) = (tmp_path / "default").iterdir()
+        (override,) = (tmp_path / "override").iterdir()
+        assert default.name != override.name
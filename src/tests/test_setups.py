@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from itertools import count
+from subprocess import CompletedProcess
+from typing import TYPE_CHECKING, Any
+
+from pytest import raises
+
+import installer.setups
+import installer.utilities
+from installer.settings import get_settings
+from installer.setups import _scan_known_host, set_password
+from installer.trace import write_trace, yield_trace
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+class TestSetPassword:
+    def test_trace(self, *, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+        inputs: list[str | None] = []
+
+        def subprocess_run(args: Any, **kwargs: Any) -> CompletedProcess[str]:
+            inputs.append(kwargs.get("input"))
+            return CompletedProcess(args, 0, stdout="")
+
+        monkeypatch.setattr(installer.utilities, "subprocess_run", subprocess_run)
+        with yield_trace() as spans:
+            set_password(password="hunter2")  # noqa: S106
+        summary = write_trace(spans, path := tmp_path / "trace.json")
+        assert "root:hunter2\n" in inputs
+        assert "hunter2" not in path.read_text()
+        assert "hunter2" not in summary.read_text()
+
+
+class TestScanKnownHost:
+    def _patch(
+        self,
+        monkeypatch: MonkeyPatch,
+        /,
+        *,
+        outputs: Iterator[str | None],
+        times: Iterator[float],
+    ) -> list[float]:
+        sleeps: list[float] = []
+
+        def run(cmd: str, /, **kwargs: Any) -> str | None:
+            _ = (cmd, kwargs)
+            return next(outputs)
+
+        def monotonic() -> float:
+            return next(times)
+
+        monkeypatch.setattr(installer.setups, "run", run)
+        monkeypatch.setattr(installer.setups, "monotonic", monotonic)
+        monkeypatch.setattr(installer.setups, "sleep", sleeps.append)
+        return sleeps
+
+    def test_main(self, *, monkeypatch: MonkeyPatch) -> None:
+        sleeps = self._patch(
+            monkeypatch, outputs=iter([None, "", "key"]), times=iter([0.0, 1.0])
+        )
+        assert _scan_known_host("host", deadline=60.0) == "key"
+        assert len(sleeps) == 2
+        assert sleeps[0] <= get_settings().ssh.backoff
+        assert sleeps[1] <= 2 * get_settings().ssh.backoff
+
+    def test_max_tries(self, *, monkeypatch: MonkeyPatch) -> None:
+        max_tries = get_settings().ssh.max_tries
+        sleeps = self._patch(
+            monkeypatch, outputs=iter(lambda: None, 0), times=iter(lambda: 0.0, 1)
+        )
+        with raises(RuntimeError, match=f"failed after {max_tries} tries"):
+            _ = _scan_known_host("host", port=2222, deadline=60.0)
+        assert len(sleeps) == max_tries - 1
+        assert max(sleeps) <= get_settings().ssh.backoff_max
+
+    def test_deadline(self, *, monkeypatch: MonkeyPatch) -> None:
+        sleeps = self._patch(
+            monkeypatch,
+            outputs=iter(lambda: None, 0),
+            times=(10.0 * i for i in count(start=1)),
+        )
+        with raises(RuntimeError, match=r"failed within \d+s \(3 tries\)"):
+            _ = _scan_known_host("host", deadline=25.0)
+        assert sleeps[0] <= 25.0
+        assert len(sleeps) == 2
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from json import loads
+from typing import TYPE_CHECKING
+
+from installer.scheduler import Step, run_steps
+from installer.trace import is_tracing, write_trace, yield_span, yield_trace
+from installer.utilities import run
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestYieldTrace:
+    def test_main(self) -> None:
+        def func() -> None:
+            run("echo hello")
+            _ = run("echo world", output=True)
+
+        with yield_trace() as spans:
+            assert is_tracing()
+            _ = run_steps([Step(name="step", func=func)])
+        assert not is_tracing()
+        assert [(s.category, s.name) for s in sorted(spans)] == [
+            ("step", "step"),
+            ("run", "echo hello"),
+            ("run", "echo world"),
+        ]
+        step, hello, world = sorted(spans)
+        assert step.args == {"status": "succeeded"}
+        assert hello.step == world.step == "step"
+        assert hello.args == {"mode": "argv", "returncode": 0, "output_bytes": 6}
+        assert world.args == {"mode": "argv", "returncode": 0, "output_bytes": 6}
+
+    def test_failed(self) -> None:
+        with yield_trace() as spans:
+            assert not run("exit 3", failable=True)
+        (span,) = spans
+        assert span.args == {"mode": "shell", "returncode": 3}
+        assert span.step is None
+
+    def test_disabled(self) -> None:
+        with yield_span("name", category="run") as args:
+            args["returncode"] = 0
+        assert not is_tracing()
+
+
+class TestWriteTrace:
+    def test_main(self, *, tmp_path: Path) -> None:
+        with yield_trace() as spans, yield_span("name", category="run", key="value"):
+            pass
+        summary = write_trace(spans, path := tmp_path / "trace.json")
+        events = loads(path.read_text())["traceEvents"]
+        assert [e["ph"] for e in events] == ["M", "X"]
+        assert events[1]["name"] == "name"
+        assert events[1]["args"] == {"step": None, "key": "value"}
+        (line,) = summary.read_text().splitlines()
+        assert loads(line)["name"] == "name"
+
+    def test_jsonl(self, *, tmp_path: Path) -> None:
+        with yield_trace() as spans, yield_span("name", category="run"):
+            pass
+        summary = write_trace(spans, path := tmp_path / "trace.jsonl")
+        assert summary == tmp_path / "trace.summary.jsonl"
+        assert "traceEvents" in loads(path.read_text())
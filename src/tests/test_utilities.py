@@ -1,15 +1,45 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from subprocess import CalledProcessError
+from typing import TYPE_CHECKING, Any
 
-from pytest import mark, param
+from pytest import mark, param, raises
 
+import installer.utilities
 from installer.enums import Subnet
-from installer.utilities import get_subnet, has_non_root, is_lxc, is_proxmox, is_vm, run
+from installer.rootfs import yield_root
+from installer.trace import yield_trace
+from installer.utilities import (
+    _stage_file,
+    apt_installed,
+    commit_files,
+    get_subnet,
+    has_non_root,
+    is_apt_stale,
+    is_lxc,
+    is_proxmox,
+    is_vm,
+    run,
+    run_batch,
+    substitute,
+    yield_chroot,
+    yield_overrides,
+    yield_transaction,
+)
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pytest import MonkeyPatch
+
+
+class TestAptInstalled:
+    def test_main(self) -> None:
+        assert isinstance(apt_installed("bash"), bool)
+
+    def test_missing(self) -> None:
+        assert not apt_installed("invalid-package")
+
 
 class TestGetSubnet:
     def test_main(self) -> None:
@@ -23,6 +53,14 @@ class TestHasNonRoot:
         assert isinstance(has_non_root(), bool)
 
 
+class TestIsAptStale:
+    def test_main(self) -> None:
+        assert isinstance(is_apt_stale(), bool)
+
+    def test_zero_ttl(self) -> None:
+        assert is_apt_stale(ttl=0)
+
+
 class TestIsLXC:
     def test_main(self) -> None:
         assert isinstance(is_lxc(), bool)
@@ -56,3 +94,143 @@ class TestRun:
 
     def test_cwd(self, *, tmp_path: Path) -> None:
         assert run("pwd", output=True, cwd=tmp_path) == str(tmp_path)
+
+    def test_env(self) -> None:
+        assert run("KEY=value printenv KEY", output=True) == "value"
+
+    def test_relative(self, *, tmp_path: Path) -> None:
+        # resolved against `cwd`, not this process's working directory
+        _ = (script := tmp_path / "installer-test").write_text("#!/bin/sh\necho ok\n")
+        script.chmod(0o755)
+        assert run("./installer-test", output=True, cwd=tmp_path) == "ok"
+
+    def test_path(self, *, tmp_path: Path) -> None:
+        # a changed `PATH` is seen, despite the cache
+        _ = (script := tmp_path / "installer-test").write_text("#!/bin/sh\necho ok\n")
+        script.chmod(0o755)
+        assert not run("installer-test", failable=True)
+        assert run(f"PATH={tmp_path} installer-test", output=True) == "ok"
+
+    def test_shell(self) -> None:
+        assert run("echo test | tr t T", output=True) == "TesT"
+
+    @mark.parametrize(
+        ("cmd", "mode"),
+        [
+            param("echo test", "argv"),
+            param("KEY=value printenv KEY", "argv"),
+            param("echo test | cat", "shell"),
+            param("exit 0", "shell"),
+        ],
+    )
+    def test_mode(self, *, cmd: str, mode: str) -> None:
+        with yield_trace() as spans:
+            run(cmd)
+        (span,) = spans
+        assert span.args["mode"] == mode
+
+
+class TestRunBatch:
+    def test_main(self, *, tmp_path: Path) -> None:
+        assert run_batch("touch a", "mv a b", cwd=tmp_path)
+        assert (tmp_path / "b").exists()
+
+    def test_error(self) -> None:
+        with raises(CalledProcessError) as exc_info:
+            _ = run_batch("true", "false", "true")
+        assert exc_info.value.cmd == "false"
+        assert exc_info.value.returncode == 1
+
+    def test_error_returncode(self) -> None:
+        # an exit code which is also a valid index blames the right command
+        with raises(CalledProcessError) as exc_info:
+            _ = run_batch("true", "true", "echo out; echo err >&2; exit 1")
+        assert exc_info.value.cmd == "echo out; echo err >&2; exit 1"
+        assert exc_info.value.returncode == 1
+        assert exc_info.value.stderr == "err\n"
+
+    def test_error_signal(self) -> None:
+        with raises(CalledProcessError) as exc_info:
+            _ = run_batch("true", "kill -9 $$")
+        assert exc_info.value.cmd == "kill -9 $$"
+        assert exc_info.value.returncode == -9
+
+    def test_failable(self) -> None:
+        assert not run_batch("true", "false", failable=True)
+
+
+class TestYieldChroot:
+    def test_main(self, *, tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+        # `yield_chroot` is a no-op under pytest, so that is switched off
+        monkeypatch.delenv("PYTEST_VERSION")
+        cmds: list[str] = []
+
+        def run_batch(*cmds_: str, **kwargs: Any) -> bool:
+            _ = kwargs
+            cmds.extend(cmds_)
+            return True
+
+        def run(cmd: str, /, **kwargs: Any) -> bool:
+            _ = kwargs
+            cmds.append(cmd)
+            return True
+
+        monkeypatch.setattr(installer.utilities, "run_batch", run_batch)
+        monkeypatch.setattr(installer.utilities, "run", run)
+        policy = tmp_path / "usr/sbin/policy-rc.d"
+        with yield_root(tmp_path), yield_chroot():
+            assert policy.read_text().endswith("exit 101\n")
+            assert len(cmds) == 6
+        assert not policy.exists()
+        assert cmds[-3:] == [
+            f"umount --recursive --lazy {tmp_path.resolve() / n}"
+            for n in ["dev", "sys", "proc"]
+        ]
+
+
+class TestYieldOverrides:
+    def test_main(self) -> None:
+        with yield_overrides({"n": "99"}):
+            assert substitute("${n}.${subnet}", n=1, subnet="main") == "99.main"
+        assert substitute("${n}", n=1) == "1"
+
+
+class TestYieldTransaction:
+    def test_main(self, *, tmp_path: Path) -> None:
+        dest = tmp_path / "dir/file.conf"
+        with yield_transaction():
+            assert _stage_file(dest, b"content", inputs="inputs")
+            assert not dest.exists()
+            commit_files()
+        assert dest.read_bytes() == b"content"
+        assert list(dest.parent.iterdir()) == [dest]
+
+    def test_discard(self, *, tmp_path: Path) -> None:
+        dest = tmp_path / "file.conf"
+        with yield_transaction():
+            assert _stage_file(dest, b"content", inputs="inputs")
+        assert not dest.exists()
+
+    def test_rollback(self, *, tmp_path: Path) -> None:
+        (blocker := tmp_path / "blocker").touch()
+        dest = tmp_path / "file.conf"
+        with yield_transaction():
+            assert _stage_file(dest, b"content", inputs="inputs")
+            assert _stage_file(blocker / "file.conf", b"content", inputs="inputs")
+            with raises(FileExistsError):
+                commit_files()
+        assert list(tmp_path.iterdir()) == [blocker]
+
+    def test_rollback_rename(self, *, tmp_path: Path) -> None:
+        (blocker := tmp_path / "blocker").mkdir()
+        dest = tmp_path / "file.conf"
+        with yield_transaction():
+            assert _stage_file(dest, b"content", inputs="inputs")
+            assert _stage_file(blocker, b"content", inputs="inputs")
+            with raises(IsADirectoryError):
+                commit_files()
+        assert set(tmp_path.iterdir()) == {blocker, dest}
+        assert list(blocker.iterdir()) == []
+
+    def test_inactive(self, *, tmp_path: Path) -> None:
+        assert not _stage_file(tmp_path / "file.conf", b"content", inputs="inputs")
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+from zipfile import ZipFile
+
+from installer.zipapp import extract_zipapp
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TestExtractZipapp:
+    def test_main(self, *, tmp_path: Path) -> None:
+        archive = tmp_path / "installer.pyz"
+        with ZipFile(archive, mode="w") as zf:
+            zf.writestr("package/__init__.py", "value = 1\n")
+        cache = tmp_path / "cache"
+        dest = extract_zipapp(archive, caches=[cache])
+        assert (dest / "package/__init__.py").read_text() == "value = 1\n"
+        assert extract_zipapp(archive, caches=[cache]) == dest
+        assert len(list(cache.iterdir())) == 1
+
+    def test_fallback(self, *, tmp_path: Path) -> None:
+        archive = tmp_path / "installer.pyz"
+        with ZipFile(archive, mode="w") as zf:
+            zf.writestr("package/__init__.py", "")
+        readonly = tmp_path / "readonly"
+        _ = readonly.write_text("not a directory")
+        dest = extract_zipapp(archive, caches=[readonly, tmp_path / "cache"])
+        assert dest.parent == tmp_path / "cache"